@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+__version__ = """COBOL Record Decoding Benchmark ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+USAGE = """benchmark.py [-n RECORDS] [-r REPEAT]
+Decodes synthetic fixed-length records with each decoding strategy
+and reports records/sec."""
+
+import random, struct, sys, time
+
+import cobol2csv
+import columnar
+from layout import Layout
+
+# (name, data-type, length, implied decimal position, sample value function)
+FIELDS = [
+    ('cust_id', 'Integer', 9, 0, lambda n: '%09d' % n),
+    ('name', 'Char', 30, 0, lambda n: ('NAME %d' % n).ljust(30)),
+    ('branch', 'Integer', 4, 0, lambda n: '%04d' % (n % 97)),
+    ('opened', "Date('%Y%m%d')", 8, 0,
+        lambda n: '2010%02d%02d' % (n % 12 + 1, n % 28 + 1)),
+    ('balance', 'Float', 12, 0, lambda n: '%12.2f' % (n * 1.25)),
+    ('city', 'Char', 20, 0, lambda n: ('CITY %d' % (n % 50)).ljust(20)),
+    ('limit', 'Integer', 7, 0, lambda n: '%07d' % (n % 10000)),
+    ('rate', 'Float', 6, 0, lambda n: '%6.3f' % (n % 7 / 3.0)),
+    ('status', 'Char', 1, 0, lambda n: 'AIC'[n % 3]),
+    ('filler', 'Char', 10, 0, lambda n: ' ' * 10),
+]
+
+
+class CopybookFile:
+    """Stand-in for the copybook file object used in error messages"""
+    name = '<benchmark>'
+
+
+def make_records(num_records):
+    rand = random.Random(1)
+    records = []
+    for num in range(num_records):
+        n = rand.randint(0, 10 ** 6)
+        records.append(''.join([ i[4](n) for i in FIELDS ]))
+    return records
+
+def interpreted(records):
+    """struct.unpack + cobol2csv.Field.get_value per field"""
+    datetime_output_fmt = cobol2csv.FormatDateTimeOutput()
+    fields = [ cobol2csv.Field(i, [ str(k) for k in j[:4] ], CopybookFile,
+        datetime_output_fmt) for i, j in enumerate(FIELDS) ]
+    struct_str = ''.join([ '%ds' % i.length for i in fields ])
+    field_idx = range(len(fields))
+    for record_num, record in enumerate(records):
+        data = struct.unpack(struct_str, record)
+        [ fields[i].get_value(record_num, data[i]) for i in field_idx ]
+
+def compiled(records):
+    """layout.Layout generated decode function"""
+    decode = Layout([ i[:4] for i in FIELDS ], datetime_output_fmt=
+        cobol2csv.FormatDateTimeOutput().fmt).decode
+    for record in records:
+        decode(record)
+
+def numpy_columns(records):
+    """columnar.ColumnarDecoder, NumPy column-at-a-time"""
+    decoder = columnar.ColumnarDecoder(Layout([ i[:4] for i in FIELDS ]))
+    decoder.decode_block('\n'.join(records))
+
+def numpy_rows(records):
+    """columnar.ColumnarDecoder, converted back to Python rows"""
+    decoder = columnar.ColumnarDecoder(Layout([ i[:4] for i in FIELDS ]))
+    decoder.rows(decoder.decode_block('\n'.join(records)))
+
+CASES = [interpreted, compiled]
+if columnar.np is not None:
+    CASES += [numpy_columns, numpy_rows]
+
+def main(args):
+    records = make_records(args.records)
+    sys.stdout.write('%-14s %10s %10s %14s %8s\n' % (
+        'case', 'records', 'seconds', 'records/sec', 'speedup'))
+    baseline = None
+    for case in CASES:
+        seconds = min([ timed(case, records) for i in range(args.repeat) ])
+        rate = len(records) / seconds
+        baseline = baseline or rate
+        sys.stdout.write('%-14s %10d %10.3f %14.0f %7.1fx\n' % (
+            case.__name__, len(records), seconds, rate, rate / baseline))
+
+def timed(case, records):
+    start = time.time()
+    case(records)
+    return time.time() - start
+
+if __name__ == '__main__':
+    from cmd_line_args import Args
+    args = Args(USAGE, __version__)
+    args.parser.add_argument('-n', '--records', type=int, default=100000,
+        help='number of records to decode, default=100000')
+    args.parser.add_argument('-r', '--repeat', type=int, default=3,
+        help='number of timing runs per case, best is reported, default=3')
+    main(args.parse())
@@ -0,0 +1,133 @@
+"""BULK LOADER
+Batched Django model inserts for cobol2dbms.py, in place of a save() per
+model instance & a save() per many-to-many link.
+
+Works with any database backend Django supports, SQLite included, ids are
+assigned by the loader, not read back from the database.
+
+Examples:
+loader = BulkLoader(5000)
+loader.add(record)
+loader.add(item, parent=record)
+if loader.full():
+    loader.flush()
+loader.close()
+"""
+
+__version__ = """bulk ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+__all__ = ['BulkLoader']
+
+
+class BulkLoader:
+    """Batched database inserts, in place of a save() per model instance
+    
+    Model instances are buffered per model class & written with one
+    bulk_create per class, the parent/child (many-to-many) links of the
+    batch are then written to the through tables the same way, all inside
+    one transaction per batch.  Primary keys are assigned here, following
+    the highest id in each table, so links are resolved without reading
+    ids back from the database, on any backend, SQLite included.  The
+    tables must not be written by anything else during the load, table
+    sequences are reset once it's done.
+    
+    """
+    def __init__(self, batch_size):
+        """BulkLoader constructor
+        :type batch_size: int
+        :param batch_size: number of buffered model instances that ends a
+            batch, batches end on record boundaries
+        
+        """
+        self.batch_size = batch_size
+        # model class: next primary key
+        self.next_ids = {}
+        # model class: buffered instances
+        self.models = {}
+        # (through model, parent field, child field): buffered links
+        self.links = {}
+        self.size = 0
+        self.classes = []
+        # atomic in Django 1.6+
+        self.atomic = getattr(transaction, 'atomic', None) or \
+            transaction.commit_on_success
+    
+    def assign_id(self, model):
+        """Primary key of a model instance, assigned on first use"""
+        if model.id is None:
+            cls = model.__class__
+            if cls not in self.next_ids:
+                self.classes.append(cls)
+                max_id = cls.objects.aggregate(Max('id'))['id__max']
+                self.next_ids[cls] = (max_id or 0) + 1
+            model.id = self.next_ids[cls]
+            self.next_ids[cls] += 1
+        return model.id
+    
+    def add(self, model, parent=None):
+        """Buffer a model instance & its link to the parent instance
+        :type model: Django Model object
+        :param model: closed model instance, all fields set
+        
+        :type parent: Django Model object or None
+        :param parent: instance with a many-to-many field named after the
+            model's class
+        
+        """
+        self.assign_id(model)
+        self.models.setdefault(model.__class__, []).append(model)
+        self.size += 1
+        if parent is not None:
+            name = model.__class__.__name__.lower()
+            field = parent._meta.get_field(name)
+            key = (getattr(parent.__class__, name).through,
+                field.m2m_field_name() + '_id',
+                field.m2m_reverse_field_name() + '_id')
+            self.links.setdefault(key, []).append(
+                (self.assign_id(parent), model.id))
+    
+    def full(self):
+        return self.size >= self.batch_size
+    
+    def flush(self):
+        """Insert the buffered instances & links, in one transaction
+        
+        :rtype: int
+        :returns: number of rows inserted
+        
+        """
+        rows = 0
+        with self.atomic():
+            for cls in self.classes:
+                models = self.models.pop(cls, [])
+                cls.objects.bulk_create(models)
+                rows += len(models)
+            for (through, parent_field, child_field), links in \
+                    self.links.items():
+                through.objects.bulk_create([ through(**{parent_field: i,
+                    child_field: j}) for i, j in links ])
+                rows += len(links)
+        self.links = {}
+        self.size = 0
+        return rows
+    
+    def close(self):
+        """Insert the last batch, move table sequences past assigned ids"""
+        rows = self.flush()
+        statements = connection.ops.sequence_reset_sql(no_style(),
+            self.classes)
+        if statements:
+            with self.atomic():
+                cursor = connection.cursor()
+                for statement in statements:
+                    cursor.execute(statement)
+        return rows
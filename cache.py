@@ -0,0 +1,140 @@
+"""PERSISTENT LAYOUT CACHE
+Saves parsed & compiled copybooks to disk, so repeated runs against the same
+copybook skip parsing it & compiling its record layout.
+
+An entry is keyed by a SHA-1 hash of the copybook's contents, the options the
+compiled layout depends on (i.e. code page) & the Python version.  It holds the
+parsed field definitions & the code objects compiled from the layout's
+generated source (see layout.compile_source), written with marshal like a
+.pyc file.  Code objects are looked up by their source, so code compiled by an
+older version of layout.py is never reused.
+
+Entries are files in the cache directory, $PYCOBOL_CACHE or ~/.cache/pycobol.
+When the directory grows past max_bytes, the least recently used entries are
+removed.  Cache errors are never fatal, the copybook is compiled as usual.
+
+Examples:
+cache = LayoutCache()
+entry = cache.copybook(open('copybook.csv'), load.csv_, 'cp037')
+layout = Layout(entry['fields'][1:], entry['fields'][0][0], code=entry['code'])
+cache.save(entry)
+"""
+
+__version__ = """cache ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import hashlib, imp, marshal, os, tempfile
+
+__all__ = ['CACHE_DIR', 'LayoutCache']
+
+CACHE_DIR = os.environ.get('PYCOBOL_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'pycobol'))
+# cache directory size limit
+MAX_BYTES = 32 * 1024 * 1024
+SUFFIX = '.layout'
+# unreadable or incompatible entries
+LOAD_ERRORS = (IOError, OSError, EOFError, ValueError, TypeError, LookupError)
+
+
+class LayoutCache:
+    """Directory of compiled copybook entries"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        """directory (string) - cache directory, None or '' disables caching
+        max_bytes (int) - least recently used entries are removed beyond it
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, text, *options):
+        """Hash of the copybook text, options & Python version"""
+        key = hashlib.sha1(imp.get_magic())
+        key.update(repr(options))
+        key.update(text)
+        return key.hexdigest()
+
+    def copybook(self, file_, parse, *options):
+        """Parsed copybook, from the cache if possible
+        file_ (file) - copybook2csv.py output
+        parse (function) - parse(lines) -> field definitions
+        options - values the parsed fields or compiled layout depend on
+        returns (dict) - 'fields': parsed field definitions, 'code': code
+            dict to compile the layout with, 'key', 'hit'
+        """
+        text = file_.read()
+        key = self.key(text, *options)
+        entry = self.get(key)
+        hit = entry is not None
+        if not hit:
+            entry = {'fields': parse(text.splitlines(True)), 'code': {}}
+        entry['key'], entry['hit'] = key, hit
+        return entry
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """Cached entry or None"""
+        if not self.directory:
+            return
+        try:
+            f = open(self.path(key), 'rb')
+            try:
+                entry = marshal.load(f)
+            finally:
+                f.close()
+            entry = {'fields': entry['fields'], 'code': entry['code']}
+            # mark as recently used
+            os.utime(self.path(key), None)
+        except LOAD_ERRORS:
+            return
+        return entry
+
+    def save(self, entry):
+        """Store a new entry, once its layout is compiled"""
+        if not self.directory or entry['hit']:
+            return
+        data = marshal.dumps({'fields': entry['fields'],
+            'code': entry['code']})
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp_name = tempfile.mkstemp(SUFFIX + '.tmp', '',
+                self.directory)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            # atomic, concurrent runs never read a partial entry
+            os.rename(temp_name, self.path(entry['key']))
+            self.evict(entry['key'] + SUFFIX)
+        except (IOError, OSError):
+            pass
+
+    def evict(self, keep=None):
+        """Remove least recently used entries beyond max_bytes
+        keep (string) - file name of an entry never removed, i.e. the newest
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX) and name != keep:
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum([ i[1] for i in entries ])
+        if keep:
+            total += os.path.getsize(os.path.join(self.directory, keep))
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
@@ -1,5 +1,8 @@
 import argparse, sys
 
+from ebcdic import CODEPAGES
+from writers import FORMATS
+
 __all__ = ['Args']
 
 class VersionAction(argparse.Action):
@@ -69,22 +72,68 @@ class Args:
             elif option == 'quiet':
                 self.parser.add_argument('-q', '--quiet', action='store_true',
                     help='Suppress all output to terminal.')
+            elif option == 'binary':
+                self.parser.add_argument('-b', '--binary', action='store_true',
+                    help='Fixed-length records without line terminators '
+                    '(RECFM=F).')
+            elif option == 'variable':
+                self.parser.add_argument('--rdw', action='store_true',
+                    help='Variable-length records, each starting with a '
+                    'record descriptor word (RECFM=V).')
+                self.parser.add_argument('--bdw', action='store_true',
+                    help='Variable-length records in blocks starting with '
+                    'block descriptor words (RECFM=VB), implies --rdw.')
+            elif option == 'numpy':
+                self.parser.add_argument('--numpy', action='store_true',
+                    help='Decode blocks of records column-at-a-time (NumPy).')
+            elif option == 'workers':
+                self.parser.add_argument('-w', '--workers', type=int,
+                    default=1, help='Number of worker processes, default=1.')
+            elif option == 'pipeline':
+                self.parser.add_argument('-p', '--pipeline',
+                    action='store_true', help='Read, decode & write in '
+                    'overlapping stages (threads).')
+            elif option == 'format':
+                self.parser.add_argument('-f', '--format',
+                    choices=FORMATS, default='repr', help='Output format, '
+                    'default=repr (Python repr of each value).')
+            elif option == 'columns':
+                self.parser.add_argument('--columns', type=lambda names:
+                    [ i.strip() for i in names.split(',') if i.strip() ],
+                    help='Comma separated names of the fields decoded, the '
+                    'others are skipped.')
+                self.parser.add_argument('--filler', action='store_true',
+                    help='Decode FILLER fields, skipped by default.')
+            elif option == 'where':
+                self.parser.add_argument('--where', help='Condition records '
+                    "must meet, i.e. \"rec_type = 'D' and branch in (12,15)\", "
+                    'tested before records are decoded.')
+            elif option == 'cache':
+                self.parser.add_argument('--no-cache', action='store_false',
+                    dest='cache', help='Compile the copybook without the '
+                    'layout cache, $PYCOBOL_CACHE or ~/.cache/pycobol.')
+            elif option == 'codepage':
+                self.parser.add_argument('--codepage', choices=CODEPAGES,
+                    help='EBCDIC code page of the data, text fields are '
+                    'transcoded to ASCII.')
     
     def allow_stdin(self):
         self.allow_stdin = True
 
     def parse(self):
-        """Parse args & use sys.stdin if applicable
+        """Parse args & use sys.stdin if applicable, only when the last
+        filename is left out
         Sets all file arguments to a file read object"""
         args = self.parser.parse_args()
         if hasattr(self, 'file_args'):
-            if self.allow_stdin:
-                if not sys.stdin.isatty():
-                    setattr(args, self.file_args[-1], sys.stdin)
-                else:
-                    self.allow_stdin = False
-            last_arg_idx = len(self.file_args) - self.allow_stdin
-            for file_arg in self.file_args[:last_arg_idx]:
+            file_args = self.file_args
+            if self.allow_stdin and getattr(args, file_args[-1]) is None:
+                if sys.stdin.isatty():
+                    self.parser.error('%s is required, or redirect it to '
+                        'stdin' % file_args[-1])
+                setattr(args, file_args[-1], sys.stdin)
+                file_args = file_args[:-1]
+            for file_arg in file_args:
                 try:
                     file_ = open(getattr(args, file_arg))
                 except IOError, error_msg:
@@ -1,5 +1,7 @@
-__version__ = """COBOL Fixed-Length Record Parser ver 0.2
-Note: This version does not support OCCURS in Copybook files
+__version__ = """COBOL Fixed-Length Record Parser ver 0.3
+OCCURS tables are flattened into numbered fields, i.e. items_1_amount.
+OCCURS DEPENDING ON requires newline terminated or RDW records.
+Mixed record type files are decoded with a copybook per record type.
 
 Copyright (C) 2010 Brian Peterson
 This is free software; see source for copying conditions.  There is NO
@@ -9,11 +11,26 @@ warranty; not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 USAGE = """cobol2csv.py COPYBOOK [DATAFILE]
 COPYBOOK - Filename: output from copybook2csv.py
 DATAFILE - Filename: COBOL records, fixed-width text
+
+Mixed record types, i.e. header, detail & trailer records:
+cobol2csv.py --record-type 0:1 --layout H=header.csv,header.out \\
+    --layout T=trailer.csv detail.csv < data.txt
 """
 
 import load
+import parallel
+import pipeline
+import records
+import writers
+from cache import CACHE_DIR, LayoutCache
+from dispatch import Dispatcher, byte_range, route_arg
+from layout import DECODE_ERRORS, LayoutError, VariableLayout, \
+    compile_layout, depending_on, flatten
+from numeric import unpack_zoned
+from where import Where
 import re, struct, sys
 from datetime import datetime
+from itertools import count, izip
 #from autosize import TextTable
 
 HORIZ_LINE = '%s\n' % ('-' * 132)
@@ -24,7 +41,9 @@ class Field:
     DATE_TIME_RE = re.compile(r'.*\(\'(.*?)\'\)')
     DATA_TYPE_RE = re.compile(r'[a-zA-Z]+')
     DATE_TIME_DATA_TYPES = ['DATETIME', 'DATE', 'TIME']
-    SUPPORTED_DATA_TYPES = ['CHAR', 'INTEGER', 'FLOAT', 'DOUBLE']
+    SUPPORTED_DATA_TYPES = ['CHAR', 'INTEGER', 'FLOAT', 'DOUBLE', 'BCD',
+        'ZONED', 'BINARY', 'UNSIGNEDBINARY', 'HEXFLOAT', 'HEXDOUBLE',
+        'IEEEFLOAT', 'IEEEDOUBLE']
     SUPPORTED_DATA_TYPES += DATE_TIME_DATA_TYPES
     
     def __init__(self, field_num, field_def, file_, datetime_output_fmt=None):
@@ -100,6 +119,14 @@ class Field:
         field_data = field_data.strip()
         if self.base_type == 'CHAR':
             return field_data
+        if self.base_type == 'ZONED':
+            try:
+                value = unpack_zoned(field_data)
+            except ValueError:
+                self._error_data_type_conversion(record_num, field_data)
+            if self.decimal_pos:
+                value /= 10.0 ** self.decimal_pos
+            return value
         if self.decimal_pos:
             # insert implied decimal position
             data_chars = list(field_data)
@@ -110,7 +137,7 @@ class Field:
             if self.base_type == 'FLOAT':
                 return float(field_data)
             if self.base_type == 'DOUBLE':    
-                return double(field_data)
+                return float(field_data)
             if self.is_datetime:
                 datetime_fmt_match = self.DATE_TIME_RE.match(self.data_type)
                 if datetime_fmt_match:
@@ -191,28 +218,100 @@ class FormatDateTimeOutput:
         sys.exit(1)
 
 
+class LengthMismatch:
+    """Records of one length that doesn't match the sum of field lengths of
+    a layout, counted & reported once.  The fields within the length are
+    found for the first record of the length, then reused."""
+
+    def __init__(self, layout, record_len, record_num):
+        """layout (layout.Layout) - layout the records are decoded with
+        record_len (int) - length of the records
+        record_num (int) - first record of the length
+        """
+        self.struct_len = layout.record_length
+        self.record_len = record_len
+        self.first = record_num
+        self.count = 0
+        self.layout = layout
+        # (convert, start, end, is text) of the decoded fields wholly in
+        # the record, the missing & partial ones are null
+        self.fields = [ (i.convert, i.offset, i.offset + i.length,
+            layout.is_text(i)) for i in layout.columns
+            if i.offset + i.length <= record_len ]
+        self.nulls = (None,) * (len(layout.columns) - len(self.fields))
+        # only decoded fields are reported
+        self.truncated = len(self.fields) + 1 if self.nulls else None
+
+    def decode(self, record):
+        """Fields of a record of the length, trailing characters ignored"""
+        if self.record_len > self.struct_len:
+            return self.layout.decode(record[:self.struct_len])
+        text = self.layout.transcode(record)
+        return tuple([ convert(text[start:end] if is_text else
+            record[start:end]) for convert, start, end, is_text in
+            self.fields ]) + self.nulls
+
+    def __str__(self):
+        s = '\tSum of field lengths: %d, data record length: %d, %d %s, ' \
+            '1st Record Number: %d\n' % (self.struct_len, self.record_len,
+            self.count, 'record' if self.count == 1 else 'records',
+            self.first)
+        if self.struct_len < self.record_len:
+            s += '\t%d trailing characters ignored per record.\n' % (
+                self.record_len - self.struct_len)
+        elif self.truncated:
+            s += '\tField #%d truncated, null from there on.\n' % \
+                self.truncated
+        return s
+
+
 class Data:
 
-    def __init__(self, fields, args, datetime_output_fmt=None):
+    def __init__(self, fields, args, datetime_output_fmt=None, code=None,
+        copybook=None):
+        """copybook (file) - copybook of the fields, default args.copybook"""
+        self.copybook = copybook or args.copybook
         # -1 because 1st line in field def file is the structure/model name
         self.num_fields = len(fields) - 1
         if self.num_fields <= 0:
-            self._error_incomplete_copybook_file(args.copybook)
-        fields = enumerate(fields[1:])
+            self._error_incomplete_copybook_file(self.copybook)
+        # OCCURS tables flattened, OCCURS DEPENDING ON tables occur once
+        try:
+            flat_fields = flatten(fields[1:], dict([ (i, 1)
+                for i in depending_on(fields[1:]) ]))
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+        self.num_fields = len(flat_fields)
         # convert each field entry into a field def object
-        self.fields = [ Field(i, j, args.copybook, datetime_output_fmt)
-            for i, j in fields ]
-        # used for loop indexes
-        self.field_idx = range(self.num_fields)
-        self.field_names = ', '.join([ '"%s"' % i.name for i in fields ])
-        self.field_lengths =  [ i.length for i in self.fields ]
-        field_length_strings = [ str(i) for i in self.field_lengths ]
-        # struct_str = fmt used by Python struct.unpack to parse data
-        self.struct_str = 's'.join(field_length_strings) + 's'
-        self.sum_of_field_lengths = sum(self.field_lengths)
-        # running sum of field lengths, used for field-size/data-size
-        # mismatches to determine field # where data is truncated.
-        self.field_ends_at = self._cumulative_sum()
+        self.fields = [ Field(i, j, self.copybook, datetime_output_fmt)
+            for i, j in enumerate(flat_fields) ]
+        self.sum_of_field_lengths = sum([ i.length for i in self.fields ])
+        # decode function compiled from the field definitions
+        if datetime_output_fmt is None:
+            datetime_output_fmt = FormatDateTimeOutput()
+        try:
+            self.layout = compile_layout(fields[1:],
+                datetime_output_fmt=datetime_output_fmt.fmt,
+                codepage=args.codepage, code=code, select=args.columns,
+                filler=args.filler)
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+        self.is_variable = isinstance(self.layout, VariableLayout)
+        # (layout, record length): LengthMismatch
+        self.mismatches = {}
+        # record filter, tested before a record is decoded
+        self.where = None
+        if args.where:
+            try:
+                self.where = Where(args.where).compile(self.layout)
+            except LayoutError, error_mesg:
+                sys.stderr.write('ERROR: %s\n' % error_mesg)
+                sys.exit(1)
+        # names vary from record to record in OCCURS DEPENDING ON layouts
+        self.format_record = writers.formatter(args.format,
+            None if self.is_variable else self.layout.names)
         if args.debug:
             self._debug()
 
@@ -220,95 +319,378 @@ class Data:
             sys.stdout.write('FIELDS:\n%s' % HORIZ_LINE)
             for field in self.fields:
                 print field
-    
-    def _cumulative_sum(self):
-        s = [self.field_lengths[0]]
-        for field_num in range(1, len(self.field_lengths)):
-            s.append(s[field_num - 1] + self.field_lengths[field_num])
-        return s    
+            if not self.is_variable:
+                sys.stdout.write('DECODER:\n%s%s\n' % (HORIZ_LINE,
+                    self.layout.source()))
 
     def _error_incomplete_copybook_file(self, file_):
         sys.stderr.write('ERROR: Copybook file requires 2 lines minimum.\n')
         sys.stderr.write('1. First line must be the structure/model name.\n')
         sys.stderr.write('2. Followed by 1 or more field definition lines.\n')
-        sys.stderr.write("File '%s'...\n" % (field_num + 1, file_.name))
-        sys.stderr.write(HORIZ_LINE)        
-        sys.stderr.write('%s\n' % ', '.join(field_def))
-        sys.stderr.write(HORIZ_LINE)                
+        sys.stderr.write("File '%s'\n" % file_.name)
         sys.exit(1)
     
     def parse_record(self, record_num, record, debug):
-        """Build struct fmt string and parse data (meat of the program)"""
+        """Decode record with the compiled layout (meat of the program)"""
         if not record:
             return
-        struct_str = self.struct_str
-        struct_mismatch = (self.sum_of_field_lengths != len(record))
-        if struct_mismatch:
-            lengths, record = self._warning_struct_mismatch(
-                self.field_lengths, record)
-            struct_str = 's'.join([ str(i) for i in self.field_lengths ]) + 's'
+        if self.where and not self.where(record):
+            return
+        layout = self.layout
+        if self.is_variable:
+            # compiled for the record's OCCURS DEPENDING ON counts
+            try:
+                layout = self.layout.variant_for(record)
+            except LayoutError, error_mesg:
+                sys.stderr.write('ERROR: %s\n' % error_mesg)
+                sys.stderr.write('Record Number: %s\n' % record_num)
+                sys.exit(1)
+        decode = layout.decode
+        if layout.record_length != len(record):
+            decode = self._warning_struct_mismatch(record_num, record,
+                layout).decode
         if debug:
-            sys.stdout.write("RECORD STRUCT FMT: '%s'\n" % struct_str)
+            sys.stdout.write("RECORD STRUCT FMT: '%s'\n" % layout.struct_fmt)
             sys.stdout.write(HORIZ_LINE)
-        data = struct.unpack(struct_str, record)
-        data = [ self.fields[i].get_value(i + 1, data[i]) 
-            for i in self.field_idx ]
-        return ', '.join([ repr(i) for i in data ])
-
-    def _warning_struct_mismatch(self, record_num, record):
-        """mismatch: sum of field sizes not matching size of the data record"""
-        struct_len = sum(self.field_lengths)
-        record_len = len(record)
-        sys.stderr.write('WARNING: ')
-        sys.stderr.write('Sum of field lengths & record length mimatch.\n')
-        sys.stderr.write('\tSum of field lengths: %d\n' % struct_len)
-        sys.stderr.write('\tData record length: %d\n' % record_len)
-        if struct_len < record_len:
-            ignored_len = struct_len - record_len
-            chars_ignored_mesg = '\t%d trailing characters ignored in record.\n' 
-            sys.stderr.write(chars_ignored_mesg % ignored_len)
-            sys.stderr.write(HORIZ_LINE)
-            sys.stderr.write('%s\n' % record[:-ignored_len])
-            sys.stderr.write(HORIZ_LINE)
-            return field_lengths, record[:struct_length]      
-            field_ends_at = enumerate(self.field_ends_at)
-            field_num = [ i for i, j in field_ends_at if j > record_len ]
-            sys.stderr.write('Field #%d truncated.\n' % field_num)
-            mesg = 'No record data for field #%d.\n'
-            if field_num == len(self.field_lengths):
-                sys.stderr.write(mesg % field_num)
-            else:
-                mesg = mesg[:-6] + 's #%d-%d.\n' 
-                sys.stderr.write(mesg % (field_num, self.num_fields))
-            field_lengths[field_num - 1] = field_size_sum - record_length
-            return field_lengths[:field_num], record
-          
-    def remove_filler(self, record_num, record):
-        pass
+        try:
+            data = decode(record)
+        except DECODE_ERRORS:
+            field_num, column, field_data = layout.find_error(record)
+            field = Field(field_num, [column.name, column.data_type,
+                str(column.length), str(column.decimal_pos)], self.copybook)
+            field._error_data_type_conversion(record_num, field_data)
+        return self.format_record(data, layout.names if self.is_variable
+            else None)
+
+    def parse_batch(self, record_nums, batch, output):
+        """Append each formatted record of a batch of records to output
+        record_nums (iterator) - record numbers, continued from batch to batch
+        output (list) - formatted records, with line terminators
+        """
+        parse_record, append = self.parse_record, output.append
+        for record, record_num in izip(batch, record_nums):
+            record = parse_record(record_num, record, False)
+            if record:
+                append(record + '\n')
+
+    def parse_record_from(self, record_num, buf, start, end, text=None):
+        """parse_record of buf[start:end], decoded in place, without copying
+        the record out of buf, when it fits the layout
+        text (string) - buf transcoded from the code page, EBCDIC records
+            are copied & transcoded one at a time without it
+        """
+        layout = self.layout
+        if (self.is_variable or end - start != layout.record_length or
+            (layout.table and text is None)):
+            return self.parse_record(record_num, buf[start:end], False)
+        if self.where and not self.where(buf, start):
+            return
+        try:
+            return self.format_record(layout.decode_from(buf, start, text))
+        except DECODE_ERRORS:
+            # reported by parse_record
+            return self.parse_record(record_num, buf[start:end], False)
+
+    def _warning_struct_mismatch(self, record_num, record, layout):
+        """mismatch: sum of field sizes not matching size of the data record,
+        counted per record length & reported by report_mismatches
+        returns (LengthMismatch) - decoder of records of the length
+        """
+        key = (layout, len(record))
+        mismatch = self.mismatches.get(key)
+        if mismatch is None:
+            mismatch = LengthMismatch(layout, len(record), record_num)
+            self.mismatches[key] = mismatch
+        mismatch.count += 1
+        return mismatch
+
+    def report_mismatches(self):
+        """Write the record length mismatch counts, once, after the records"""
+        if not self.mismatches:
+            return
+        mismatches = sorted(self.mismatches.values(), key=lambda i: i.first)
+        self.mismatches = {}
+        total = sum([ i.count for i in mismatches ])
+        sys.stderr.write('WARNING: Sum of field lengths & record length '
+            'mismatch, %d %s.\n' % (total, 'record' if total == 1 else
+            'records'))
+        for mismatch in mismatches:
+            sys.stderr.write(str(mismatch))
 
    
 def main(args):
-    fields = load.csv_(args.copybook, strip_="right", prune=True)
+    cache = LayoutCache(CACHE_DIR if args.cache else None)
+    entry = cache.copybook(args.copybook, parse_copybook, 'cobol2csv',
+        args.codepage)
     datetime_output_fmt = FormatDateTimeOutput(
         date_fmt = '%Y-%m-%d', time_fmt = '%H:%M:%S.%f')
-    data = Data(fields, args, datetime_output_fmt)
-    record = True
-    record_num = 1
-    while record:
-        line = args.datafile.readline()
-        if args.debug and line:
+    data = Data(entry['fields'], args, datetime_output_fmt, entry['code'])
+    cache.save(entry)
+    args.rdw = args.rdw or args.bdw
+    if args.rdw and (args.binary or args.numpy or args.workers > 1 or
+        args.pipeline):
+        sys.stderr.write('ERROR: --rdw & --bdw records are framed by '
+            'descriptor words, --binary, --numpy, --workers & --pipeline '
+            'are not supported.\n')
+        sys.exit(1)
+    if args.routes or args.record_type:
+        return dispatch_convert(data, cache, datetime_output_fmt, args)
+    if data.is_variable and (args.binary or args.numpy or args.workers > 1):
+        sys.stderr.write('ERROR: OCCURS DEPENDING ON records have no fixed '
+            'length, --binary, --numpy & --workers need one.\n')
+        sys.exit(1)
+    if args.where and args.numpy:
+        sys.stderr.write('ERROR: --where is not supported with --numpy.\n')
+        sys.exit(1)
+    if args.workers > 1:
+        return parallel_convert(data, args)
+    if args.pipeline and not args.debug and not args.numpy:
+        return pipelined_convert(data, args)
+    # debug output is interleaved with the records
+    out = writers.Writer(sys.stdout, data.format_record,
+        0 if args.debug else writers.BUFFER_SIZE)
+    try:
+        convert(data, out, args)
+    except LayoutError, error_mesg:
+        # invalid descriptor words
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+    finally:
+        # records decoded before an error are written
+        out.close()
+        data.report_mismatches()
+
+def convert(data, out, args):
+    if args.numpy:
+        return columnar(data, out, args)
+    if args.rdw and not args.debug:
+        return vb_convert(data, out, args)
+    buf = None if args.debug else records.map_file(args.datafile)
+    if buf is not None:
+        return mapped_convert(data, buf, out, args)
+    if not args.debug:
+        return stream_convert(data, out, args)
+    for record_num, line in enumerate(read_records(data, args), 1):
+        if args.debug:
             sys.stdout.write('%s\n' % DBL_HORIZ_LINE)
             sys.stdout.write('RECORD NUMBER: %d\n' % record_num)
-            sys.stdout.write('%s%s%s' % (HORIZ_LINE, line, HORIZ_LINE))
+            sys.stdout.write('%s%s\n%s' % (HORIZ_LINE, line, HORIZ_LINE))
         record = data.parse_record(record_num, line, args.debug)
         if record:
-            print record
-        record_num += 1      
+            out.write(record)
+
+def dispatch_convert(data, cache, datetime_output_fmt, args):
+    """Decode each record with the copybook of its record type, see
+    dispatch.py, & write it to that copybook's output
+    data (Data) - copybook of records of any other type"""
+    if not (args.routes and args.record_type):
+        sys.stderr.write('ERROR: --record-type & --layout are used together.\n')
+        sys.exit(1)
+    if (args.numpy or args.workers > 1 or args.pipeline or args.columns or
+        args.where):
+        sys.stderr.write('ERROR: --numpy, --workers, --pipeline, --columns & '
+            '--where are not supported with --layout.\n')
+        sys.exit(1)
+    buffer_size = 0 if args.debug else writers.BUFFER_SIZE
+    # output file name: Writer, shared so records written to the same output
+    # stay in record order
+    outputs = {None: writers.Writer(sys.stdout, buffer_size=buffer_size)}
+    routes = {}
+    try:
+        for type_, copybook, output in args.routes:
+            try:
+                copybook = open(copybook)
+                if output not in outputs:
+                    outputs[output] = writers.Writer(open(output, 'wb'),
+                        buffer_size=buffer_size)
+            except IOError, error_mesg:
+                sys.stderr.write('ERROR: %s\n' % error_mesg)
+                sys.exit(1)
+            entry = cache.copybook(copybook, parse_copybook, 'cobol2csv',
+                args.codepage)
+            routes[type_] = (Data(entry['fields'], args, datetime_output_fmt,
+                entry['code'], copybook), outputs[output])
+            cache.save(entry)
+        all_data = [data] + [ i[0] for i in routes.values() ]
+        if args.binary and ([ i for i in all_data if i.is_variable ] or
+            len(set([ i.sum_of_field_lengths for i in all_data ])) > 1):
+            sys.stderr.write('ERROR: --binary records of mixed types need one '
+                'fixed length, the same for every copybook.\n')
+            sys.exit(1)
+        try:
+            dispatch = Dispatcher(args.record_type[0], args.record_type[1],
+                routes, (data, outputs[None]), data.layout.table)
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+        buf = None
+        if not (args.debug or args.rdw):
+            buf = records.map_file(args.datafile)
+        if buf is not None:
+            dispatch_mapped(data, dispatch, buf, args)
+        else:
+            dispatch_records(data, dispatch, args)
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+    finally:
+        # records decoded before an error are written
+        for output, out in outputs.items():
+            out.close()
+            if output:
+                out.file.close()
+        data.report_mismatches()
+        for route_data, out in routes.values():
+            route_data.report_mismatches()
+
+def dispatch_records(data, dispatch, args):
+    for record_num, line in enumerate(read_records(data, args), 1):
+        if args.debug:
+            sys.stdout.write('%s\n' % DBL_HORIZ_LINE)
+            sys.stdout.write('RECORD NUMBER: %d\n' % record_num)
+            sys.stdout.write('%s%s\n%s' % (HORIZ_LINE, line, HORIZ_LINE))
+        record_data, out = dispatch(line)
+        record = record_data.parse_record(record_num, line, args.debug)
+        if record:
+            out.write(record)
+
+def dispatch_mapped(data, dispatch, buf, args):
+    """dispatch_records, decoded in place in the memory-mapped data file"""
+    if args.binary:
+        spans = records.fixed_spans(len(buf), data.sum_of_field_lengths)
+    else:
+        spans = records.line_spans(buf)
+    for record_num, (start, end) in enumerate(spans, 1):
+        record_data, out = dispatch(buf, start)
+        record = record_data.parse_record_from(record_num, buf, start, end)
+        if record:
+            out.write(record)
+
+def parse_copybook(lines):
+    return list(load.iter_csv(lines, strip_='right', prune=True))
+
+def read_records(data, args):
+    """Records without line terminators, framed by newlines or, in binary
+    mode, by the sum of field lengths or by descriptor words"""
+    if args.rdw:
+        return records.vb_records(args.datafile, args.bdw)
+    if args.binary:
+        return records.fixed_records(args.datafile, data.sum_of_field_lengths)
+    return ( i.rstrip('\r\n') for i in iter(args.datafile.readline, '') )
+
+def mapped_convert(data, buf, out, args):
+    """Decode records in place in the memory-mapped data file"""
+    if args.binary:
+        spans = records.fixed_spans(len(buf), data.sum_of_field_lengths)
+    else:
+        spans = records.line_spans(buf)
+    if data.layout.table:
+        return transcoded_convert(data, buf, spans, out)
+    parse_record_from, write = data.parse_record_from, out.write
+    for record_num, (start, end) in enumerate(spans, 1):
+        record = parse_record_from(record_num, buf, start, end)
+        if record:
+            write(record)
+
+def transcoded_convert(data, buf, spans, out):
+    """mapped_convert of EBCDIC records, a block of records is copied out of
+    the map & transcoded at a time, then its records are decoded in place"""
+    parse_record_from, write = data.parse_record_from, out.write
+    transcode = data.layout.transcode
+    record_num = 1
+    for block in records.span_blocks(spans):
+        base = block[0][0]
+        chunk = buf[base:block[-1][1]]
+        text = transcode(chunk)
+        for start, end in block:
+            record = parse_record_from(record_num, chunk, start - base,
+                end - base, text)
+            record_num += 1
+            if record:
+                write(record)
+
+def vb_convert(data, out, args):
+    """Decode variable-length records in place in the read buffers"""
+    buffered_convert(data, records.vb_spans(args.datafile, args.bdw), out)
+
+def stream_convert(data, out, args):
+    """Decode records of a data file that can't be memory-mapped, i.e. stdin,
+    in place in the read buffers"""
+    size = data.sum_of_field_lengths if args.binary else 0
+    buffered_convert(data, records.stream_spans(args.datafile, size), out)
+
+def buffered_convert(data, spans, out):
+    """Decode the (buffer, start, end) records of spans in place, EBCDIC
+    buffers are transcoded once each"""
+    parse_record_from, write = data.parse_record_from, out.write
+    transcode = data.layout.transcode if data.layout.table else None
+    last_buf = text = None
+    for record_num, (buf, start, end) in enumerate(spans, 1):
+        if transcode and buf is not last_buf:
+            last_buf, text = buf, transcode(buf)
+        record = parse_record_from(record_num, buf, start, end, text)
+        if record:
+            write(record)
+
+def pipelined_convert(data, args):
+    """Read, decode & write in overlapping stages, see pipeline.py"""
+    size = data.sum_of_field_lengths
+    if args.binary:
+        batches = ( [ buf[i:i + size] for i in xrange(0, len(buf), size) ]
+            for buf in records.fixed_blocks(args.datafile, size) )
+    else:
+        batches = ( [ i.rstrip('\r\n') for i in batch ]
+            for batch in pipeline.line_batches(args.datafile) )
+    record_nums = count(1)
+    try:
+        pipeline.run(batches, lambda batch, output: data.parse_batch(
+            record_nums, batch, output), sys.stdout.write)
+    finally:
+        data.report_mismatches()
+
+def terminator(args):
+    if args.binary:
+        return ''
+    return '\n'
+
+def parallel_convert(data, args):
+    """Decode record-aligned chunks of the data file in worker processes"""
+    if args.datafile is sys.stdin:
+        sys.stderr.write('ERROR: --workers requires a DATAFILE filename.\n')
+        sys.exit(1)
+    try:
+        parallel.convert(data.layout, args.datafile.name, sys.stdout,
+            args.workers, data.format_record, terminator(args), args.numpy,
+            where=args.where)
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+
+def columnar(data, out, args):
+    """Decode blocks of records column-at-a-time"""
+    # imports NumPy, only when used
+    from columnar import ColumnarDecoder
+    try:
+        decoder = ColumnarDecoder(data.layout, terminator(args))
+        for columns in decoder.blocks(args.datafile):
+            for record in decoder.rows(columns):
+                out.write_record(record)
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
 
 if __name__ == '__main__':
     from cmd_line_args import Args
     args = Args(USAGE, __version__)
     args.allow_stdin()
     args.add_files('copybook', 'datafile')
-    args.add_options('debug')
+    args.add_options('debug', 'binary', 'variable', 'cache', 'codepage',
+        'numpy', 'pipeline', 'workers', 'format', 'columns', 'where')
+    args.parser.add_argument('--record-type', type=byte_range,
+        metavar='START:END', help='Byte range of the record type of mixed '
+        'record type files, zero-based, i.e. 0:1 is the first byte.')
+    args.parser.add_argument('--layout', action='append', type=route_arg,
+        dest='routes', metavar='TYPE=COPYBOOK[,OUTPUT]', help='Copybook of '
+        'the records of a record type & their output file, default stdout. '
+        'Records of other types are decoded with COPYBOOK.  Repeatable.')
     main(args.parse())
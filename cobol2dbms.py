@@ -9,9 +9,10 @@ Uses copybook2django.py output for database model
 Parses COBOL fixed-width data file and populates
 relational database.  Data is normalized.
 
-For each record loops through fields in copybook2csv
-Parsing out data from recordds one field at a time.
-When a field endswith ':' it indicates the start of a loop
+The copybook2csv fields are compiled once into a flat
+program of fixed-slice runs & loops, each record is parsed
+by walking it. When a field endswith ':' it indicates the
+start of a loop
 ----------------------------------------------------------
 :Version: 0.8
 :Date: June 2010
@@ -42,11 +43,22 @@ import os.path
 import re
 import struct
 import sys
+from collections import deque
+from itertools import islice
 import django.core.exceptions
 from datetime import datetime
+from django.db import DatabaseError
 
+import ebcdic
 import load
 import names
+from bulk import BulkLoader
+from cache import CACHE_DIR, LayoutCache
+from index import line_index, open_data
+from layout import Column, DECODE_ERRORS, LayoutError, compile_layout
+from occurs import Program
+from records import BUFFER_SIZE
+from where import Where
 from xsplicer import Splice
 from autosize import TextTable
 
@@ -66,10 +78,16 @@ class Debug:
 
 class Field:
     """Field definitions based on copybook2csv.py output"""
-    def __init__(self, line):
+    def __init__(self, line, code=None, pad=' '):
         """Field constructor
         :type line: list 
         :param line: line from copybook2csv split at ','
+
+        :type code: dict or None
+        :param code: compiled converters keyed by source, see cache.py
+
+        :type pad: string
+        :param pad: space character of packed fields, EBCDIC or ASCII
              
         """
         self.value = None
@@ -84,54 +102,22 @@ class Field:
             self.name = names.legal_db_name(name)
             self.length = int(length) 
             self.decimal_pos = int(decimal_pos)
+            self.column = Column(self.name, self.type, length, decimal_pos,
+                pad=pad, code=code)
+            # read from the transcoded record when the data is EBCDIC
+            self.is_text = not (self.column.is_packed or
+                self.column.is_binary)
     
     def get_value(self, data):
-        """Value type conversions
+        """Value type conversions, compiled from the field's data-type
         :type data: string 
         :param data: field data string read from record  
            
         """
-        data = data.strip()
-        if self.type != 'Char' and not data:
-            return None
         try:
-            if self.type == 'Integer':
-                data = int(data)
-            elif self.type == 'Float':
-                data = float(data)
-            elif self.type == 'Double':
-                data = double(data)
-            if self.type in ['DateTime', 'Date', 'Time'] and data:
-                if self.type == 'DateTime':
-                    if len(data) == 12:
-                        data = struct.unpack('4s2s2s2s2s', data) 
-                        yr, mon, day, hr, min = [ int(i) for i in data ]
-                        sec = 0
-                    else:        
-                        data =  struct.unpack('4s2s2s2s2s2s', data)
-                        yr, mon, day, hr, min, sec = [ int(i) for i in data ]
-                    data = datetime(yr, mon, day, hr, min, sec)
-                    data = data.strftime('%Y-%m-%d %H:%M:%S').strip()
-                elif self.type == 'Date':
-                    if data == '00000000':
-                        data = None
-                    else:
-                        data = struct.unpack('4s2s2s', data)
-                        yr, mon, day = [ int(i) for i in data ]
-                        data = datetime(yr, mon, day).strftime('%Y-%m-%d').strip()              
-                elif self.type == 'Time':
-                    if len(data) == 4:
-                        data = struct.unpack('2s2s', data) 
-                        hr, min = [ int(i) for i in data ]
-                        sec = 0
-                    else:                    
-                        data =  struct.unpack('2s2s2s', data)
-                        hr, min, sec = [ int(i) for i in data ]
-                    data = datetime(2000, 1, 1, hr, min, sec)
-                    data = data.strftime('%H:%M:%S').strip()
-        except:
+            return self.column.convert(data)
+        except DECODE_ERRORS:
             return False
-        return data
        
     def verbose(self):
         """Tuples used for generate verbose output"""
@@ -158,7 +144,6 @@ class Loop:
         :param field:   
         
         """
-        self.counter = 0
         self.start_line_num = field_num
         loop_str = field.name.split()
         if loop_str[0] == 'OCCURS':
@@ -167,39 +152,25 @@ class Loop:
             self.num_times = loop_str[1]
         else:
             self.name, self.num_times = loop_str[0], loop_str[2]
+        # copybook2csv quotes the count, i.e. 'Items OCCURS '3' TIMES:'
+        self.num_times = self.num_times.strip('"').strip("'")
         if self.num_times.isdigit():
             self.num_times = int(self.num_times)
             self.depends_on_field_name = False
         else:
-            self.num_times = self.num_times.strip('"').strip("'")
             self.depends_on_field_name = names.legal_db_name(self.num_times)
             self.num_times = 0
          
-    def loop_start(self, depend_ons):
-        """Initiate a new loop, set loop counter to desired # of iterations
+    def count(self, depend_ons):
+        """Number of iterations of a new loop
         
         :type depend_ons: dict (keys=field names)
         :param depend_ons: current field values that # of interations depend on
         
         """
-        if self.num_times:
-            self.counter = self.num_times
-        else:
-            self.counter = int(depend_ons[self.depends_on_field_name])
-    
-    def loop_next(self, field_num):
-        """Done with last line of loop, ready for next iteration
-        decrement loop counter, if counter=0 -> set end of loop flag, 
-        else reset the field_num back to the 1st line of the loop
-        
-        :rtype: tuple (boolean, int)
-        :returns:  end of loop flag, field # to continue parsing from
-        
-        """
-        self.counter = max(0, self.counter - 1) 
-        if self.counter:
-            field_num = self.start_line_num
-        return not self.counter, field_num
+        if self.depends_on_field_name:
+            return int(depend_ons[self.depends_on_field_name])
+        return self.num_times
 
     def verbose(self):
         """tuples used for generate verbose output """
@@ -213,19 +184,23 @@ class Data:
     HORIZ_SEP = '-' * 79
     HORIZ_DBL_SEP = '=' * 79
     
-    def __init__(self, fields, records, args):
+    def __init__(self, fields, records, args, code=None):
         """Data constructor
         :type fields: list of lists
         :param fields: CSV data read in from copybook2csv file 
                 
-        :type records: list
-        :param records: list of data file lines
+        :type records: iterable
+        :param records: (record number, line) pairs, see read_records,
+            consumed one record at a time
         
         :type model_name: string
         :param model_name: name of base model
         
         :type args: Namespace object
         :param args: command line arguments
+
+        :type code: dict or None
+        :param code: compiled converters keyed by source, see cache.py
         
         """
         self.MODELS = court.county_data.models
@@ -234,6 +209,17 @@ class Data:
         self.fields = fields[1:]
         self.args = args
         self.active_models = []
+        # EBCDIC to ASCII table, records are transcoded a block at a time
+        self.table, pad = None, ' '
+        if getattr(args, 'codepage', None):
+            self.table = ebcdic.table(args.codepage)
+            pad = ebcdic.space(args.codepage)
+        # transcoded block of records & the current record's offset in it
+        self.text, self.text_start = None, 0
+        self.field_defs = [ Field(i, code, pad) for i in self.fields ]
+        self.loader = None
+        if getattr(args, 'batch_size', 0) and not args.debug:
+            self.loader = BulkLoader(args.batch_size)
     
     def disp_error_mesg(self, record_num, mesg, field=None, ch_pos=None):
         """Display error message       
@@ -259,9 +245,10 @@ class Data:
             mesg = '%sField: %s' % (mesg, field_str)
         sys.stderr.write('%s\n%s\n' % (mesg, self.HORIZ_DBL_SEP))
 
-    def get_value(self, ch_pos, record_num, record, field):
-        """Read field's data string from record, convert to proper data type
-        move character position counter to point to beginning of next field        
+    def get_values(self, ch_pos, record_num, record, fields, length):
+        """Read a run of fields' data strings from record, convert each to
+        proper data type, move character position counter to point to
+        beginning of the field after the run
         
         :type ch_pos: int
         :param ch_pos: current character position in record
@@ -272,73 +259,41 @@ class Data:
         :type record: string
         :param record: line in data file
 
-        :type field: Field object
-        :param field: current field to extract from record
+        :type fields: list of tuples
+        :param fields: (Field, start, end, depended_on) of the run, see Program
+        
+        :type length: int
+        :param length: total length of the run's fields
         
-        :rtype: tuple (int, char|int|float|double)
-        :returns: next field's character position in record, value of field
+        :rtype: tuple (int, list)
+        :returns: next field's character position in record,
+            (Field, value, depended_on) of each field
         
         """
-        record = self.records[record_num]
-        if ch_pos + field.length > len(record) - 1:
+        if ch_pos + length > len(record):
+            for field, start, end, depended_on in fields:
+                if ch_pos + end > len(record):
+                    break
             mesg = 'Field size exceeds length of data'
-            self.disp_error_mesg(record_num, mesg, field, ch_pos)
+            self.disp_error_mesg(record_num, mesg, field, ch_pos + start)
             sys.exit(1)
-        data = record[ch_pos:ch_pos + field.length]
-        if field.decimal_pos:
-            pos = field.length - field.decimal_pos
-            data = '%s.%s' % (data[:pos], data[pos:])
-        value = field.get_value(data)
-        if value is False:
-            mesg = 'Unable to convert %r to %s' % (data, field.type)
-            self.disp_error_mesg(record_num, mesg, field, ch_pos)
-            value = None
-        return ch_pos + field.length, value
-
-    def start_loop(self, loop, depend_ons):
-        """Initialize new loop, set counter
-        :type loop: Loop object
-        :param loop: current loop
-        
-        :type depend_ons: dict (keys=field names)
-        :param depend_ons: field values that # of interations depend on
-        
-        """
-        loop.loop_start(depend_ons)
-
+        text, base = record, ch_pos
+        if self.table:
+            text, base = self.text, self.text_start + ch_pos
+        result = []
+        for field, start, end, depended_on in fields:
+            if field.is_text:
+                data = text[base + start:base + end]
+            else:
+                data = record[ch_pos + start:ch_pos + end]
+            value = field.get_value(data)
+            if value is False:
+                mesg = 'Unable to convert %r to %s' % (data, field.type)
+                self.disp_error_mesg(record_num, mesg, field, ch_pos + start)
+                value = None
+            result.append((field, value, depended_on))
+        return ch_pos + length, result
 
-    
-    def next_loop(self, args, record_num, field_num, loops):
-        """Next iteration of loop, decrement counter
-        :type field_num: int
-        :param field_num: line number of current field, used to track 
-            current position of parser, will be reset to beginning of
-            loop if counter is not zero.
-            
-        :type loops: dict (keys=field_num)
-        :param loops: dictionary of Loop objects, used to track & manage
-            loop interations
-        
-        :rtype: tuple (boolean, int)
-        :returns: end of loop flag (i.e. counter at 0), field number at 
-            which to continue parsing
-            
-        """
-        if self.args.verbose:
-            print 'NEXT LOOP...'
-        if self.args.ruler:
-            print '-' * self.args.ruler    
-        self.save_and_close_model(record_num)
-        loop_line_num = max([ i for i in loops.keys()
-            if i < field_num ])
-        end_of_loop, field_num = loops[loop_line_num].loop_next(field_num) 
-        if self.args.verbose:
-            print 'END OF LOOP:', end_of_loop
-            print 'FIELD_NUM:', field_num
-        if not end_of_loop:
-            self.active_models.append(self.new_model(loops[field_num].name))
-        return end_of_loop, field_num, loops
-    
     def new_model(self, name=None):
         """Create new instance of a Django Model
         :type name: string
@@ -380,11 +335,14 @@ class Data:
         model = self.active_models.pop()
         if self.args.verbose:    
             print 'SAVE MODEL', model
+        if self.loader:
+            parent = self.active_models and self.active_models[-1] or None
+            self.loader.add(model, parent)
+            return
         if not self.args.debug:
             try:
                 model.save()
-                print 'Saved record %d of %d... %s ... ID=%d' % (
-                    rec_num + 1, self.num_records + 1, 
+                print 'Saved record %d... %s ... ID=%d' % (rec_num + 1,
                     model.__class__.__name__, model.id)
             except django.core.exceptions.ValidationError as error_mesg: 
                 mesg = '%r\n' % error_mesg
@@ -418,9 +376,61 @@ class Data:
                     self.disp_error_mesg(rec_num, mesg)
                     sys.exit(1)
 
+    def save_batch(self, first_rec_num, last_rec_num, last=False):
+        """Bulk insert of the models of a batch of records
+        :type first_rec_num, last_rec_num: int (zero-based)
+        :param first_rec_num, last_rec_num: records in the batch
+        
+        :type last: boolean
+        :param last: final batch, table sequences are reset
+        
+        """
+        try:
+            if last:
+                rows = self.loader.close()
+            else:
+                rows = self.loader.flush()
+        except (django.core.exceptions.ValidationError,
+            DatabaseError) as error_mesg:
+            mesg = '%r\n' % error_mesg
+            mesg += 'Unable to save records %d to %d, batch rolled back' % (
+                first_rec_num + 1, last_rec_num + 1)
+            self.disp_error_mesg(last_rec_num, mesg)
+            sys.exit(1)
+        if rows:
+            print 'Saved records %d to %d... %d rows' % (first_rec_num + 1,
+                last_rec_num + 1, rows)
+
+    def transcoded(self, block_bytes=BUFFER_SIZE):
+        """(record number, record) pairs of self.records, EBCDIC records
+        are joined into blocks of about block_bytes, each block is
+        transcoded at once into self.text & self.text_start is set to the
+        offset of each record in it before the record is yielded
+        
+        """
+        block, size = [], 0
+        for pair in self.records:
+            block.append(pair)
+            size += len(pair[1])
+            if size < block_bytes:
+                continue
+            for pair in self._transcode_block(block):
+                yield pair
+            block, size = [], 0
+        for pair in self._transcode_block(block):
+            yield pair
+
+    def _transcode_block(self, block):
+        self.text = ''.join([ i[1] for i in block ]).translate(self.table)
+        start = 0
+        for record_num, record in block:
+            self.text_start = start
+            yield record_num, record
+            start += len(record)
+
     def parse(self):
         """Parse COBOL data records"""
-        fields = [ Field(i) for i in self.fields ]
+        fields = self.field_defs
         
         if self.args.fields:
             TextTable().show([ i.verbose() for i in fields ])
@@ -436,67 +446,64 @@ class Data:
             
         depend_ons = dict([ (i.depends_on_field_name, None) 
             for i in loops.values() if i.depends_on_field_name ])
+        program = Program(fields, loops)
+        RUN, LOOP = Program.RUN, Program.LOOP
 
-        records = range(len(self.records))
-        if args.recnum is not None:
-            records = Splice().splice(self.args.recnum, records)
-        record_num, self.num_records = records[0], records[-1]
-        while record_num <= self.num_records:
-            record = self.records[record_num]
+        batch_start = record_num = None
+        records = self.transcoded() if self.table else self.records
+        for record_num, record in records:
+            if batch_start is None:
+                batch_start = record_num
             if 'data' in self.args:
                 print record
             self.active_models = [ self.new_model() ]
-            field_num, num_fields = 0, len(fields)
-            ch_pos = last_indent = 0
-            while field_num <= num_fields:
-                if field_num == num_fields:
-                    if loops:
-                        end_of_loop, field_num, loops = self.next_loop(
-                            args, record_num, field_num, loops)
-                        if end_of_loop:
-                            break
-                    else:
-                        break
-                else:
-                    field = fields[field_num]
+            for step in program.walk(depend_ons):
+                if step[0] == RUN:
+                    fields_, length, ch_pos = step[1:]
+                    if self.args.verbose:
+                        output = 'UPDATE RECORD... CHAR POS: %r, LENGTH: %r'
+                        print output % (ch_pos, length)
+                    values = self.get_values(ch_pos, record_num, record,
+                        fields_, length)[1]
+                    for field, value, depended_on in values:
+                        self.set_value_in_model(field.name, value)
+                        if depended_on:
+                            # store value, used later for loop num_times
+                            depend_ons[field.name] = value
                     if self.args.depends:
                         print 'DEPEND ONS:'
                         TextTable().show(depend_ons.items())
+                elif step[0] == LOOP:
+                    loop, count = step[1:]
                     if self.args.verbose:
-                        print '\nFIELD_NUM: ', field_num
-                        print 'FIELD: ', self.fields[field_num]
-                    end_of_loop = False
-                    if field_num in loops.keys():
-                        if self.args.verbose:
-                            print 'START LOOP...'
-                        if self.args.ruler:
-                            print '-' * self.args.ruler   
-                        self.start_loop(loops[field_num], depend_ons)
-                        self.active_models.append(self.new_model(loops[field_num].name))
-                    elif fields[field_num].indents < last_indent:
-                        end_of_loop, field_num, loops = self.next_loop(
-                            args, record_num, field_num, loops)
-                    else:
-                        if self.args.verbose:
-                            output = 'UPDATE RECORD... CHAR POS: %r, LENGTH: %r'
-                            print output % (ch_pos, field.length)
-                        ch_pos, value = self.get_value(
-                            ch_pos, record_num, record, field)
-                        self.set_value_in_model(field.name, value)
-                        if field.name in depend_ons:
-                            # store value, will be used later for loop num_times dependency
-                            depend_ons[field.name] = value
-                last_indent = field.indents
-                if not end_of_loop:
-                    field_num += 1
+                        print 'START LOOP... %s x %d' % (loop.name, count)
+                    if self.args.ruler:
+                        print '-' * self.args.ruler
+                    if count > 0:
+                        self.active_models.append(self.new_model(loop.name))
                 else:
-                    if self.args.verbose:
+                    loop, more = step[1:]
+                    if self.args.ruler:
+                        print '-' * self.args.ruler
+                    self.save_and_close_model(record_num)
+                    if more:
+                        if self.args.verbose:
+                            print 'NEXT LOOP...'
+                        self.active_models.append(self.new_model(loop.name))
+                    elif self.args.verbose:
                         print 'END OF LOOP...'
             while self.active_models:
                 self.save_and_close_model(record_num)
-            record_num += 1
+            if self.loader and self.loader.full():
+                self.save_batch(batch_start, record_num)
+                batch_start = record_num + 1
             if self.args.ruler:
                 print self.HORIZ_DBL_SEP
+        if self.loader:
+            if batch_start is None:
+                # no records
+                batch_start = record_num = 0
+            self.save_batch(batch_start, record_num, last=True)
     
 
 def get_base_model_name(filename):
@@ -506,15 +513,76 @@ def get_base_model_name(filename):
     model_name = names.legal_db_name(model_name[0]).title()
     return model_name
 
+def parse_copybook(lines):
+    return list(load.iter_csv(lines, strip_='right', prune=True))
+
+def read_records(file_, recnum=None):
+    """Stream of (record number, record) pairs, zero-based, records without
+    line terminators, read a line at a time so memory use doesn't depend on
+    the size of the file
+    
+    :type file_: file or string
+    :param file_: data file or its filename
+    
+    :type recnum: string or None
+    :param recnum: splice of record numbers, i.e. 3:5, negative numbers
+        count from the end of the file
+    
+    A splice of a data file (not stdin) is read by seeking to its records,
+    with the record offset index of the file, see index.py
+    
+    """
+    if not isinstance(file_, file):
+        if recnum is not None:
+            data = open_data(file_)
+            index = line_index(file_, data)
+            start, stop = Splice().get_values(recnum)[:2]
+            start, stop = slice(start, stop).indices(index.count)[:2]
+            return index.records(data, start, stop)
+        file_ = open(file_)
+    records = enumerate( i.rstrip('\r\n')
+        for i in iter(file_.readline, '') )
+    if recnum is None:
+        return records
+    start, stop = Splice().get_values(recnum)[:2]
+    start = start or 0
+    if start < 0:
+        # only the tail of the file is kept
+        records = deque(records, -start)
+        start = 0
+        if stop is not None and stop < 0:
+            stop = max(0, len(records) + stop)
+    elif stop is not None and stop < 0:
+        # the end isn't known until it's read, hold back -stop records
+        return _drop_last(islice(records, start, None), -stop)
+    return islice(records, start, stop)
+
+def _drop_last(records, count):
+    """records except for the last count of them"""
+    held = deque()
+    for record in records:
+        held.append(record)
+        if len(held) > count:
+            yield held.popleft()
+
 def main(args):
-    fields = load.csv_(args.copybook, strip="right", prune=True)
-    stop = None
-    if args.recnum:
-        stop = Splice().get_values(args.recnum)[1]
-        if stop < 0:
-            stop = None
-    records = load.lines(args.datafile, stop_at_line=stop)
-    Data(fields, records, args).parse()
+    cache = LayoutCache(CACHE_DIR if args.cache else None)
+    entry = cache.copybook(open(args.copybook), parse_copybook, 'cobol2dbms',
+        args.codepage)
+    records = read_records(args.datafile, args.recnum)
+    if args.where:
+        # records are tested before their models are built
+        try:
+            match = Where(args.where).compile(compile_layout(
+                entry['fields'][1:], codepage=args.codepage,
+                code=entry['code']))
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+        records = ( i for i in records if match(i[1]) )
+    data = Data(entry['fields'], records, args, entry['code'])
+    cache.save(entry)
+    data.parse()
 
 if __name__ == '__main__':
     import argparse, argparse_ver
@@ -527,6 +595,11 @@ if __name__ == '__main__':
         help='filename... copybook2csv.py output')
     parser.add_argument('datafile', nargs='?', 
         help='filename... text file, COBOL fixed-width records')  
+    parser.add_argument('-b', '--batch-size', type=int, default=0,
+        help='insert models in bulk, a transaction per batch of N models, '
+        'default=0 saves each model')
+    parser.add_argument('--codepage', choices=ebcdic.CODEPAGES,
+        help='EBCDIC code page of the data, text fields are transcoded to ASCII')
     parser.add_argument('-d', '--debug', action='store_true', 
         help='process without writing to database')  
     parser.add_argument('--depends', action='store_true',
@@ -536,12 +609,16 @@ if __name__ == '__main__':
     parser.add_argument('-i', '--indent', type=int, default=38,
         help='number of characters to indent when displaying field values, default=38')    
     parser.add_argument('--license', action='store_true', help='display license information')    
+    parser.add_argument('--no-cache', action='store_false', dest='cache',
+        help='compile the copybook without the layout cache')
     parser.add_argument('--loops', action='store_true',
         help='display loops')    
     parser.add_argument('-r', '--recnum',
         help='record numbers to display, accepts splices, i.e. 3:5')    
     parser.add_argument('--ruler', type=int, default=78,
         help='length of horizontal ruler between loops & records, default=79, 0=disable')    
+    parser.add_argument('--where',
+        help="records to load, i.e. \"rec_type = 'D' and branch in (12,15)\"")
     parser.add_argument('-v', '--values', action='store_true', 
         help='display field values')  
     parser.add_argument('--verbose', action='store_true', 
@@ -549,11 +626,11 @@ if __name__ == '__main__':
     parser.add_argument('-V', '--version', action=argparse_ver.VersionAction, 
         help='display version information and exit')
     args = parser.parse_args()
-    if not sys.stdin.isatty():
+    if not args.datafile:
+        if sys.stdin.isatty():
+            parser.print_help()
+            sys.exit()
         args.datafile = sys.stdin
-    elif not args.datafile:
-        parser.print_help()
-        sys.exit()
     main(args)
 
       
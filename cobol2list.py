@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-__version__ = """COBOL Fixed-length Data Parser ver 0.2
-Note: This version does not work with OCCURS in Copybook files,
-but is a lot faster than the varaible length data parser modules.
+__version__ = """COBOL Fixed-length Data Parser ver 0.3
+OCCURS tables are flattened into numbered fields, i.e. items_1_amount.
+OCCURS DEPENDING ON requires newline terminated or RDW records.
 
 License: GPLv3, Copyright (C) 2010 Brian Peterson
 This is free software.  There is NO warranty; 
@@ -11,26 +11,213 @@ not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 USAGE = """copybook2list.py CopybookFile"""
 
 import load
+import parallel
+import records
+from cache import CACHE_DIR, LayoutCache
+from layout import DECODE_ERRORS, LayoutError, VariableLayout, \
+    compile_layout
+from where import Where
 import csv, struct, sys
 
-def parse_data(struct_fmt, lines):
+def parse_data(struct_fmt, lines, match=None):
+    """Split records into raw field strings, one record at a time, only
+    those passing match (see where.py)"""
+    struct_ = struct.Struct(struct_fmt)
+    size = struct_.size
+    mismatch = False
+    for line in lines:
+        if match and not match(line):
+            continue
+        if len(line) != size:
+            if not mismatch:
+                sys.stderr.write('Record layout vs. record size mismatch\n')
+                mismatch = True
+            line = line.ljust(size)[:size]
+        yield struct_.unpack(line)
+
+def unpack_data(layout, lines, match=None):
+    """Split records into raw field strings by the OCCURS DEPENDING ON
+    variant of each record"""
+    mismatch = False
+    for line in lines:
+        if match and not match(line):
+            continue
+        try:
+            yield layout.unpack(line)
+        except struct.error:
+            if not mismatch:
+                sys.stderr.write('Record layout vs. record size mismatch\n')
+                mismatch = True
+            yield layout.unpack(layout.fit(line))
+
+def decode_data(layout, spans, match=None):
+    """Convert records to Copybook defined data-types with the compiled
+    layout decoder, records that fit their layout are decoded in place in
+    the read buffers, EBCDIC buffers are transcoded once each
+    spans (iterable) - (buffer, start, end) of each record, see read_spans
+    """
+    decode, variable = layout.decode, isinstance(layout, VariableLayout)
+    mismatch = False
+    last_buf = text = None
+    for record_num, (buf, start, end) in enumerate(spans):
+        if layout.table and buf is not last_buf:
+            last_buf, text = buf, layout.transcode(buf)
+        fixed = layout
+        if variable:
+            # the OCCURS DEPENDING ON variant, invalid counts are reported
+            # by decode
+            try:
+                fixed = layout.variant(layout.counts(buf, start))
+            except LayoutError:
+                fixed = None
+        if fixed and end - start == fixed.record_length:
+            if match and not match(buf, start):
+                continue
+            try:
+                record = fixed.decode_from(buf, start, text)
+            except DECODE_ERRORS:
+                pass
+            else:
+                yield record
+                continue
+        line = buf[start:end]
+        if match and not match(line):
+            continue
+        try:
+            try:
+                record = decode(line)
+            except struct.error:
+                if not mismatch:
+                    sys.stderr.write('Record layout vs. record size '
+                        'mismatch\n')
+                    mismatch = True
+                record = decode(layout.fit(line))
+        except DECODE_ERRORS:
+            field_num, column, data = layout.find_error(layout.fit(line))
+            sys.stderr.write('ERROR: Unable to convert string to %s.\n' %
+                column.data_type)
+            sys.stderr.write('Record Number: %d\n' % (record_num + 1))
+            sys.stderr.write('Field Name: %s\n' % column.name)
+            sys.stderr.write('Record Data: %r\n' % data)
+            sys.exit(1)
+        yield record
+
+def read_lines(args):
+    """Records of the data file without line terminators or descriptor
+    words, read one at a time"""
+    if args.rdw:
+        # raises LayoutError on invalid descriptor words, once read
+        return records.vb_records(args.datafile, args.bdw)
+    return load.iter_lines(args.datafile, strip_='right', strip_chars='\r\n')
+
+def read_spans(args):
+    """(buffer, start, end) of each record of the data file, read in large
+    buffers of whole records"""
+    if args.rdw:
+        # raises LayoutError on invalid descriptor words, once read
+        return records.vb_spans(args.datafile, args.bdw)
+    return records.stream_spans(args.datafile)
+
+def binary(layout, args, match=None):
+    """Fixed-length records without line terminators, unpacked in place"""
     try:
-      return [ struct.unpack(struct_fmt, i) for i in lines ]
-    except struct.error:
-        sys.stderr.write('Record layout vs. record size mismatch\n')
-        size = sum([ int(i) for i in struct_fmt.split('s')[:-1] ])
-        return [ struct.unpack(struct_fmt, i.ljust(size)[:size]) 
-          for i in lines ]
+        if args.convert:
+            for record_num, record in records.decode_fixed(layout,
+                args.datafile, match=match):
+                print record
+        else:
+            for record in records.iter_unpack(layout.struct, args.datafile,
+                match=match):
+                print record
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+
+def variable(layout, args, match=None):
+    """OCCURS DEPENDING ON records, one per line"""
+    if args.struct or args.binary or args.numpy or args.workers > 1:
+        sys.stderr.write('ERROR: OCCURS DEPENDING ON records have no fixed '
+            'length, --struct, --binary, --numpy & --workers need one.\n')
+        sys.exit(1)
+    try:
+        if args.convert:
+            for record in decode_data(layout, read_spans(args), match):
+                print record
+        else:
+            for record in unpack_data(layout, read_lines(args), match):
+                print record
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+
+def parse_copybook(lines):
+    # OCCURS tables are tab indented
+    return list(load.iter_csv(lines, strip_='right', prune=True))
 
 def main(args):  
-    copybook = load.csv_(args.copybook.readlines(), strip_=True)[1:]
-    field_lengths = [ int(i[2]) for i in copybook ]
-    struct_fmt = 's'.join([ str(i) for i in field_lengths ]) + 's'
-    if args.struct:
-        print struct_fmt
+    cache = LayoutCache(CACHE_DIR if args.cache else None)
+    entry = cache.copybook(args.copybook, parse_copybook, 'cobol2list',
+        args.codepage)
+    copybook = entry['fields']
+    try:
+        layout = compile_layout(copybook[1:], copybook[0][0],
+            codepage=args.codepage, code=entry['code'], select=args.columns,
+            filler=args.filler)
+        # record filter, tested before a record is unpacked
+        match = Where(args.where).compile(layout) if args.where else None
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+    cache.save(entry)
+    terminator = '' if args.binary else '\n'
+    args.rdw = args.rdw or args.bdw
+    if args.rdw and (args.binary or args.numpy or args.workers > 1):
+        sys.stderr.write('ERROR: --rdw & --bdw records are framed by '
+            'descriptor words, --binary, --numpy & --workers are not '
+            'supported.\n')
+        sys.exit(1)
+    if args.where and args.numpy:
+        sys.stderr.write('ERROR: --where is not supported with --numpy.\n')
+        sys.exit(1)
+    if isinstance(layout, VariableLayout):
+        variable(layout, args, match)
+    elif args.struct:
+        print layout.struct_fmt
+    elif args.workers > 1:
+        if args.datafile is sys.stdin:
+            sys.stderr.write('ERROR: --workers requires a datafile filename.\n')
+            sys.exit(1)
+        try:
+            parallel.convert(layout, args.datafile.name, sys.stdout,
+                args.workers, str, terminator, args.numpy, where=args.where)
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+    elif args.numpy:
+        # imports NumPy, only when used
+        from columnar import ColumnarDecoder
+        try:
+            decoder = ColumnarDecoder(layout, terminator)
+            for columns in decoder.blocks(args.datafile):
+                for record in decoder.rows(columns):
+                    print record
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
+    elif args.binary:
+        binary(layout, args, match)
     else:
-        for record in parse_data(struct_fmt, load.lines(args.datafile)):
-            print record
+        try:
+            if args.convert:
+                for record in decode_data(layout, read_spans(args), match):
+                    print record
+            else:
+                for record in parse_data(layout.struct_fmt, read_lines(args),
+                    match):
+                    print record
+        except LayoutError, error_mesg:
+            sys.stderr.write('ERROR: %s\n' % error_mesg)
+            sys.exit(1)
 
 if __name__ == '__main__':
     from cmd_line_args import Args
@@ -39,4 +226,8 @@ if __name__ == '__main__':
     args.add_files('datafile', 'copybook')
     args.parser.add_argument('-s', '--struct', action='store_true',
         help='show structure format')
+    args.parser.add_argument('-c', '--convert', action='store_true',
+        help='convert fields to Copybook defined data-types')
+    args.add_options('binary', 'variable', 'cache', 'codepage', 'numpy',
+        'workers', 'columns', 'where')
     main(args.parse())
\ No newline at end of file
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+__version__ = """COBOL-to-SQL Loader ver 0.1
+Loads COBOL records into normalized tables through the Python DB-API,
+without Django: a table per record plus a child table per OCCURS group.
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+USAGE = """cobol2sql.py COPYBOOK [DATAFILE] -o DATABASE
+COPYBOOK - Filename: output from copybook2csv.py
+DATAFILE - Filename: COBOL records, fixed-width text
+DATABASE - Filename: SQLite database, tables are created if they don't exist
+"""
+
+import ebcdic
+import load
+import records
+from cache import CACHE_DIR, LayoutCache
+from layout import DECODE_ERRORS, Layout, LayoutError, copybook_rows, \
+    depending_on, parse_occurs, table_name
+import sqlite3, sys
+from decimal import Decimal
+
+# rows buffered before each executemany & commit
+BATCH_SIZE = 10000
+# DB-API paramstyle: placeholder of parameter # n
+PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s',
+    'numeric': ':%d'}
+
+
+def quote(name):
+    """SQL delimited identifier, COBOL names can be SQL keywords, i.e.
+    ORDER or DATE"""
+    return '"%s"' % name.replace('"', '""')
+
+class Table:
+    """Table of the record or of an OCCURS group, child tables reference
+    their parent table's row & number their rows by occurrence (seq)"""
+
+    # data-type: SQL type of integers & of floating point values
+    FLOAT_TYPES = {'HEXFLOAT': 'REAL', 'IEEEFLOAT': 'REAL',
+        'HEXDOUBLE': 'DOUBLE PRECISION', 'IEEEDOUBLE': 'DOUBLE PRECISION'}
+    TEXT_TYPES = ['CHAR', 'DATE', 'TIME', 'DATETIME']
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.columns = []
+        self.keys = ['id']
+        if parent:
+            self.keys += ['%s_id' % parent.name, 'seq']
+        self.names = list(self.keys)
+
+    def add_column(self, column):
+        """Add a Column, returns its SQL column name, unique in the table"""
+        name, num = column.name, 1
+        while name in self.names:
+            num += 1
+            name = '%s_%d' % (column.name, num)
+        self.columns.append(column)
+        self.names.append(name)
+        return name
+
+    def sql_type(self, column):
+        if column.base_type in self.TEXT_TYPES:
+            return 'VARCHAR(%d)' % column.length
+        if column.base_type in self.FLOAT_TYPES:
+            return self.FLOAT_TYPES[column.base_type]
+        if column.decimal_pos:
+            return 'DECIMAL(%d, %d)' % (column.digits, column.decimal_pos)
+        if column.base_type in ['FLOAT', 'DOUBLE']:
+            return 'DOUBLE PRECISION'
+        if column.digits > 9:
+            return 'BIGINT'
+        return 'INTEGER'
+
+    def ddl(self):
+        """CREATE TABLE statement"""
+        lines = ['%s INTEGER PRIMARY KEY' % quote('id')]
+        if self.parent:
+            lines += ['%s INTEGER NOT NULL REFERENCES %s (%s)' % (
+                quote(self.keys[1]), quote(self.parent.name), quote('id')),
+                '%s INTEGER NOT NULL' % quote('seq')]
+        lines += [ '%s %s' % (quote(i), self.sql_type(j))
+            for i, j in zip(self.names[len(self.keys):], self.columns) ]
+        return 'CREATE TABLE IF NOT EXISTS %s (\n    %s\n)' % (
+            quote(self.name), ',\n    '.join(lines))
+
+    def insert(self, paramstyle):
+        """INSERT statement, one parameter per column"""
+        if paramstyle not in PLACEHOLDERS:
+            raise LayoutError('Unsupported DB-API paramstyle %r' % paramstyle)
+        placeholder = PLACEHOLDERS[paramstyle]
+        if '%d' in placeholder:
+            values = [ placeholder % (i + 1) for i in range(len(self.names)) ]
+        else:
+            values = [placeholder] * len(self.names)
+        return 'INSERT INTO %s (%s) VALUES (%s)' % (quote(self.name),
+            ', '.join([ quote(i) for i in self.names ]), ', '.join(values))
+
+
+class Program:
+    """copybook2csv.py rows compiled into tables & a flat instruction program
+
+    Same normalization as cobol2dbms.Program, a row per record in the first
+    table & a row per OCCURS iteration in the table of the group.  The
+    instructions, walked once per record:
+        - (RUN, table, layout, keep, counts): consecutive fields of a table
+          decoded by one compiled Layout, keep lists the # of each value
+          stored (FILLER fields aren't), counts the (#, name) of each
+          OCCURS DEPENDING ON count field
+        - (LOOP, table, count, end): start of a group, count is a number or
+          the name of the count field, end the index of its END instruction
+        - (END, start): end of an iteration, start the index of its LOOP
+    """
+    RUN, LOOP, END = range(3)
+
+    def __init__(self, fields, name='record', codepage=None, code=None):
+        """fields (list) - copybook2csv.py output without the structure name
+        name (string) - structure name, the name of the record's table
+        codepage (string) - EBCDIC code page of the data, see ebcdic.py
+        code (dict) - compiled code objects, see layout.compile_source
+        """
+        self.codepage = codepage
+        self.code = {} if code is None else code
+        self.table = codepage and ebcdic.table(codepage)
+        self.depending = [ i.lower() for i in depending_on(fields) ]
+        # names of the fields compiled so far, count fields must be in it
+        # before their tables
+        self.seen = set()
+        self.tables = [Table(table_name(name))]
+        self.instructions = []
+        # indent, table & LOOP instruction # of each open group
+        groups = [(-1, self.tables[0], None)]
+        run = []
+        for indent, row in copybook_rows(fields):
+            while indent <= groups[-1][0]:
+                self.add_run(groups[-1][1], run)
+                self.end_loop(groups.pop()[2])
+            occurs = parse_occurs(row)
+            if not occurs:
+                run.append(row)
+                continue
+            self.add_run(groups[-1][1], run)
+            table_name_, count = occurs
+            if table_name_ in [ i.name for i in self.tables ]:
+                table_name_ = '%s_%s' % (groups[-1][1].name, table_name_)
+            table = Table(table_name_, groups[-1][1])
+            self.tables.append(table)
+            if count.isdigit():
+                count = int(count)
+            else:
+                count = count.lower()
+                if count not in self.seen:
+                    raise LayoutError('OCCURS DEPENDING ON %s: the count '
+                        'field must precede its table' % occurs[1])
+            groups.append((indent, table, len(self.instructions)))
+            self.instructions.append((self.LOOP, table, count, None))
+        self.add_run(groups[-1][1], run)
+        while len(groups) > 1:
+            self.end_loop(groups.pop()[2])
+        # fixed record length, None with OCCURS DEPENDING ON
+        self.record_length = None
+        if not self.depending:
+            self.record_length = self.fixed_length(0, len(self.instructions))
+
+    def add_run(self, table, run):
+        """Compile the pending run of field rows, emptied"""
+        if not run:
+            return
+        layout = Layout(run, '%s %d' % (table.name, len(self.instructions)),
+            codepage=self.codepage, code=self.code)
+        keep, counts = [], []
+        for num, column in enumerate(layout.columns):
+            self.seen.add(column.name.lower())
+            if column.name.lower() in self.depending:
+                counts.append((num, column.name.lower()))
+            if not column.is_filler:
+                table.add_column(column)
+                keep.append(num)
+        if len(keep) == len(layout.columns):
+            keep = None
+        self.instructions.append((self.RUN, table, layout, keep, counts))
+        del run[:]
+
+    def end_loop(self, start):
+        """Close the group started by instruction # start"""
+        loop, table, count, end = self.instructions[start]
+        self.instructions[start] = (loop, table, count, len(self.instructions))
+        self.instructions.append((self.END, start))
+
+    def fixed_length(self, start, end):
+        """Length of the instructions from start up to end, without OCCURS
+        DEPENDING ON"""
+        length, pc = 0, start
+        while pc < end:
+            instruction = self.instructions[pc]
+            if instruction[0] == self.RUN:
+                length += instruction[2].record_length
+            elif instruction[0] == self.LOOP:
+                length += instruction[2] * self.fixed_length(pc + 1,
+                    instruction[3])
+                pc = instruction[3]
+            pc += 1
+        return length
+
+    def transcode(self, record):
+        if self.table:
+            return record.translate(self.table)
+        return record
+
+
+class Loader:
+    """Buffered DB-API inserts of the rows decoded from records
+
+    Rows are inserted with executemany, one prepared INSERT per table, & a
+    commit every batch_size rows.  Primary keys are assigned here, following
+    the highest id of each table, so child rows reference their parent rows
+    without reading ids back.  The tables must not be written by anything
+    else during the load.
+    """
+
+    def __init__(self, connection, program, paramstyle='qmark',
+        batch_size=BATCH_SIZE):
+        """connection - DB-API connection
+        program (Program) - compiled copybook
+        paramstyle (string) - paramstyle of the connection's DB-API module
+        batch_size (int) - rows inserted per transaction
+        """
+        self.connection = connection
+        self.program = program
+        self.batch_size = batch_size
+        # keyed by table name
+        self.inserts = dict([ (i.name, i.insert(paramstyle))
+            for i in program.tables ])
+        self.rows = dict([ (i.name, []) for i in program.tables ])
+        self.size = 0
+        self.next_ids = {}
+
+    def create_tables(self):
+        cursor = self.connection.cursor()
+        for table in self.program.tables:
+            cursor.execute(table.ddl())
+        self.connection.commit()
+
+    def start(self):
+        """Read the highest id of each table"""
+        cursor = self.connection.cursor()
+        for table in self.program.tables:
+            cursor.execute('SELECT MAX(%s) FROM %s' % (quote('id'),
+                quote(table.name)))
+            self.next_ids[table.name] = (cursor.fetchone()[0] or 0) + 1
+
+    def new_row(self, table, *keys):
+        row = [self.next_ids[table.name]] + list(keys)
+        self.next_ids[table.name] += 1
+        return row
+
+    def load(self, records):
+        """Insert the rows of (record #, record) pairs, returns # of rows"""
+        self.start()
+        total = 0
+        for record_num, record in records:
+            self.record(record_num, record)
+            if self.size >= self.batch_size:
+                total += self.flush()
+        return total + self.flush()
+
+    def record(self, record_num, record):
+        """Decode a record into buffered rows"""
+        RUN, LOOP, END = Program.RUN, Program.LOOP, Program.END
+        instructions = self.program.instructions
+        text = self.program.transcode(record)
+        counts = {}
+        # open rows, the innermost group's last
+        open_rows = [(self.program.tables[0],
+            self.new_row(self.program.tables[0]))]
+        # remaining iterations & occurrence # of each open group
+        counters = []
+        pos = pc = 0
+        while pc < len(instructions):
+            instruction = instructions[pc]
+            if instruction[0] == RUN:
+                table, layout, keep, count_fields = instruction[1:]
+                values = self.decode(record_num, record, text, pos, layout)
+                for num, name in count_fields:
+                    counts[name] = values[num]
+                if keep is not None:
+                    values = [ values[i] for i in keep ]
+                open_rows[-1][1].extend(values)
+                pos += layout.record_length
+            elif instruction[0] == LOOP:
+                table, count, end = instruction[1:]
+                if not isinstance(count, int):
+                    count = self.count(record_num, counts, count)
+                if count <= 0:
+                    # no occurrences, the group takes no space
+                    pc = end + 1
+                    continue
+                counters.append([count, 1])
+                open_rows.append((table, self.new_row(table,
+                    open_rows[-1][1][0], 1)))
+            else:
+                table, row = open_rows.pop()
+                self.rows[table.name].append(row)
+                self.size += 1
+                counter = counters[-1]
+                counter[0] -= 1
+                if counter[0]:
+                    counter[1] += 1
+                    open_rows.append((table, self.new_row(table,
+                        open_rows[-1][1][0], counter[1])))
+                    pc = instruction[1] + 1
+                    continue
+                counters.pop()
+            pc += 1
+        table, row = open_rows.pop()
+        self.rows[table.name].append(row)
+        self.size += 1
+
+    def decode(self, record_num, record, text, pos, layout):
+        if pos + layout.record_length > len(record):
+            raise LayoutError('Record #%d: %d bytes, the layout defines more, '
+                'field %s at %d' % (record_num, len(record),
+                layout.columns[0].name, pos + 1))
+        try:
+            return layout.decode_from(record, pos, text)
+        except DECODE_ERRORS:
+            field_num, column, data = layout.find_error(
+                record[pos:pos + layout.record_length])
+            raise LayoutError('Record #%d: unable to convert %r to %s, field '
+                '%s' % (record_num, data, column.data_type, column.name))
+
+    def count(self, record_num, counts, name):
+        """Value of an OCCURS DEPENDING ON count field"""
+        count = counts.get(name)
+        try:
+            return int(count or 0)
+        except (TypeError, ValueError):
+            raise LayoutError('Record #%d: invalid OCCURS DEPENDING ON count '
+                '%r, field %s' % (record_num, count, name))
+
+    def flush(self):
+        """Insert & commit the buffered rows, returns # of rows"""
+        cursor = self.connection.cursor()
+        rows = 0
+        try:
+            # parent tables first
+            for table in self.program.tables:
+                name = table.name
+                if self.rows[name]:
+                    cursor.executemany(self.inserts[name], self.rows[name])
+                    rows += len(self.rows[name])
+                    self.rows[name] = []
+            self.connection.commit()
+        except:
+            self.connection.rollback()
+            raise
+        self.size = 0
+        return rows
+
+
+def read_records(program, args):
+    """(record #, record) pairs, records framed by newlines or, in binary
+    mode, by the record length"""
+    if args.binary:
+        if program.record_length is None:
+            sys.stderr.write('ERROR: OCCURS DEPENDING ON records have no '
+                'fixed length, --binary needs one.\n')
+            sys.exit(1)
+        lines = records.fixed_records(args.datafile, program.record_length)
+    else:
+        lines = ( i.rstrip('\r\n') for i in iter(args.datafile.readline, '') )
+    return enumerate(lines, 1)
+
+def parse_copybook(lines):
+    return list(load.iter_csv(lines, strip_='right', prune=True))
+
+def main(args):
+    cache = LayoutCache(CACHE_DIR if args.cache else None)
+    entry = cache.copybook(args.copybook, parse_copybook, 'cobol2sql',
+        args.codepage)
+    copybook = entry['fields']
+    try:
+        program = Program(copybook[1:], copybook[0][0], args.codepage,
+            entry['code'])
+    except LayoutError, error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.exit(1)
+    cache.save(entry)
+    if args.ddl:
+        for table in program.tables:
+            print table.ddl() + ';'
+        return
+    if not args.database:
+        sys.stderr.write('ERROR: -o DATABASE required.\n')
+        sys.exit(1)
+    # values above 15 digits are decoded as Decimal
+    sqlite3.register_adapter(Decimal, str)
+    connection = sqlite3.connect(args.database)
+    loader = Loader(connection, program, sqlite3.paramstyle, args.batch_size)
+    try:
+        loader.create_tables()
+        rows = loader.load(read_records(program, args))
+    except (LayoutError, sqlite3.Error), error_mesg:
+        sys.stderr.write('ERROR: %s\n' % error_mesg)
+        sys.stderr.write('Rows of the current batch rolled back.\n')
+        sys.exit(1)
+    finally:
+        connection.close()
+    sys.stderr.write('%d rows loaded into %s\n' % (rows, ', '.join([ i.name
+        for i in program.tables ])))
+
+if __name__ == '__main__':
+    from cmd_line_args import Args
+    args = Args(USAGE, __version__)
+    args.allow_stdin()
+    args.add_files('copybook', 'datafile')
+    args.parser.add_argument('-o', '--database',
+        help='SQLite database filename')
+    args.parser.add_argument('--ddl', action='store_true',
+        help='show the CREATE TABLE statements & exit')
+    args.parser.add_argument('-n', '--batch-size', type=int,
+        default=BATCH_SIZE, help='rows inserted per transaction, '
+        'default=%d' % BATCH_SIZE)
+    args.add_options('binary', 'cache', 'codepage')
+    main(args.parse())
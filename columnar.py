@@ -0,0 +1,329 @@
+"""COLUMNAR RECORD DECODING
+Decodes blocks of fixed-length records column-at-a-time with NumPy.
+
+A compiled layout.Layout is turned into a NumPy structured dtype of fixed-width
+byte fields.  Blocks of records are loaded with np.frombuffer and every column
+is converted with vectorized array operations:
+    - Char: whitespace stripped byte strings
+    - Integer: digits parsed into int64
+    - Float, Double: float64, implied decimal applied by scaling
+      Integer & scaled columns are parsed in place when every field is blank
+      or, as int() accepts, blanks, an optional leading sign, digits &
+      blanks; other columns are converted once per distinct value, so
+      malformed fields fail the same as in Layout.decode
+    - BCD: packed decimal (COMP-3) decoded with vectorized.packed_array,
+      int64 or float64 when scaled
+    - Zoned: overpunched signed display numerics decoded with
+      vectorized.zoned_array, int64 or float64 when scaled
+    - Binary, UnsignedBinary, IeeeFloat, IeeeDouble: read directly as
+      big-endian NumPy types
+    - HexFloat, HexDouble: decoded with vectorized.hfp_array, float64
+    - DateTime, Date, Time: datetime64[s], formats made of %Y %m %d %H %M %S
+      and separators are parsed in place, others once per distinct value
+
+Blank numeric & date/time fields, and packed fields of low-values, are masked
+(numpy.ma), i.e. null.
+
+EBCDIC text fields are transcoded a block at a time through the layout's code
+page table, used as a NumPy lookup array.
+
+Requires NumPy, records must be exactly the layout's record length, each
+followed by the terminator (newline by default).
+
+Examples:
+decoder = ColumnarDecoder(Layout(fields))
+for columns in decoder.blocks(open('data.txt')):
+    for row in decoder.rows(columns):
+        print row
+"""
+
+__version__ = """columnar ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import re
+
+from layout import LayoutError
+from vectorized import hfp_array, packed_array, zoned_array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['ColumnarDecoder']
+
+# records decoded per block
+BLOCK_RECORDS = 65536
+# largest number of digits that fits in an int64
+INT64_DIGITS = 18
+# digits that still convert exactly to a float64
+FLOAT_DIGITS = 15
+
+DATE_TIME_TOKEN_RE = re.compile(r'%[YmdHMS]|%?.', re.S)
+# date/time format directive: (length, position in ISO 8601 template)
+ISO_POSITIONS = {'%Y': (4, 0), '%m': (2, 5), '%d': (2, 8), '%H': (2, 11),
+    '%M': (2, 14), '%S': (2, 17)}
+ISO_TEMPLATE = '1970-01-01T00:00:00'
+SPACE, PLUS, MINUS, ZERO = [ ord(i) for i in ' +-0' ]
+# struct format code: big-endian NumPy type
+NUMPY_TYPES = {'h': '>i2', 'i': '>i4', 'q': '>i8', 'H': '>u2', 'I': '>u4',
+    'Q': '>u8', 'f': '>f4', 'd': '>f8'}
+
+
+class ColumnarDecoder:
+    """Column-at-a-time decoder for blocks of fixed-length records"""
+
+    def __init__(self, layout, terminator='\n', block_records=BLOCK_RECORDS):
+        """layout (layout.Layout) - compiled record layout
+        terminator (string) - characters following each record, '' for none
+        block_records (int) - number of records read & decoded per block
+        """
+        if np is None:
+            raise LayoutError('NumPy is required for columnar decoding')
+        self.layout = layout
+        self.terminator = terminator
+        self.record_size = layout.record_length + len(terminator)
+        self.block_records = block_records
+        columns = layout.columns
+        self.dtype = np.dtype({
+            'names': [ 'f%d' % i for i in range(len(columns)) ],
+            'formats': [ NUMPY_TYPES.get(i.struct_code, 'S%d' % i.length)
+                for i in columns ],
+            'offsets': [ i.offset for i in columns ],
+            'itemsize': self.record_size})
+        # code page translation table, indexed by byte value
+        self.table = None
+        if layout.table:
+            self.table = np.frombuffer(layout.table, dtype=np.uint8)
+        # date/time directive positions, keyed by column number
+        self.positions = {}
+        self.converters = [ self._converter(i, j)
+            for i, j in enumerate(columns) ]
+
+    def _converter(self, num, column):
+        if column.base_type == 'CHAR':
+            return self._char
+        if column.is_datetime:
+            positions = self._iso_positions(column)
+            if positions is None:
+                return self._distinct_values
+            self.positions[num] = positions
+            return self._datetime
+        if column.digits > INT64_DIGITS or (
+            column.decimal_pos and column.digits > FLOAT_DIGITS):
+            return self._distinct_values
+        if column.is_binary:
+            return self._binary
+        if column.is_packed:
+            return self._packed
+        if column.base_type == 'ZONED':
+            return self._zoned
+        if column.base_type == 'INTEGER':
+            return self._integer
+        if not column.decimal_pos:
+            return self._float
+        return self._scaled
+
+    def _iso_positions(self, column):
+        """Byte positions of each date/time directive in the field & in the
+        ISO 8601 template, None if the format can't be parsed in place"""
+        positions, pos = [], 0
+        for token in DATE_TIME_TOKEN_RE.findall(column.datetime_input_fmt):
+            if token in ISO_POSITIONS:
+                length, iso_pos = ISO_POSITIONS[token]
+                positions.append((pos, iso_pos, length))
+                pos += length
+            elif token.startswith('%'):
+                return
+            else:
+                pos += 1
+        if pos == column.length:
+            return positions
+
+    def read(self, buf):
+        """Structured array of raw byte fields, one element per record"""
+        size = self.record_size
+        if self.terminator and len(buf) % size == self.layout.record_length:
+            # last record without a terminator
+            buf += self.terminator
+        if len(buf) % size:
+            raise LayoutError('Record layout vs. record size mismatch, '
+                '%d bytes is not a multiple of %d' % (len(buf), size))
+        records = np.frombuffer(buf, dtype=self.dtype)
+        if self.terminator:
+            raw = records.view(np.uint8).reshape(len(records), size)
+            eol = raw[:, self.layout.record_length:]
+            expected = np.frombuffer(self.terminator, dtype=np.uint8)
+            bad = np.flatnonzero((eol != expected).any(axis=1))
+            if len(bad):
+                raise LayoutError('Record #%d: record length mismatch, '
+                    'terminator not found at byte %d' % (bad[0] + 1,
+                    self.layout.record_length))
+        return records
+
+    def decode_block(self, buf, first_record_num=1):
+        """Decode a block of records
+        returns (list) - one masked array per column, masks mark null values
+        """
+        records = self.read(buf)
+        raw = records.view(np.uint8).reshape(len(records), self.record_size)
+        text, text_raw = records, raw
+        if self.table is not None:
+            # transcoded copy of the block, text fields are read from it
+            text_raw = self.table[raw]
+            text = text_raw.view(self.dtype).ravel()
+        result = []
+        for num, column in enumerate(self.layout.columns):
+            values, field = records, raw
+            if self.layout.is_text(column):
+                values, field = text, text_raw
+            field = field[:, column.offset:column.offset + column.length]
+            try:
+                result.append(self.converters[num](
+                    num, column, values['f%d' % num], field))
+            except ValueError, error_mesg:
+                raise LayoutError('Field %r: %s (block starting at record '
+                    '#%d)' % (column.name, error_mesg, first_record_num))
+        return result
+
+    def blocks(self, file_):
+        """Decode file_ block by block, yields a list of columns per block"""
+        block_size = self.block_records * self.record_size
+        record_num = 1
+        while True:
+            buf = file_.read(block_size)
+            if not buf:
+                break
+            columns = self.decode_block(buf, record_num)
+            record_num += len(columns[0])
+            yield columns
+
+    def _char(self, num, column, values, field):
+        return np.ma.array(np.char.strip(values))
+
+    def _digits(self, column, field):
+        """Signed integer value of each field, same as int(): leading &
+        trailing blanks, a leading sign, then digits
+        returns (tuple) - int64 array, blank mask, or None if a field has any
+            other shape
+        """
+        is_space = field == SPACE
+        blank = is_space.all(axis=1)
+        digits = field.astype(np.int64) - ZERO
+        is_digit = (digits >= 0) & (digits <= 9)
+        is_sign = (field == MINUS) | (field == PLUS)
+        # first & last non-blank byte of each field
+        filled = ~is_space
+        length = column.length
+        start = filled.argmax(axis=1)
+        end = length - filled[:, ::-1].argmax(axis=1)
+        rows = np.arange(len(field))
+        signed = is_sign[rows, np.minimum(start, length - 1)]
+        # non-blanks are one run: an optional sign & at least one digit
+        valid = (filled.sum(axis=1) == end - start) & (
+            is_digit.sum(axis=1) == end - start - signed) & (
+            end - start > signed)
+        if not (valid | blank).all():
+            return
+        digits[~is_digit] = 0
+        powers = 10 ** np.arange(length - 1, -1, -1, dtype=np.int64)
+        # trailing blanks are not digits, the value ends at the last digit
+        value = digits.dot(powers) // powers[np.minimum(end, length) - 1]
+        negative = field[rows, np.minimum(start, length - 1)] == MINUS
+        value[negative] = -value[negative]
+        return value, blank
+
+    def _integer(self, num, column, values, field):
+        digits = self._digits(column, field)
+        if digits is None:
+            # reported or converted by the field's own converter
+            return self._distinct_values(num, column, values, field)
+        value, blank = digits
+        return np.ma.array(value, mask=blank)
+
+    def _scaled(self, num, column, values, field):
+        digits = self._digits(column, field)
+        if digits is None:
+            return self._distinct_values(num, column, values, field)
+        value, blank = digits
+        return np.ma.array(value / 10.0 ** column.decimal_pos, mask=blank)
+
+    def _float(self, num, column, values, field):
+        blank = (field == SPACE).all(axis=1)
+        value = np.where(blank, '0', values).astype(np.float64)
+        return np.ma.array(value, mask=blank)
+
+    def _binary(self, num, column, values, field):
+        if column.base_type == 'HEXFLOAT':
+            return np.ma.array(hfp_array(values, 32))
+        if column.base_type == 'HEXDOUBLE':
+            return np.ma.array(hfp_array(values, 64))
+        if column.base_type in column.INTEGER_BINARY_DATA_TYPES and \
+            column.decimal_pos:
+            return np.ma.array(values / 10.0 ** column.decimal_pos)
+        return np.ma.array(values.astype(values.dtype.newbyteorder('=')))
+
+    def _packed(self, num, column, values, field):
+        blank = (field == ord(column.pad)).all(axis=1) | (field == 0).all(
+            axis=1)
+        value, invalid = packed_array(field, column.decimal_pos)
+        invalid = invalid[~blank[invalid]]
+        if len(invalid):
+            raise ValueError('invalid packed decimal data %r in block record '
+                '#%d' % (field[invalid[0]].tostring(), invalid[0] + 1))
+        return np.ma.array(value, mask=blank)
+
+    def _zoned(self, num, column, values, field):
+        blank = (field == SPACE).all(axis=1)
+        value, invalid = zoned_array(field, column.decimal_pos)
+        invalid = invalid[~blank[invalid]]
+        if len(invalid):
+            raise ValueError('invalid zoned decimal data %r in block record '
+                '#%d' % (field[invalid[0]].tostring(), invalid[0] + 1))
+        return np.ma.array(value, mask=blank)
+
+    def _datetime(self, num, column, values, field):
+        blank = (field == SPACE).all(axis=1) | (field == ZERO).all(axis=1)
+        template = np.frombuffer(ISO_TEMPLATE, dtype=np.uint8)
+        iso = np.tile(template, (len(field), 1))
+        for pos, iso_pos, length in self.positions[num]:
+            iso[:, iso_pos:iso_pos + length] = field[:, pos:pos + length]
+        iso[blank] = template
+        iso = iso.view('S%d' % len(ISO_TEMPLATE)).ravel()
+        return np.ma.array(iso.astype('datetime64[s]'), mask=blank)
+
+    def _distinct_values(self, num, column, values, field):
+        """Convert each distinct value once with the compiled field converter"""
+        raw = np.ascontiguousarray(field).view('V%d' % column.length).ravel()
+        distinct, inverse = np.unique(raw, return_inverse=True)
+        distinct = distinct.view(np.uint8).reshape(len(distinct), column.length)
+        converted = [ column.convert(i.tostring()) for i in distinct ]
+        value = np.empty(len(converted), dtype=object)
+        value[:] = converted
+        null = np.array([ i is None for i in converted ], dtype=bool)
+        return np.ma.array(value[inverse], mask=null[inverse])
+
+    def rows(self, columns):
+        """Records as tuples of Python values, same as layout.Layout.decode"""
+        values = []
+        for num, column in enumerate(self.layout.columns):
+            data = columns[num]
+            if data.dtype.kind == 'M':
+                data = self._strftime(column, data)
+            else:
+                data = data.data.tolist()
+            for i in np.flatnonzero(np.ma.getmaskarray(columns[num])):
+                data[i] = None
+            values.append(data)
+        return zip(*values)
+
+    def _strftime(self, column, data):
+        """Format datetime64 values with the column's output format"""
+        distinct, inverse = np.unique(data.data, return_inverse=True)
+        fmt = column.datetime_output_fmt
+        formatted = [ i.strftime(fmt) for i in distinct.tolist() ]
+        return [ formatted[i] for i in inverse.tolist() ]
@@ -1,89 +1,142 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-__version__ = """COBOL Copybook Parser ver 0.2
+__version__ = """COBOL Copybook Parser ver 0.3
 
 License: GPLv3, Copyright (C) 2010 Brian Peterson
-This is free software.  There is NO warranty; 
+This is free software.  There is NO warranty;
 not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 """
 
 USAGE = """copybook2csv.py FILE"""
 
 import re, string, sys
+from numeric import packed_length
 
 class PictureString:
 
     REPEATS_RE = re.compile(r'(.)\((\d+)\)')
+    # signed display numeric, trailing sign overpunched on the last digit
+    ZONED_RE = re.compile(r'S[9Z]+(?:V[9Z]+)?$')
     FLOAT_RE = re.compile(r'S?[9Z]*[.V][9Z]+')
     INTEGER_RE = re.compile(r'S?[9Z]+')
-    COMP_TYPES = ['Integer', 'Float', 'Double', 'BCD']
+    # COMP-n: data-type, COMP-1 & COMP-2 are IBM hex floats unless ieee is set
+    COMP_TYPES = {1: 'HexFloat', 2: 'HexDouble', 3: 'BCD', 4: 'Binary',
+        5: 'Binary'}
+    IEEE_COMP_TYPES = {1: 'IeeeFloat', 2: 'IeeeDouble'}
+    # COMP-1 & COMP-2 storage size in bytes
+    FLOAT_LENGTHS = {1: 4, 2: 8}
+    ieee = False
 
     def expand_repeat_chars(self, pic_str):
-        while True:
-            match = self.REPEATS_RE.search(pic_str)
-            if not match:
-                break
-            expanded_str = match.group(1) * int(match.group(2))
-            pic_str = self.REPEATS_RE.sub(expanded_str, pic_str, 1)
-        return pic_str
-
-    def parse(self, pic_str, comp=0):
-        pic_str = self.expand_repeat_chars(pic_str)
-        if comp:
-            data_type = self.COMP_TYPES[int(comp)]
+        return self.REPEATS_RE.sub(
+            lambda match: match.group(1) * int(match.group(2)), pic_str)
+
+    def parse(self, pic_str, comp=0, sign_separate=False):
+        """pic_str (string) - PIC character-string
+        comp (int) - COMP-n usage number, 0 for display
+        sign_separate (boolean) - SIGN SEPARATE, the sign takes its own byte
+        returns (tuple) - data-type, length in bytes, implied decimal position
+        """
+        pic_str = self.expand_repeat_chars(pic_str.upper())
+        comp = int(comp)
+        if comp in self.IEEE_COMP_TYPES and self.ieee:
+            data_type = self.IEEE_COMP_TYPES[comp]
+        elif comp:
+            data_type = self.COMP_TYPES[comp]
+            if data_type == 'Binary' and not pic_str.startswith('S'):
+                data_type = 'UnsignedBinary'
+        elif self.ZONED_RE.match(pic_str) and not sign_separate:
+            data_type = 'Zoned'
         elif self.FLOAT_RE.match(pic_str):
             data_type = 'Float'
         elif self.INTEGER_RE.match(pic_str):
             data_type = 'Integer'
         else:
             data_type = 'Char'
+        # implied decimal position: number of digits right of the 'V'
         decimal_pos = 0
         if 'V' in pic_str:
-            decimal_pos = pic_str.index('V') + 1
+            decimal_pos = len(pic_str) - pic_str.index('V') - 1
             pic_str = pic_str.replace('V', '')
-        result = (data_type, len(pic_str), decimal_pos)  
+        length = len(pic_str)
+        digits = len(pic_str.replace('S', ''))
+        if comp in self.FLOAT_LENGTHS:
+            length = self.FLOAT_LENGTHS[comp]
+        elif data_type == 'BCD':
+            # packed decimal storage size in bytes
+            length = packed_length(digits)
+        elif data_type == 'Zoned':
+            # the sign takes no storage
+            length = digits
+        elif data_type in ('Binary', 'UnsignedBinary'):
+            # halfword, fullword or doubleword
+            length = (digits <= 4 and 2) or (digits <= 9 and 4) or 8
+        elif sign_separate:
+            length = digits + 1
+        result = (data_type, length, decimal_pos)
         return result
 
 
-class Field:
-
-    FIELD_PTRN = r'^(?P<level>\d{2})\s+(?P<name>\S+)'
-    PIC_PTRN = r'\s+PIC\s+(?P<pic>\S+)'
-    DEPENDING_ON_PTRN = r'\s+OCCURS.*DEPENDING ON (?P<occurs>\S+)'
-    OCCURS_PTRN = r'\s+OCCURS (?P<occurs>\d+) TIMES'
-    COMP_PTRN = r'\s+COMP-(?P<comp>[1-3])'
-    FIELD_RE = [ re.compile(i + '.') for i in [
-        FIELD_PTRN + PIC_PTRN + COMP_PTRN,
-        FIELD_PTRN + DEPENDING_ON_PTRN,
-        FIELD_PTRN + OCCURS_PTRN + PIC_PTRN + COMP_PTRN,
-        FIELD_PTRN + OCCURS_PTRN + PIC_PTRN,
-        FIELD_PTRN + OCCURS_PTRN,
-        FIELD_PTRN + PIC_PTRN,
-        FIELD_PTRN
-    ] ]
-    FIELDS = ['occurs', 'level', 'name', 'type', 'length', 'decimal_pos', 'pic', 'comp']
-    pic = PictureString()
-
-    def parse(self, line_num, line):
-        fields = { 'name': '', 'level': '0', 'occurs': '1', 'comp': '0' }
-        pattern_num, num_patterns = 0, len(self.FIELD_RE)
-        while pattern_num < num_patterns:
-            match = self.FIELD_RE[pattern_num].match(line)
-            if match:
-                for key, value in match.groupdict().items():
-                    fields[key] = value
-                break
-            pattern_num += 1
-        result = [ fields[i] for i in self.FIELDS[:3] ]
-        if 'pic' in fields:
-             result += self.pic.parse(fields['pic'], int(fields['comp']))
-        return result
+class Entry:
+    """Data description entry, a node of the copybook's layout tree"""
+
+    pic = None
+    # COMP-n usage number, None if not given, inherited from the group
+    usage = None
+    # count or DEPENDING ON data-name
+    occurs = '1'
+    redefines = None
+    sign_separate = False
+
+    def __init__(self, level, name):
+        self.level = level
+        self.name = name
+        self.children = []
+
+    def is_elementary(self):
+        return bool(self.pic or self.usage in PictureString.FLOAT_LENGTHS) \
+            and not self.children
 
 
 class Copybook:
+    """Single pass COBOL data division parser
+
+    The copybook text is split into period terminated statements by one
+    regular expression, each statement's words are read clause by clause &
+    the entries nested by level number into a tree, in linear time.  Handles
+    fixed format source (sequence numbers or blanks in columns 1-6, indicator
+    in column 7, identification area past column 72, debugging lines are
+    skipped), free format source, entries spanning lines, continued
+    literals, VALUE, REDEFINES, SIGN, SYNC & JUSTIFIED clauses.  Level 66 &
+    88 entries are skipped, a REDEFINES entry is skipped since it shares the
+    storage of the entry it redefines.
+    """
 
     LEGAL_DB_NAME_RE = re.compile(r'[^\w*+]')
-    OCCURS, LEVEL, NAME = range(3)
+    # sequence number area of digits or blanks, indicator area: ' ' code,
+    # '*' & '/' comment, '-' continuation, 'D' debugging line; an indented
+    # free format entry, i.e. '    05 NAME', has neither
+    FIXED_FORMAT_RE = re.compile(r'(?:\d{6}| {6})(?:[ */dD-]|$)|\s*$')
+    FIXED_FORMAT_WIDTH = 80
+    # a period terminated statement, periods in literals & numbers don't end it
+    STATEMENT_RE = re.compile(r'''
+        ((?:"(?:[^"]|"")*"|'(?:[^']|'')*'|[^.'"]|\.(?!\s|$))*)
+        (?:\.(?=\s|$)|$)
+        ''', re.X)
+    # literals & words, commas & semicolons followed by a space are separators
+    TOKEN_RE = re.compile(r'''
+        "(?:[^"]|"")*"|'(?:[^']|'')*'
+        |(?:[^\s,;'"]|[,;](?!\s|$))+
+        ''', re.X)
+    # compiler directing statements without a terminating period
+    DIRECTIVES = set(['EJECT', 'SKIP1', 'SKIP2', 'SKIP3'])
+    # USAGE: COMP-n number
+    USAGES = {'DISPLAY': 0, 'COMP': 4, 'COMPUTATIONAL': 4, 'BINARY': 4,
+        'PACKED-DECIMAL': 3, 'INDEX': 4}
+    for i in range(1, 6):
+        USAGES['COMP-%d' % i] = USAGES['COMPUTATIONAL-%d' % i] = i
+    # levels of entries which don't describe storage
+    SKIPPED_LEVELS = set([66, 88])
 
     def legalize_db_name(self, name, camel_case=False):
         name = self.LEGAL_DB_NAME_RE.sub('_', name)
@@ -91,59 +144,186 @@ class Copybook:
             return ''.join([ i.capitalize() for i in name.split('_') ])
         return name.lower()
 
-    def set2legal_db_names(self):
-        result = []
-        for field in self.fields:
-            field = list(field)
-            if len(field) <= 3:
-                field[self.NAME] = self.legalize_db_name(field[self.NAME], True)
-                if not field[self.OCCURS].isdigit():
-                    field[self.OCCURS] = self.legalize_db_name(field[self.OCCURS])
+    def source(self, lines):
+        """Program text, without comments, sequence numbers &
+        identification areas, continued lines joined"""
+        lines = [ i.rstrip('\r\n') for i in lines ]
+        fixed = all([ self.FIXED_FORMAT_RE.match(i) and
+            len(i) <= self.FIXED_FORMAT_WIDTH for i in lines ])
+        chunks = []
+        for line in lines:
+            if not fixed:
+                line = line.strip()
+                if not line.startswith('*'):
+                    chunks.append(line.split('*>')[0])
+                continue
+            indicator, text = line[6:7], line[7:72]
+            if indicator in ('*', '/', 'd', 'D'):
+                continue
+            if indicator == '-' and chunks:
+                text = text.lstrip()
+                if text[:1] in ('"', "'"):
+                    # continued literal, runs to column 72 on the last line
+                    chunks[-1] = chunks[-1].ljust(65)
+                    text = text[1:]
+                chunks[-1] += text
             else:
-                field[self.NAME] = self.legalize_db_name(field[self.NAME])
-            result.append(field)
-        self.fields = result
-
-    def occurs_n_times(self):
-        levels = [0]
-        for field in self.fields:
-            line = ''
-            level = int(field[self.LEVEL])
-            if level == 1:
-                line = field[self.NAME]
-            if level <= levels[-1]:
-                levels.pop()
-            tabs = '\t' * (len(levels) - 1)
-            if len(field) > 3:
-                line = ', '.join([ str(i) for i in field[self.NAME:] ])
-            elif field[self.OCCURS] != '1':
-                line = '{0[2]} OCCURS {0[0]!r} TIMES:'.format(field)
-                levels.append(level)
-            if line:
-                sys.stdout.write(tabs + line + '\n')
+                chunks.append(text)
+        return '\n'.join(chunks)
 
-    def parse(self, lines):
-        lines = [ i.strip() for i in lines ]
-        lines = [ i for i in lines if i ]
-        lines = [ i for i in lines if i[0] != '*' ]
-        field = Field()
-        self.fields = [ field.parse(i, j) for i, j in enumerate(lines) ]
-        self.set2legal_db_names()
-        self.occurs_n_times()
+    def statements(self, text):
+        """Tokens of each period terminated statement, upper case"""
+        for statement in self.STATEMENT_RE.findall(text.upper()):
+            if '"' in statement or "'" in statement or ',' in statement \
+                    or ';' in statement:
+                yield self.TOKEN_RE.findall(statement)
+            elif statement:
+                yield statement.split()
+
+    def entry(self, words):
+        """Data description entry of a statement's tokens, None if it isn't
+        one"""
+        pos = 0
+        while pos < len(words) and words[pos] in self.DIRECTIVES:
+            pos += 1
+        if pos == len(words) or not words[pos].isdigit():
+            return
+        level = int(words[pos])
+        if level in self.SKIPPED_LEVELS:
+            return
+        name, pos = 'FILLER', pos + 1
+        if pos < len(words) and words[pos] not in self.CLAUSES:
+            name, pos = words[pos], pos + 1
+        entry = Entry(level, name)
+        clauses, length = self.CLAUSES, len(words)
+        while pos < length:
+            clause = clauses.get(words[pos])
+            if clause:
+                pos = clause(self, entry, words, pos)
+            pos += 1
+        return entry
+
+    def _word(self, words, pos, *optional):
+        """Position of the next word, skipping optional noise words"""
+        pos += 1
+        while pos < len(words) and words[pos] in optional:
+            pos += 1
+        return pos
 
+    def _picture(self, entry, words, pos):
+        pos = self._word(words, pos, 'IS')
+        if pos < len(words):
+            entry.pic = words[pos]
+        return pos
 
-    def camel_case(self, name):
-        return ''.join([ i.title() for i in name.split('_') ])
+    def _usage(self, entry, words, pos):
+        if words[pos] == 'USAGE':
+            pos = self._word(words, pos, 'IS')
+        if pos < len(words) and words[pos] in self.USAGES:
+            entry.usage = self.USAGES[words[pos]]
+        return pos
 
+    def _occurs(self, entry, words, pos):
+        pos += 1
+        if pos < len(words):
+            entry.occurs = words[pos]
+        if pos + 2 < len(words) and words[pos + 1] == 'TO':
+            # OCCURS min TO max, the count comes from DEPENDING ON
+            pos += 2
+            entry.occurs = words[pos]
+        if pos + 1 < len(words) and words[pos + 1] == 'TIMES':
+            pos += 1
+        if pos + 1 < len(words) and words[pos + 1] == 'DEPENDING':
+            pos = self._word(words, pos + 1, 'ON')
+            if pos < len(words):
+                entry.occurs = words[pos]
+        return pos
+
+    def _redefines(self, entry, words, pos):
+        pos += 1
+        if pos < len(words):
+            entry.redefines = words[pos]
+        return pos
+
+    def _separate(self, entry, words, pos):
+        entry.sign_separate = True
+        return pos
+
+    CLAUSES = {'PIC': _picture, 'PICTURE': _picture, 'USAGE': _usage,
+        'OCCURS': _occurs, 'REDEFINES': _redefines, 'SEPARATE': _separate}
+    for i in USAGES:
+        CLAUSES[i] = _usage
+    # words starting other clauses, never a data-name
+    for i in ['VALUE', 'VALUES', 'SIGN', 'LEADING', 'TRAILING', 'SYNC',
+        'SYNCHRONIZED', 'JUST', 'JUSTIFIED', 'BLANK', 'EXTERNAL', 'GLOBAL']:
+        CLAUSES[i] = None
+
+    def parse(self, lines):
+        """Build the layout tree, self.records holds the level 01 & 77
+        entries"""
+        root = Entry(0, '')
+        stack = [root]
+        for statement in self.statements(self.source(lines)):
+            entry = self.entry(statement)
+            if entry is None:
+                continue
+            if entry.level == 77:
+                entry.level = 1
+            while stack[-1].level >= entry.level:
+                stack.pop()
+            parent = stack[-1]
+            if entry.usage is None:
+                entry.usage = parent.usage
+            parent.children.append(entry)
+            stack.append(entry)
+        self.records = root.children
+        return self.records
+
+    def csv_lines(self):
+        """copybook2csv output lines: the structure name, a field definition
+        per elementary entry & a line per OCCURS, its entries indented"""
+        pic = PictureString()
+        # PIC, usage, SIGN SEPARATE: parsed picture, copybooks repeat them
+        pictures = {}
+        result = []
+        stack = [ (i, '') for i in reversed(self.records) ]
+        while stack:
+            entry, tabs = stack.pop()
+            if entry.redefines:
+                continue
+            elementary = entry.is_elementary()
+            if entry.level == 1 and not elementary:
+                result.append(self.legalize_db_name(entry.name, True))
+            if entry.occurs != '1':
+                occurs = entry.occurs
+                if not occurs.isdigit():
+                    occurs = self.legalize_db_name(occurs)
+                result.append('%s%s OCCURS %r TIMES:' % (tabs,
+                    self.legalize_db_name(entry.name, True), occurs))
+                tabs += '\t'
+            if elementary:
+                key = (entry.pic or '', entry.usage or 0, entry.sign_separate)
+                if key not in pictures:
+                    pictures[key] = '%s, %s, %s' % pic.parse(*key)
+                result.append('%s%s, %s' % (tabs,
+                    self.legalize_db_name(entry.name), pictures[key]))
+            if entry.children:
+                stack += [ (i, tabs) for i in reversed(entry.children) ]
+        return result
 
 def main(args):
-    Copybook().parse(args.copybook.readlines())
+    PictureString.ieee = args.ieee
+    copybook = Copybook()
+    copybook.parse(args.copybook.readlines())
+    lines = copybook.csv_lines()
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
 
 if __name__ == '__main__':
     from cmd_line_args import Args
     args = Args(USAGE, __version__)
     args.allow_stdin()
     args.add_files('copybook')
+    args.parser.add_argument('--ieee', action='store_true',
+        help='COMP-1 & COMP-2 are IEEE 754 floats, default=IBM hex floats')
     main(args.parse())
-
-
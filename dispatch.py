@@ -0,0 +1,74 @@
+"""RECORD TYPE DISPATCH
+Routes each record of a mixed data file, i.e. header, detail & trailer
+records or REDEFINES variants, to its own layout.
+
+The record type is a fixed byte range of every record, the discriminator.
+Routes are kept in a dict keyed by the discriminator's value, so a record is
+routed with one slice & one dict probe, before any of its fields are decoded.
+Records of a type without a route go to the default route.
+
+EBCDIC discriminators are transcoded before the probe, so route keys are
+always ASCII.
+
+Examples:
+dispatch = Dispatcher(0, 1, {'H': header, 'D': detail}, trailer)
+route = dispatch(record)
+route = dispatch(buffer, offset)
+"""
+
+__version__ = """dispatch ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+from layout import LayoutError
+
+__all__ = ['Dispatcher', 'byte_range', 'route_arg']
+
+
+def byte_range(text):
+    """(start, end) of a discriminator, text is a zero-based slice, i.e.
+    '0:2' for the first 2 bytes, raises ValueError if it's invalid"""
+    start, sep, end = text.partition(':')
+    start, end = int(start), int(end)
+    if not sep or start < 0 or end <= start:
+        raise ValueError('invalid byte range %r' % text)
+    return start, end
+
+def route_arg(text):
+    """(record type, copybook, output) of a route, text is
+    TYPE=COPYBOOK[,OUTPUT], output is None if it's left out"""
+    type_, sep, files = text.partition('=')
+    if not sep or not type_ or not files:
+        raise ValueError('invalid route %r' % text)
+    copybook, sep, output = files.partition(',')
+    return type_, copybook, output or None
+
+
+class Dispatcher:
+    """Record type to route lookup"""
+
+    def __init__(self, start, end, routes, default=None, table=None):
+        """start, end (int) - discriminator byte range of each record
+        routes (dict) - record type (string): route, i.e. a layout
+        default - route of records of any other type, None for none
+        table (string) - translation table of EBCDIC records, see ebcdic.py
+        """
+        for type_ in routes:
+            if len(type_) != end - start:
+                raise LayoutError('Record type %r is not %d bytes, the length '
+                    'of the record type field' % (type_, end - start))
+        self.start = start
+        self.end = end
+        self.routes = routes
+        self.default = default
+        self.table = table
+
+    def __call__(self, buffer, offset=0):
+        """Route of the record at offset in buffer"""
+        type_ = buffer[offset + self.start:offset + self.end]
+        if self.table:
+            type_ = type_.translate(self.table)
+        return self.routes.get(type_, self.default)
@@ -0,0 +1,56 @@
+"""EBCDIC CODE PAGES
+Translation tables for transcoding EBCDIC records to ASCII (Latin-1) in bulk.
+
+Each table is a 256 character string for str.translate, so a whole buffer of
+records is transcoded by one C-level call.  Zoned decimal digits F0-F9 become
+'0'-'9' and overpunched signs C0-C9, D0-D9 become '{', 'A'-'I', '}', 'J'-'R',
+the same characters used by ASCII overpunch.
+
+Packed & binary fields must not be translated, see layout.Layout.
+
+Supported code pages:
+    - cp037: EBCDIC US/Canada
+    - cp500: EBCDIC International
+    - cp1047: EBCDIC Latin-1/Open Systems (z/OS UNIX)
+
+Examples:
+buf.translate(table('cp037'))
+"""
+
+__version__ = """ebcdic ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__all__ = ['CODEPAGES', 'space', 'table']
+
+CODEPAGES = ['cp037', 'cp500', 'cp1047']
+# cp1047 is cp037 with these bytes exchanged, Python has no cp1047 codec
+CP1047_FROM_CP037 = {0x5F: '^', 0xAD: '[', 0xB0: '\xac', 0xBA: '\xdd',
+    0xBB: '\xa8', 0xBD: ']'}
+
+_tables = {}
+
+
+def table(codepage):
+    """EBCDIC to Latin-1 translation table for str.translate"""
+    if codepage not in _tables:
+        if codepage not in CODEPAGES:
+            raise ValueError('Unsupported code page %r, supported: %s' % (
+                codepage, ', '.join(CODEPAGES)))
+        base = codepage
+        if codepage == 'cp1047':
+            base = 'cp037'
+        chars = list(''.join([ chr(i) for i in range(256) ]).decode(
+            base).encode('latin-1'))
+        if codepage == 'cp1047':
+            for byte, char in CP1047_FROM_CP037.items():
+                chars[byte] = char
+        _tables[codepage] = ''.join(chars)
+    return _tables[codepage]
+
+def space(codepage):
+    """The code page's space character, used to pad short records"""
+    return chr(table(codepage).index(' '))
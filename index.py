@@ -0,0 +1,208 @@
+"""RECORD OFFSET INDEX
+Random access to the records of a data file, by record number, without
+reading the records in front of them.
+
+Fixed-length records start at exact byte offsets, record k at
+k * record_size, so their index is computed, never stored.
+
+Newline-framed records are indexed by a sparse table of byte offsets, the
+offset of every STRIDE-th record.  The table is built once, by counting line
+terminators a small chunk at a time, & saved to a sidecar file next to the data
+file, <data file>.idx.  A record is found by seeking to the offset in front of
+it & skipping less than STRIDE lines.  The sidecar is rebuilt when the data
+file's size or modification time changes.  Sidecar errors are never fatal, the
+index is used without being saved.
+
+Records are sliced out of the memory-mapped data file, so only the pages
+holding the requested records are read.
+
+Examples:
+data = open_data('data.txt')
+index = line_index('data.txt', data)
+for record_num, record in index.records(data, 4000000, 4000010):
+    print record_num, record
+index = FixedIndex(120, len(data))
+"""
+
+__version__ = """index ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import mmap, os, struct, tempfile
+
+__all__ = ['FixedIndex', 'LineIndex', 'build_line_index', 'line_index',
+    'load_index', 'open_data', 'save_index']
+
+# records per stored offset, bounds the lines skipped per lookup
+STRIDE = 1024
+# bytes searched for line terminators per step while building an index
+CHUNK_SIZE = 4096
+SUFFIX = '.idx'
+# magic, stride, record count, data file size, data file mtime, # of offsets
+HEADER = struct.Struct('<8sIQQdQ')
+MAGIC = 'PYCOBIDX'
+# unreadable or incompatible sidecars
+LOAD_ERRORS = (IOError, OSError, EOFError, ValueError, struct.error)
+
+
+def open_data(file_name):
+    """Read-only memory map of a data file, '' if the file is empty"""
+    f = open(file_name, 'rb')
+    try:
+        if not os.fstat(f.fileno()).st_size:
+            # empty files can't be mapped
+            return ''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+
+class FixedIndex:
+    """Computed offsets of fixed-length records"""
+
+    def __init__(self, record_length, data_size, terminator=''):
+        """record_length (int) - record length without its terminator
+        data_size (int) - data file size in bytes
+        terminator (string) - characters following each record, '' for none
+        """
+        self.record_length = record_length
+        self.record_size = record_length + len(terminator)
+        # a partial last record counts as a record
+        self.count = -(-data_size // self.record_size)
+
+    def offset(self, data, record_num):
+        """Byte offset of a record (zero-based)"""
+        return record_num * self.record_size
+
+    def records(self, data, start=0, stop=None):
+        """Yield record # (zero-based), record string for a range of records
+        data (mmap or string) - the data file, see open_data
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        length, size = self.record_length, self.record_size
+        for record_num in xrange(start, stop):
+            pos = record_num * size
+            yield record_num, data[pos:pos + length]
+
+
+class LineIndex:
+    """Sparse offsets of newline-framed records"""
+
+    def __init__(self, marks, count, data_size=0, mtime=0.0, stride=STRIDE):
+        """marks (list of ints) - offset of every stride-th record
+        count (int) - number of records
+        data_size, mtime - data file size & modification time, the index is
+            stale when they change
+        """
+        self.marks = marks
+        self.count = count
+        self.data_size = data_size
+        self.mtime = mtime
+        self.stride = stride
+
+    def offset(self, data, record_num):
+        """Byte offset of a record (zero-based)"""
+        pos = self.marks[record_num // self.stride]
+        for i in xrange(record_num % self.stride):
+            pos = data.find('\n', pos) + 1
+        return pos
+
+    def records(self, data, start=0, stop=None):
+        """Yield record # (zero-based), record string without its line
+        terminator for a range of records
+        data (mmap or string) - the data file, see open_data
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        pos = self.offset(data, start)
+        for record_num in xrange(start, stop):
+            end = data.find('\n', pos)
+            if end < 0:
+                # last record without a terminator
+                end = len(data)
+            yield record_num, data[pos:end].rstrip('\r')
+            pos = end + 1
+
+
+def build_line_index(data, stride=STRIDE, chunk_size=CHUNK_SIZE):
+    """Index the records of a newline-framed data file
+    data (mmap or string) - the data file, see open_data
+    returns (LineIndex)
+    """
+    marks = [0]
+    # line terminators counted so far
+    count = 0
+    next_mark = stride
+    for pos in xrange(0, len(data), chunk_size):
+        chunk = data[pos:pos + chunk_size]
+        start = 0
+        lines = chunk.count('\n')
+        while count + lines >= next_mark:
+            # only chunks holding a marked record are searched line by line
+            for i in xrange(next_mark - count):
+                start = chunk.find('\n', start) + 1
+            marks.append(pos + start)
+            count, next_mark = next_mark, next_mark + stride
+            lines = chunk.count('\n', start)
+        count += lines
+    if data[-1:] not in ('', '\n'):
+        # last record without a terminator
+        count += 1
+    return LineIndex(marks, count, len(data), stride=stride)
+
+def load_index(file_name):
+    """Index saved in the sidecar of a data file, None if it's missing or
+    stale"""
+    try:
+        stat = os.stat(file_name)
+        f = open(file_name + SUFFIX, 'rb')
+        try:
+            header = HEADER.unpack(f.read(HEADER.size))
+            magic, stride, count, data_size, mtime, num_marks = header
+            if (magic != MAGIC or data_size != stat.st_size or
+                mtime != stat.st_mtime):
+                return
+            marks = struct.unpack('<%dQ' % num_marks, f.read(8 * num_marks))
+        finally:
+            f.close()
+    except LOAD_ERRORS:
+        return
+    return LineIndex(marks, count, data_size, mtime, stride)
+
+def save_index(index, file_name):
+    """Write the sidecar of a data file, returns (boolean) - saved"""
+    directory = os.path.dirname(os.path.abspath(file_name))
+    try:
+        fd, temp_name = tempfile.mkstemp(SUFFIX + '.tmp', '', directory)
+        try:
+            os.write(fd, HEADER.pack(MAGIC, index.stride, index.count,
+                index.data_size, index.mtime, len(index.marks)))
+            os.write(fd, struct.pack('<%dQ' % len(index.marks),
+                *index.marks))
+        finally:
+            os.close(fd)
+        # atomic, concurrent runs never read a partial sidecar
+        os.rename(temp_name, file_name + SUFFIX)
+    except (IOError, OSError):
+        return False
+    return True
+
+def line_index(file_name, data=None, stride=STRIDE):
+    """Index of a newline-framed data file, from its sidecar if it's up to
+    date, otherwise built & saved
+    data (mmap or string) - the data file, opened if None
+    returns (LineIndex)
+    """
+    index = load_index(file_name)
+    if index is None:
+        mtime = os.stat(file_name).st_mtime
+        if data is None:
+            data = open_data(file_name)
+        index = build_line_index(data, stride)
+        index.mtime = mtime
+        save_index(index, file_name)
+    return index
@@ -0,0 +1,682 @@
+"""COMPILED RECORD LAYOUTS
+Turns a copybook2csv.py field list into a specialized record decoder.
+
+The field list is interpreted once, when the layout is compiled.  Each field's
+data-type, length & implied decimal position is translated into Python source,
+and the source for all fields is compiled into a single decode function per
+copybook.  Decoding a record is then one struct.unpack call followed by
+straight-line conversion code, with no per-field type dispatch at run time.
+
+Supported data-types (case insensitive, as written by copybook2csv.py):
+    - Char: whitespace stripped string
+    - Integer: int
+    - Float, Double: float (decimal.Decimal above 15 digits)
+    - BCD: packed decimal (COMP-3), int or, with an implied decimal
+      position, float (decimal.Decimal above 15 digits)
+    - Zoned: signed display numeric with an overpunched trailing sign
+      (PIC S9), int or, with an implied decimal position, float
+      (decimal.Decimal above 15 digits)
+    - Binary: big-endian two's complement (COMP, COMP-4, COMP-5), 2, 4 or
+      8 bytes, int or, with an implied decimal position, float
+    - UnsignedBinary: same, unsigned (PIC without an S)
+    - HexFloat, HexDouble: IBM hex floating point (COMP-1, COMP-2), float
+    - IeeeFloat, IeeeDouble: big-endian IEEE 754 floating point, float
+    - DateTime, Date, Time: reformatted date/time string, optional input
+      format in brackets, i.e. Date('%Y%m%d')
+
+Binary & floating point fields are unpacked by the record's struct.Struct
+itself, big-endian, so a whole record is split & converted to numbers by one
+C-level unpack call.
+
+EBCDIC records are decoded with a code page (see ebcdic.py): text fields are
+transcoded by str.translate, packed & binary fields are left as is.
+
+Blank numeric & date/time fields, and packed fields of low-values, decode to
+None.
+
+A layout can be projected onto some of its fields (select, filler): the
+fields left out become struct pad bytes ('x'), so they're never unpacked or
+converted & decoding costs scale with the fields kept, not the record width.
+
+OCCURS tables are flattened into numbered fields, i.e. the amount field of
+Items OCCURS '3' TIMES becomes items_1_amount, items_2_amount &
+items_3_amount, so a record with tables is still decoded by one unpack call.
+A copybook with OCCURS DEPENDING ON is compiled into a VariableLayout: one
+Layout variant per combination of counts, compiled the first time a record
+with those counts is seen.
+
+Examples:
+layout = Layout([('cust_id', 'Integer', '6', '0'), ('name', 'Char', '20', '0')])
+layout.decode('000042Brian               ')
+layout.find_error('0000x2Brian               ')
+layout = compile_layout(load.csv_('copybook.csv', strip_='right')[1:])
+layout = compile_layout(fields, select=['cust_id', 'balance'], filler=False)
+"""
+
+__version__ = """layout ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import re, struct
+from binascii import hexlify
+from datetime import datetime
+from decimal import Decimal
+
+import ebcdic
+from numeric import HFP32, HFP64, PACKED_SIGN, ZONED_DIGIT, ZONED_SIGN, \
+    packed_digits
+
+__all__ = ['Column', 'DECODE_ERRORS', 'Layout', 'LayoutError',
+    'VariableLayout', 'compile_layout', 'compile_source', 'copybook_rows',
+    'depending_on', 'flatten', 'parse_occurs', 'table_name']
+
+# output formats, keys match the base data-types of date/time fields
+DATETIME_OUTPUT_FMT = {
+    'DATE': '%Y-%m-%d',
+    'TIME': '%H:%M:%S',
+    'DATETIME': '%Y-%m-%d %H:%M:%S',
+}
+# input formats used when the copybook doesn't specify one, keyed by length
+DATETIME_INPUT_FMT = {
+    'DATE': {8: '%Y%m%d', 6: '%y%m%d'},
+    'TIME': {4: '%H%M', 6: '%H%M%S'},
+    'DATETIME': {12: '%Y%m%d%H%M', 14: '%Y%m%d%H%M%S'},
+}
+# distinct date/time values cached per field before the cache is reset
+MEMO_LIMIT = 100000
+# compiled OCCURS DEPENDING ON variants kept per layout before they're reset
+VARIANT_LIMIT = 64
+# digits that still convert exactly to a float
+FLOAT_DIGITS = 15
+
+# copybook2csv.py loop line, i.e. Items OCCURS '3' TIMES:
+OCCURS_RE = re.compile(r"(\S+) OCCURS '?([\w*+]+)'? TIMES:$")
+CAMEL_CASE_RE = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+# index of a numbered OCCURS table field, i.e. the _3_ of items_3_amount
+TABLE_FIELD_RE = re.compile(r'_\d+(_|$)')
+
+# exceptions raised by generated code for undecodable field data
+DECODE_ERRORS = (ValueError, TypeError, ArithmeticError, LookupError)
+
+_MISSING = object()
+
+
+class LayoutError(Exception):
+    """Invalid field definition or undecodable field data"""
+
+
+def compile_source(source, file_name, code=None):
+    """Code object of generated source, compiled once per code dict
+    code (dict) - code objects keyed by (file_name, source), i.e. loaded
+        from a layout cache, None to always compile
+    """
+    if code is None:
+        return compile(source, file_name, 'exec')
+    key = (file_name, source)
+    if key not in code:
+        code[key] = compile(source, file_name, 'exec')
+    return code[key]
+
+
+def copybook_rows(fields):
+    """(indent, stripped items) per copybook2csv.py row, rows inside OCCURS
+    tables are indented by a tab per level"""
+    return [ (len(i[0]) - len(i[0].lstrip('\t')) if i else 0,
+        [ str(j).strip() for j in i ]) for i in fields ]
+
+def parse_occurs(row):
+    """Table name & count, a number or an OCCURS DEPENDING ON field name, of
+    a loop row, None for field definitions"""
+    if len(row) != 1 or not row[0].endswith(':'):
+        return
+    match = OCCURS_RE.match(row[0])
+    if not match:
+        raise LayoutError('Invalid OCCURS definition %r' % row[0])
+    name, count = match.groups()
+    return table_name(name), count
+
+def table_name(name):
+    """Lower case name of a copybook2csv.py structure or OCCURS table, i.e.
+    OrderItems -> order_items"""
+    return CAMEL_CASE_RE.sub('_', name).lower()
+
+def depending_on(fields):
+    """Names of the OCCURS DEPENDING ON count fields, in copybook order"""
+    result = []
+    for indent, row in copybook_rows(fields):
+        occurs = parse_occurs(row)
+        if occurs and not occurs[1].isdigit() and occurs[1] not in result:
+            result.append(occurs[1])
+    return result
+
+def flatten(fields, counts=None):
+    """Field definitions with OCCURS tables expanded into numbered fields
+    fields (list) - copybook2csv.py output without the structure name line
+    counts (dict) - occurrences keyed by OCCURS DEPENDING ON field name
+    returns (list) - (name, data_type, length, decimal_pos) per field
+    """
+    result, pos = _expand(copybook_rows(fields), 0, 0, counts or {})
+    return result
+
+def _expand(rows, pos, indent, counts):
+    """Fields of the rows from pos on, up to the first row indented less than
+    indent, & the position of that row"""
+    result = []
+    while pos < len(rows) and rows[pos][0] >= indent:
+        row_indent, row = rows[pos]
+        pos += 1
+        occurs = parse_occurs(row)
+        if not occurs:
+            result.append(tuple(row))
+            continue
+        name, count = occurs
+        body, pos = _expand(rows, pos, row_indent + 1, counts)
+        if count.isdigit():
+            count = int(count)
+        elif count in counts:
+            count = counts[count]
+        else:
+            raise LayoutError('OCCURS DEPENDING ON %s: no count, see '
+                'VariableLayout' % count)
+        for i in range(1, count + 1):
+            result += [ ('%s_%d_%s' % (name, i, j[0]),) + j[1:]
+                for j in body ]
+    return result, pos
+
+def compile_layout(fields, name='record', datetime_output_fmt=None,
+    codepage=None, code=None, select=None, filler=True):
+    """Layout of the fields or, with OCCURS DEPENDING ON, VariableLayout"""
+    if depending_on(fields):
+        return VariableLayout(fields, name, datetime_output_fmt, codepage,
+            code, select, filler)
+    if select is not None:
+        names = set([ i[0].lower() for i in flatten(fields) ])
+        unknown = [ i for i in select if i.lower() not in names ]
+        if unknown:
+            raise LayoutError('Unknown field %s' % ', '.join(unknown))
+    return Layout(fields, name, datetime_output_fmt, codepage, code, select,
+        filler)
+
+
+class Column:
+    """Field definition compiled into conversion source code"""
+
+    DATA_TYPE_RE = re.compile(r'[a-zA-Z]+')
+    DATE_TIME_RE = re.compile(r'.*\(\'(.*?)\'\)')
+    DATE_TIME_DATA_TYPES = ['DATETIME', 'DATE', 'TIME']
+    NUMERIC_DATA_TYPES = ['INTEGER', 'FLOAT', 'DOUBLE', 'BCD', 'ZONED']
+    # data-type: {length: struct format code}, fields unpacked as numbers
+    BINARY_DATA_TYPES = {
+        'BINARY': {2: 'h', 4: 'i', 8: 'q'},
+        'UNSIGNEDBINARY': {2: 'H', 4: 'I', 8: 'Q'},
+        'HEXFLOAT': {4: 'I'},
+        'HEXDOUBLE': {8: 'Q'},
+        'IEEEFLOAT': {4: 'f'},
+        'IEEEDOUBLE': {8: 'd'},
+    }
+    # binary field length: max digits
+    BINARY_DIGITS = {2: 4, 4: 9, 8: 18}
+    # binary data-types of scaled integers
+    INTEGER_BINARY_DATA_TYPES = ['BINARY', 'UNSIGNEDBINARY']
+    SUPPORTED_DATA_TYPES = ['CHAR'] + NUMERIC_DATA_TYPES + \
+        DATE_TIME_DATA_TYPES + sorted(BINARY_DATA_TYPES)
+
+    def __init__(self, name, data_type, length, decimal_pos=0, offset=0,
+        datetime_output_fmt=None, pad=' ', code=None):
+        """name (string), data_type (string) - copybook2csv.py data-type
+        length, decimal_pos (int or string) - field size & implied decimal
+            position, the number of digits right of the implied decimal point
+        offset (int) - position of the field in the record
+        datetime_output_fmt (dict) - strftime formats keyed by base-type
+        pad (string) - space character of packed fields, which aren't
+            transcoded, i.e. '\x40' in EBCDIC
+        code (dict) - compiled code objects keyed by source, see
+            compile_source
+        """
+        self.name = name
+        self.data_type = data_type
+        match = self.DATA_TYPE_RE.match(data_type)
+        self.base_type = match.group().upper() if match else ''
+        if self.base_type not in self.SUPPORTED_DATA_TYPES:
+            raise LayoutError('Field %r: unsupported data-type %r' % (
+                name, data_type))
+        try:
+            self.length = int(length)
+            self.decimal_pos = int(decimal_pos)
+        except ValueError:
+            raise LayoutError('Field %r: length & implied decimal position '
+                'must be integers' % name)
+        self.offset = offset
+        self.pad = pad
+        self.code = code
+        self.is_packed = self.base_type == 'BCD'
+        self.is_binary = self.base_type in self.BINARY_DATA_TYPES
+        self.digits = self.length
+        self.struct_code = '%ds' % self.length
+        if self.is_packed:
+            self.digits = packed_digits(self.length)
+        elif self.is_binary:
+            self.struct_code = self.BINARY_DATA_TYPES[self.base_type].get(
+                self.length)
+            if self.struct_code is None:
+                raise LayoutError('Field %r: invalid %s length %d' % (name,
+                    self.base_type, self.length))
+            self.digits = self.BINARY_DIGITS[self.length]
+        self.is_filler = 'FILLER' in name.upper()
+        self.is_datetime = self.base_type in self.DATE_TIME_DATA_TYPES
+        if self.is_datetime:
+            fmt = datetime_output_fmt or DATETIME_OUTPUT_FMT
+            self.datetime_output_fmt = fmt[self.base_type]
+            self.datetime_input_fmt = self._datetime_input_fmt()
+        self.convert = self._compile()
+
+    def _datetime_input_fmt(self):
+        match = self.DATE_TIME_RE.match(self.data_type)
+        if match:
+            return match.group(1)
+        fmt = DATETIME_INPUT_FMT[self.base_type].get(self.length)
+        if fmt is None:
+            raise LayoutError('Field %r: no %s input format for length %d' % (
+                self.name, self.base_type, self.length))
+        return fmt
+
+    def constants(self, num):
+        """Values referenced by the conversion source of field # num"""
+        result = {'_b%d' % num: ' ' * self.length}
+        if self.is_packed:
+            result['_b%d' % num] = self.pad * self.length
+            result['_n%d' % num] = '\x00' * self.length
+        if self.base_type in ['FLOAT', 'DOUBLE', 'BCD', 'ZONED'] + \
+            self.INTEGER_BINARY_DATA_TYPES and self.decimal_pos:
+            if self.digits > FLOAT_DIGITS:
+                result['_s%d' % num] = -self.decimal_pos
+            else:
+                result['_s%d' % num] = 10.0 ** self.decimal_pos
+        elif self.is_datetime:
+            result['_m%d' % num], result['_x%d' % num] = self._memo()
+        return result
+
+    def _memo(self):
+        """Cache of converted date/time values & function used on a miss"""
+        memo = {}
+        zeros = '0' * self.length
+        in_fmt, out_fmt = self.datetime_input_fmt, self.datetime_output_fmt
+        def miss(data):
+            if len(memo) >= MEMO_LIMIT:
+                memo.clear()
+            if data.strip() in ('', zeros):
+                value = None
+            else:
+                value = datetime.strptime(data, in_fmt).strftime(out_fmt)
+            memo[data] = value
+            return value
+        return memo, miss
+
+    def source(self, num, var):
+        """Python source lines converting the unpacked field in var, in place,
+        a string or, for binary fields, a number"""
+        if self.is_binary:
+            return self._binary_source(num, var)
+        if self.base_type == 'CHAR':
+            return ['%s = %s.strip()' % (var, var)]
+        if self.is_datetime:
+            return [
+                'v = _m%d.get(%s, _MISSING)' % (num, var),
+                '%s = _x%d(%s) if v is _MISSING else v' % (var, num, var)]
+        is_null = '%s == _b%d' % (var, num)
+        if self.is_packed:
+            expr = '_PACKED_SIGN[%s[-1]] * int(_hexlify(%s)[:-1])' % (var, var)
+            is_null += ' or %s == _n%d' % (var, num)
+        elif self.base_type == 'ZONED':
+            # the leading '0' stops int() reading a sign among the digits
+            expr = "_ZONED_SIGN[%s[-1]] * int('0' + %s[:-1].lstrip(' ') + " \
+                "_ZONED_DIGIT[%s[-1]])" % (var, var, var)
+        elif self.base_type == 'INTEGER' or self.decimal_pos:
+            expr = 'int(%s)' % var
+        else:
+            expr = 'float(%s)' % var
+        if self.decimal_pos and self.digits > FLOAT_DIGITS:
+            expr = '_Decimal(%s).scaleb(_s%d)' % (expr, num)
+        elif self.decimal_pos:
+            expr = '%s / _s%d' % (expr, num)
+        return ['%s = None if %s else %s' % (var, is_null, expr)]
+
+    def _binary_source(self, num, var):
+        if self.base_type == 'HEXFLOAT':
+            return ['%s = _HFP32[%s >> 24] * (%s & 0xFFFFFF)' % (
+                var, var, var)]
+        if self.base_type == 'HEXDOUBLE':
+            return ['%s = _HFP64[%s >> 56] * (%s & 0xFFFFFFFFFFFFFF)' % (
+                var, var, var)]
+        if self.base_type in self.INTEGER_BINARY_DATA_TYPES and \
+            self.decimal_pos:
+            if self.digits > FLOAT_DIGITS:
+                return ['%s = _Decimal(%s).scaleb(_s%d)' % (var, var, num)]
+            return ['%s = %s / _s%d' % (var, var, num)]
+        return []
+
+    def _compile(self):
+        """Single field conversion function, used outside of Layouts and to
+        locate the field responsible for a record decoding failure
+        convert(data) -> converted value of the field's raw string
+        """
+        lines = ['def convert(f):']
+        if self.is_binary:
+            lines.append('    f, = _unpack(f)')
+        lines += [ '    ' + i for i in self.source(0, 'f') ]
+        lines.append('    return f')
+        namespace = self.constants(0)
+        namespace['_unpack'] = struct.Struct('>' + self.struct_code).unpack
+        namespace.update(_NAMESPACE)
+        exec(compile_source('\n'.join(lines), '<field %s>' % self.name,
+            self.code), namespace)
+        return namespace['convert']
+
+    def __str__(self):
+        mesg = 'Name: %s, Type: %s, Length: %d, Implied-Decimal-Position: %d, '
+        return mesg % (self.name, self.data_type, self.length,
+            self.decimal_pos) + 'Offset: %d' % self.offset
+
+
+class Layout:
+    """Record layout compiled into a single decode function
+
+    decode(record) -> tuple of converted field values
+    decode_from(buffer, offset, text) -> same, record read from buffer at
+        offset, text is transcode(buffer) or None
+    unpack(record) -> tuple of raw field strings, numbers for binary fields
+
+    columns, names & the decoded values only hold the selected fields,
+    all_columns & the record length are those of all fields.
+
+    EBCDIC data (codepage) is transcoded to ASCII a whole buffer at a time by
+    transcode.  Text fields are unpacked from the transcoded buffer, packed &
+    binary fields from the original one.
+    """
+
+    def __init__(self, fields, name='record', datetime_output_fmt=None,
+        codepage=None, code=None, select=None, filler=True):
+        """fields (list) - (name, data_type, length, decimal_pos) per field
+            or OCCURS loop, i.e. copybook2csv.py output without the
+            structure name line
+        name (string) - structure/model name
+        datetime_output_fmt (dict) - strftime formats keyed by base-type
+        codepage (string) - EBCDIC code page of the data, see ebcdic.py,
+            None for ASCII data
+        code (dict) - compiled code objects keyed by source, filled in with
+            the layout's code, see compile_source & cache.py
+        select (list of strings) - names of the fields decoded (case
+            insensitive), in record order whatever their order in the list,
+            None for all fields
+        filler (boolean) - False skips FILLER fields
+        """
+        self.name = name
+        self.fields = [ tuple(i) for i in fields ]
+        self.datetime_output_fmt = datetime_output_fmt
+        self.codepage = codepage
+        self.code = {} if code is None else code
+        self.select, self.filler = select, filler
+        self.table, self.pad = None, ' '
+        if codepage:
+            try:
+                self.table = ebcdic.table(codepage)
+            except ValueError, error_mesg:
+                raise LayoutError(str(error_mesg))
+            self.pad = ebcdic.space(codepage)
+        self.columns = []
+        offset = 0
+        for field in flatten(fields):
+            if len(field) != 4:
+                raise LayoutError('Invalid field definition %r' %
+                    ', '.join(field))
+            column = Column(offset=offset,
+                datetime_output_fmt=datetime_output_fmt, pad=self.pad,
+                code=self.code, *field)
+            self.columns.append(column)
+            offset += column.length
+        if not self.columns:
+            raise LayoutError('Layout %r has no fields' % name)
+        self.record_length = offset
+        self.all_columns = self.columns
+        self.columns = self._project(self.columns, select, filler)
+        if not self.columns:
+            raise LayoutError('Layout %r: no fields selected' % name)
+        self.names = [ i.name for i in self.columns ]
+        # big-endian, no padding: binary fields are unpacked as numbers
+        self.struct_fmt = self._struct_fmt(self.columns)
+        self.struct = struct.Struct(self.struct_fmt)
+        self.unpack = self.struct.unpack
+        self.unpack_from = self.struct.unpack_from
+        self.decode, self.decode_from = self._compile()
+
+    def _project(self, columns, select, filler):
+        """Columns decoded, by name & FILLER"""
+        if select is not None:
+            names = set([ i.lower() for i in select ])
+            columns = [ i for i in columns if i.name.lower() in names ]
+        if not filler:
+            columns = [ i for i in columns if not i.is_filler ]
+        return columns
+
+    def _struct_fmt(self, columns):
+        """struct format unpacking columns, the bytes of any other field are
+        skipped as pad bytes"""
+        codes, pos = ['>'], 0
+        for column in columns:
+            if column.offset > pos:
+                codes.append('%dx' % (column.offset - pos))
+            codes.append(column.struct_code)
+            pos = column.offset + column.length
+        if self.record_length > pos:
+            codes.append('%dx' % (self.record_length - pos))
+        return ''.join(codes)
+
+    def is_text(self, column):
+        """True if the column's bytes are transcoded from the code page"""
+        return bool(self.table) and not (column.is_packed or column.is_binary)
+
+    def transcode(self, buf):
+        """buf translated from the code page to ASCII, buf if there's none"""
+        if self.table:
+            return buf.translate(self.table)
+        return buf
+
+    def _structs(self):
+        """(field #s, struct.Struct skipping the other fields, unpacks the
+        transcoded record) per group of fields"""
+        text = [ self.is_text(i) for i in self.columns ]
+        result = []
+        for is_text in [True, False]:
+            nums = [ i for i, j in enumerate(text) if j == is_text ]
+            if nums:
+                fmt = self._struct_fmt([ self.columns[i] for i in nums ])
+                result.append((nums, struct.Struct(fmt), is_text))
+        return result
+
+    def source(self):
+        """Python source of the decode & decode_from functions"""
+        names = [ 'f%d' % i for i in range(len(self.columns)) ]
+        body = []
+        for num, column in enumerate(self.columns):
+            body += column.source(num, names[num])
+        body.append('return (%s,)' % ', '.join(names))
+        lines = []
+        if not self.table:
+            for header, unpack in [('decode(record)', '_unpack(record)'),
+                ('decode_from(buffer, offset=0, text=None)',
+                '_unpack_from(buffer, offset)')]:
+                lines.append('def %s:' % header)
+                lines.append('    %s, = %s' % (', '.join(names), unpack))
+                lines += [ '    ' + i for i in body ]
+            return '\n'.join(lines)
+        lines += ['def decode(record):', '    text = record.translate(_table)']
+        for group, (nums, struct_, is_text) in enumerate(self._structs()):
+            lines.append('    %s, = _unpack%d(%s)' % (', '.join([ names[i]
+                for i in nums ]), group, 'text' if is_text else 'record'))
+        lines += [ '    ' + i for i in body ]
+        lines += ['def decode_from(buffer, offset=0, text=None):',
+            '    if text is None:',
+            '        return decode(buffer[offset:offset + %d])' %
+            self.record_length]
+        for group, (nums, struct_, is_text) in enumerate(self._structs()):
+            lines.append('    %s, = _unpack_from%d(%s, offset)' % (
+                ', '.join([ names[i] for i in nums ]), group,
+                'text' if is_text else 'buffer'))
+        lines += [ '    ' + i for i in body ]
+        return '\n'.join(lines)
+
+    def _compile(self):
+        namespace = {'_unpack': self.unpack, '_unpack_from': self.unpack_from,
+            '_table': self.table}
+        for group, (nums, struct_, is_text) in enumerate(self._structs()):
+            namespace['_unpack%d' % group] = struct_.unpack
+            namespace['_unpack_from%d' % group] = struct_.unpack_from
+        namespace.update(_NAMESPACE)
+        for num, column in enumerate(self.columns):
+            namespace.update(column.constants(num))
+        exec(compile_source(self.source(), '<layout %s>' % self.name,
+            self.code), namespace)
+        return namespace['decode'], namespace['decode_from']
+
+    def fit(self, record):
+        """Pad or truncate record to the layout's record length"""
+        return record.ljust(self.record_length, self.pad)[:self.record_length]
+
+    def find_error(self, record):
+        """Locate the field that failed to decode
+        returns (tuple) - field #, Column object, raw field string or None,
+            text fields transcoded
+        """
+        for num, column in enumerate(self.columns):
+            data = record[column.offset:column.offset + column.length]
+            if self.is_text(column):
+                data = data.translate(self.table)
+            try:
+                column.convert(data)
+            except DECODE_ERRORS:
+                return num, column, data
+
+
+_NAMESPACE = {'_Decimal': Decimal, '_MISSING': _MISSING,
+    '_PACKED_SIGN': PACKED_SIGN, '_ZONED_DIGIT': ZONED_DIGIT,
+    '_ZONED_SIGN': ZONED_SIGN, '_hexlify': hexlify, '_HFP32': HFP32,
+    '_HFP64': HFP64}
+
+
+class VariableLayout:
+    """Record layout with OCCURS DEPENDING ON tables
+
+    Each combination of counts is a fixed Layout variant, compiled the first
+    time a record with those counts is seen & reused for every later one.
+    Up to VARIANT_LIMIT variants are kept, once there are more they're
+    compiled again as they're needed, with code objects that aren't kept
+    in the layout's code dict, so memory use doesn't grow with the number
+    of combinations, i.e. of a table of up to 500 occurrences.  The count
+    fields must precede their tables, so they're read from each
+    record at the same offsets before the variant is chosen.
+
+    decode(record), unpack(record), fit(record), find_error(record) -> same
+        as Layout, by the record's variant
+    """
+
+    def __init__(self, fields, name='record', datetime_output_fmt=None,
+        codepage=None, code=None, select=None, filler=True):
+        """Same as Layout"""
+        self.name = name
+        self.fields = [ tuple(i) for i in fields ]
+        self.datetime_output_fmt = datetime_output_fmt
+        self.codepage = codepage
+        self.code = {} if code is None else code
+        self.select, self.filler = select, filler
+        self.depending = depending_on(self.fields)
+        # counts: Layout, up to VARIANT_LIMIT of them
+        self.variants = {}
+        # code dict of the variants, a new one each time they're reset
+        self.variant_code = self.code
+        # all fields, count fields are read whether they're selected or not
+        empty, single = [ Layout(flatten(self.fields,
+            dict([ (j, i) for j in self.depending ])), self.name,
+            self.datetime_output_fmt, self.codepage, self.code)
+            for i in (0, 1) ]
+        self.table, self.pad = empty.table, empty.pad
+        self.known = set([ i.name.lower() for i in single.all_columns ])
+        if select is not None:
+            unknown = [ i for i in select if not self.is_field(i) ]
+            if unknown:
+                raise LayoutError('Unknown field %s' % ', '.join(unknown))
+        offsets = [ dict([ (j.name.lower(), j.offset) for j in i.columns ])
+            for i in (empty, single) ]
+        self.counters = []
+        for count_name in self.depending:
+            key = count_name.lower()
+            if key not in offsets[0] or offsets[0][key] != offsets[1][key]:
+                raise LayoutError('OCCURS DEPENDING ON %s: the count field '
+                    'must precede its table' % count_name)
+            self.counters.append(empty.columns[[ i.name.lower()
+                for i in empty.columns ].index(key)])
+
+    def is_text(self, column):
+        """True if the column's bytes are transcoded from the code page"""
+        return bool(self.table) and not (column.is_packed or column.is_binary)
+
+    def is_field(self, name):
+        """True if name is a field of the variants, a table field of any
+        index is in the variant with 1 of each"""
+        name = name.lower()
+        return name in self.known or \
+            TABLE_FIELD_RE.sub(r'_1\1', name) in self.known
+
+    def transcode(self, buf):
+        """buf translated from the code page to ASCII, buf if there's none"""
+        if self.table:
+            return buf.translate(self.table)
+        return buf
+
+    def variant(self, counts):
+        """Layout compiled for a tuple of counts, one per depending field"""
+        layout = self.variants.get(counts)
+        if layout is None:
+            if len(self.variants) >= VARIANT_LIMIT:
+                self.variants.clear()
+                self.variant_code = {}
+            layout = Layout(flatten(self.fields, dict(zip(self.depending,
+                counts))), self.name, self.datetime_output_fmt,
+                self.codepage, self.variant_code, self.select, self.filler)
+            self.variants[counts] = layout
+        return layout
+
+    def counts(self, record, offset=0):
+        """Values of the count fields of the record at offset in record"""
+        result = []
+        for column in self.counters:
+            start = offset + column.offset
+            data = record[start:start + column.length]
+            if self.is_text(column):
+                data = data.translate(self.table)
+            try:
+                count = column.convert(data) or 0
+                if count < 0 or count != int(count):
+                    raise ValueError
+            except DECODE_ERRORS:
+                raise LayoutError('OCCURS DEPENDING ON %s: invalid count %r'
+                    % (column.name, data))
+            result.append(int(count))
+        return tuple(result)
+
+    def variant_for(self, record):
+        return self.variant(self.counts(record))
+
+    def decode(self, record):
+        return self.variant_for(record).decode(record)
+
+    def unpack(self, record):
+        return self.variant_for(record).unpack(record)
+
+    def fit(self, record):
+        return self.variant_for(record).fit(record)
+
+    def find_error(self, record):
+        return self.variant_for(record).find_error(record)
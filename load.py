@@ -14,10 +14,17 @@ Supports the following iterative stripping & pruning options:
         - 'strip' each CSV token
         - 'prune' each line where all CSV tokens are empty
 
+Lazy versions, iter_text, iter_lines & iter_csv, are generators with the
+same options.  Lines are read, stripped & pruned one at a time & the file is
+read no further than stop_at_line, so files of any size are loaded in constant
+memory.
+
 Examples:
 load.text('file1.txt')
 load.lines('file1.txt', stop_at=5)
 load.csv_('file1.txt', strip=True, prune=True)
+for line in load.iter_lines('file1.txt', strip_='right', stop_at_line=5):
+    print line
 """
 
 __version__ = """load ver 0.5
@@ -27,6 +34,7 @@ This is free software; see source for copying conditions.  There is NO
 warranty; not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 """
 import csv, sys
+from itertools import islice
 
 def text(file_name, fmt='text', sep=',', stop_at_line=None):
     """LOAD TEXT FILE
@@ -91,17 +99,12 @@ def lines(file_name, strip_=False, strip_chars=None, prune=False, stop_at_line=N
         - (string of chars):
     prune (boolean) - remove blank lines
     stop_at_line (int) - line number at which to stop reading file
-    returns (list of strings) - lines without EOL chars
+    returns (list of strings) - lines, EOL chars are only removed by strip_
     """
     lines = text(file_name, 'lines', stop_at_line=stop_at_line)
-    if strip_:
-        lines = [ line.strip(strip_chars) for line in lines ]
-    elif type(strip_) is str:
-        if len(strip_):
-            if strip_[0] == 'l':
-                lines = [ line.lstrip(strip_chars) for line in lines ]
-            elif strip_[0] == 'r':
-                lines = [ line.rstrip(strip_chars) for line in lines ]               
+    strip = _strip_method(strip_)
+    if strip:
+        lines = [ strip(line, strip_chars) for line in lines ]
     if prune is True:
         lines = [ line for line in lines if line ]
     return lines  
@@ -147,3 +150,80 @@ def csv_(file_name, sep=',', strip_= False, strip_chars=None, prune=False, stop_
     if prune:
         lines = [ line for line in lines if ''.join(line) ]
     return lines
+
+
+def _strip_method(strip_):
+    """str method applying a strip_ option, None for no stripping"""
+    if strip_ is True:
+        return str.strip
+    elif type(strip_) is str and len(strip_):
+        if strip_[0] == 'l':
+            return str.lstrip
+        elif strip_[0] == 'r':
+            return str.rstrip
+
+def iter_text(file_name, fmt='lines', sep=',', stop_at_line=None):
+    """LAZY LOAD TEXT FILE, generator version of text
+    file_name:
+        - (file): file handle
+        - (string): file name
+        - (iterable): lines, i.e. a list of strings
+    fmt (string):
+        - 'lines': yields each line, contains EOL characters
+        - 'csv': yields each line of a delimited text file as a list
+    sep (string) - delimiter in CSV files
+    stop_at_line (none or integer) - line num to stop reading file
+    yields:
+        - (string) fmt:'lines'
+        - (list of strings) fmt:'csv'
+        - nothing, error opening file
+    Files opened by name are closed once read.
+    """
+    if stop_at_line is not None and stop_at_line < 0:
+        sys.stderr.write('load.py: ERROR - ')
+        sys.stderr.write('stop_at_line parameter must be a positive integer\n')
+        sys.exit(1)
+    f = file_name
+    if type(file_name) is str:
+        try:
+            f = open(file_name)
+        except IOError, error_msg:
+            sys.stderr.write('load.iter_text: ERROR loading file "%s".\n%s\n'
+                % (file_name, error_msg))
+            return
+    try:
+        lines = f
+        if fmt == 'csv':
+            lines = csv.reader(f, delimiter=sep)
+        for line in islice(lines, stop_at_line):
+            yield line
+    finally:
+        if f is not file_name:
+            f.close()
+
+def iter_lines(file_name, strip_=False, strip_chars=None, prune=False,
+    stop_at_line=None):
+    """Lazily load lines from file, generator version of lines, same options
+    yields (string) - each line, EOL chars are only removed by strip_
+    """
+    lines = iter_text(file_name, 'lines', stop_at_line=stop_at_line)
+    strip = _strip_method(strip_)
+    if strip:
+        lines = ( strip(line, strip_chars) for line in lines )
+    if prune:
+        lines = ( line for line in lines if line )
+    return lines
+
+def iter_csv(file_name, sep=',', strip_=False, strip_chars=None, prune=False,
+    stop_at_line=None):
+    """Lazily load Comma Separated Values (CSV) from file, generator version
+    of csv_, same options
+    yields (list of strings) - each line as a list of fields (tokens)
+    """
+    lines = iter_text(file_name, 'csv', sep, stop_at_line)
+    strip = _strip_method(strip_)
+    if strip:
+        lines = ( [ strip(i, strip_chars) for i in line ] for line in lines )
+    if prune:
+        lines = ( line for line in lines if ''.join(line) )
+    return lines
@@ -0,0 +1,111 @@
+"""COBOL NUMERIC ENCODINGS
+Decoders for numeric storage formats that aren't plain display digits.
+
+Packed decimal (COMP-3): 2 digits per byte, the low nibble of the last byte
+holds the sign (C, A, E, F positive, D, B negative).  A field of n bytes holds
+2n - 1 digits.
+
+Zoned decimal (signed display, PIC S9): one digit per byte, the sign is
+overpunched on the last digit, '{' & 'A'-'I' positive 0-9, '}' & 'J'-'R'
+negative 0-9, as written by ASCII systems or transcoded from EBCDIC zones
+C & D.  Micro Focus style 'p'-'y' negative digits are also accepted.
+
+IBM hexadecimal floating point (COMP-1 & COMP-2 on the mainframe): sign bit,
+7-bit base 16 exponent in excess 64, then a 24-bit (single) or 56-bit (double)
+fraction.  The value is sign * fraction * 16 ** (exponent - 64).
+
+Decoding is table driven, nothing is interpreted one nibble at a time in
+Python:
+    - unpack_packed: the digit nibbles are expanded by binascii.hexlify & read
+      by int(), the sign comes from a 256-entry table of last bytes
+    - unpack_zoned: the overpunched digit & the sign are looked up in tables
+      of last characters, the restored field is read by int()
+    - HFP32, HFP64: the sign & exponent byte of a hex float indexes a table
+      of signed powers of 2, multiplied by the fraction gives the value
+
+Whole columns are decoded with NumPy by vectorized.py, through the same
+tables.
+
+Examples:
+unpack_packed('\\x01\\x23\\x4d')      # -1234
+unpack_zoned('12345}')              # -123450
+unpack_hfp(0x42640000, 32)          # 100.0, int from a big-endian 'I' unpack
+"""
+
+__version__ = """numeric ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+from binascii import hexlify
+
+__all__ = ['HFP32', 'HFP64', 'PACKED_SIGN', 'ZONED_DIGIT', 'ZONED_SIGN',
+    'packed_digits', 'packed_length', 'unpack_hfp', 'unpack_packed',
+    'unpack_zoned']
+
+POSITIVE_NIBBLES = [0xA, 0xC, 0xE, 0xF]
+NEGATIVE_NIBBLES = [0xB, 0xD]
+# last byte of a packed field -> sign, bytes without a sign nibble are missing
+PACKED_SIGN = dict(
+    [ (chr(i), 1) for i in range(256) if i & 0xF in POSITIVE_NIBBLES ] +
+    [ (chr(i), -1) for i in range(256) if i & 0xF in NEGATIVE_NIBBLES ])
+# overpunched last character: digit, per sign
+OVERPUNCH = [(1, '{ABCDEFGHI'), (-1, '}JKLMNOPQR'), (-1, 'pqrstuvwxy')]
+# last character of a zoned field -> sign, plain digits are unsigned
+ZONED_SIGN = dict([ (str(i), 1) for i in range(10) ] + [ (j, sign)
+    for sign, chars in OVERPUNCH for j in chars ])
+# last character of a zoned field -> digit it overpunches
+ZONED_DIGIT = dict([ (str(i), str(i)) for i in range(10) ] + [ (j, str(k))
+    for sign, chars in OVERPUNCH for k, j in enumerate(chars) ])
+# hex float size in bits: bits of fraction
+HFP_FRACTION_BITS = {32: 24, 64: 56}
+
+
+def _hfp_table(fraction_bits):
+    """Signed scale of a hex float's fraction, indexed by the first byte"""
+    return [ (-1.0 if i & 0x80 else 1.0) *
+        2.0 ** (4 * ((i & 0x7F) - 64) - fraction_bits) for i in range(256) ]
+
+HFP32 = _hfp_table(HFP_FRACTION_BITS[32])
+HFP64 = _hfp_table(HFP_FRACTION_BITS[64])
+
+
+def packed_length(digits):
+    """Number of bytes used to store a packed field of digits"""
+    return digits // 2 + 1
+
+def packed_digits(length):
+    """Number of digits held by a packed field of length bytes"""
+    return 2 * length - 1
+
+def unpack_packed(data):
+    """Signed int value of a packed decimal string"""
+    try:
+        sign = PACKED_SIGN[data[-1]]
+    except (KeyError, IndexError):
+        raise ValueError('invalid packed decimal sign %r' % data[-1:])
+    return sign * int(hexlify(data)[:-1])
+
+def unpack_zoned(data):
+    """Signed int value of a zoned decimal string, leading spaces are read
+    as zeros"""
+    try:
+        sign = ZONED_SIGN[data[-1]]
+    except (KeyError, IndexError):
+        raise ValueError('invalid zoned decimal sign %r' % data[-1:])
+    digits = data[:-1].lstrip(' ')
+    # int() would also take a sign, the only sign is the overpunched one
+    if digits and not digits.isdigit():
+        raise ValueError('invalid zoned decimal digits %r' % data[:-1])
+    return sign * int(digits + ZONED_DIGIT[data[-1]])
+
+def unpack_hfp(value, bits=32):
+    """Float value of an IBM hex float
+    value (int) - the field unpacked as a big-endian unsigned integer
+    bits (int) - 32 for single, 64 for double precision
+    """
+    table = HFP32 if bits == 32 else HFP64
+    fraction_mask = (1 << HFP_FRACTION_BITS[bits]) - 1
+    return table[value >> bits - 8] * (value & fraction_mask)
@@ -0,0 +1,128 @@
+"""OCCURS PROGRAM
+Copybook fields & OCCURS loops, counted or DEPENDING ON another field,
+compiled into a flat program for cobol2dbms.py.
+
+Consecutive fields outside of loop boundaries are a single fixed-slice run,
+so a record is parsed a run at a time, without looking up fields or loops.
+Loop counts are read when a loop starts, from the values of the fields
+already parsed.
+
+Examples:
+program = Program(fields, loops)
+for step in program.walk(depend_ons):
+    if step[0] == Program.RUN:
+        fields, length, ch_pos = step[1:]
+"""
+
+__version__ = """occurs ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__all__ = ['Program']
+
+
+class Program:
+    """Field & Loop definitions compiled into a flat instruction program
+    
+    Parsing a record is a walk through the instructions, see walk, each one
+    a tuple:
+        - (RUN, fields, length): fixed-slice run of consecutive fields,
+          fields is a list of (Field, start, end, depended_on) with start &
+          end relative to the first field of the run
+        - (LOOP, loop, end): start of a counted or depending on repeat, end
+          is the index of its END instruction
+        - (END, start): end of an iteration, start is the index of its LOOP
+          instruction
+    
+    Offsets & loop bounds are computed once, so no field or loop lookups
+    are left for the records.
+    
+    """
+    RUN, LOOP, END = range(3)
+    
+    def __init__(self, fields, loops):
+        """Program constructor
+        :type fields: list
+        :param fields: Field objects, loops included, see cobol2dbms.py,
+            with indents, name & length attributes
+        
+        :type loops: dict (keys=field_num)
+        :param loops: Loop objects, with name & depends_on_field_name
+            attributes & a count(depend_ons) method
+        
+        """
+        depend_ons = set([ i.depends_on_field_name for i in loops.values()
+            if i.depends_on_field_name ])
+        self.instructions = []
+        # LOOP instruction index & indents of each open loop
+        open_loops = []
+        for field_num, field in enumerate(fields):
+            while open_loops and field.indents <= open_loops[-1][1]:
+                self.end_loop(open_loops.pop()[0])
+            if field_num in loops:
+                open_loops.append((len(self.instructions), field.indents))
+                self.instructions.append((self.LOOP, loops[field_num], None))
+                continue
+            if not self.instructions or \
+                    self.instructions[-1][0] != self.RUN:
+                self.instructions.append((self.RUN, [], 0))
+            run, fields_, length = self.instructions[-1]
+            fields_.append((field, length, length + field.length,
+                field.name in depend_ons))
+            self.instructions[-1] = (run, fields_, length + field.length)
+        while open_loops:
+            self.end_loop(open_loops.pop()[0])
+    
+    def end_loop(self, start):
+        """Close the loop started by instruction number start"""
+        loop = self.instructions[start][1]
+        self.instructions[start] = (self.LOOP, loop, len(self.instructions))
+        self.instructions.append((self.END, start))
+
+    def walk(self, depend_ons):
+        """Steps of parsing a record, in order
+        
+        :type depend_ons: dict (keys=field names)
+        :param depend_ons: values of the fields loop counts depend on, set
+            by the caller from each RUN step before the walk goes on
+        
+        :rtype: generator of tuples
+        :returns: steps, each one of
+            - (RUN, fields, length, ch_pos): run of fields to read at
+              character position ch_pos, see RUN instructions
+            - (LOOP, loop, count): start of a loop of count iterations,
+              none if count is 0, the loop's fields are then skipped
+            - (END, loop, more): end of an iteration, more is True if
+              another one follows
+        
+        """
+        program = self.instructions
+        # remaining iterations of each open loop
+        counters = []
+        ch_pos = pc = 0
+        while pc < len(program):
+            instruction = program[pc]
+            if instruction[0] == self.RUN:
+                yield self.RUN, instruction[1], instruction[2], ch_pos
+                ch_pos += instruction[2]
+            elif instruction[0] == self.LOOP:
+                loop, end = instruction[1:]
+                count = loop.count(depend_ons)
+                yield self.LOOP, loop, count
+                if count <= 0:
+                    # no occurrences, the loop takes no space
+                    pc = end + 1
+                    continue
+                counters.append(count)
+            else:
+                start = instruction[1]
+                counters[-1] -= 1
+                yield self.END, program[start][1], counters[-1] > 0
+                if counters[-1]:
+                    pc = start + 1
+                    continue
+                counters.pop()
+            pc += 1
@@ -0,0 +1,163 @@
+"""PARALLEL CONVERSION OF FIXED-LENGTH DATA FILES
+Splits a data file into record-aligned chunks & decodes them in a process pool.
+
+Fixed-length records start at exact byte offsets, record k at
+k * record_size, so a file can be split without scanning it.  Each worker
+process compiles the layout once, then reads, decodes & formats whole chunks.
+Formatted chunks are written to the output in the original record order, with
+at most 2 chunks per worker in flight.  A --where condition (see where.py) is
+compiled in each worker & skips records before they're decoded.
+
+Examples:
+convert(Layout(fields), 'data.txt', sys.stdout, 8, repr)
+"""
+
+__version__ = """parallel ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import collections, multiprocessing, os
+
+from layout import DECODE_ERRORS, Layout, LayoutError
+from where import Where
+
+__all__ = ['ChunkDecoder', 'chunks', 'convert']
+
+# approximate size of the byte range decoded per task
+CHUNK_BYTES = 8 * 1024 * 1024
+# chunks in flight per worker, bounds memory used by finished chunks
+CHUNKS_PER_WORKER = 2
+
+_decoder = None
+
+
+def chunks(file_size, record_size, chunk_bytes=CHUNK_BYTES):
+    """Record-aligned (offset, size) byte ranges covering file_size bytes"""
+    chunk_size = max(1, chunk_bytes // record_size) * record_size
+    return [ (i, min(chunk_size, file_size - i))
+        for i in range(0, file_size, chunk_size) ]
+
+
+class ChunkDecoder:
+    """Decodes & formats a buffer of whole records"""
+
+    def __init__(self, layout, format_record, terminator='\n', numpy=False,
+        match=None):
+        """layout (layout.Layout) - compiled record layout
+        format_record (function) - converts a tuple of values to a string
+        terminator (string) - characters following each record, '' for none
+        numpy (boolean) - decode column-at-a-time, see columnar.py
+        match (function) - record filter, see where.py, None for all records
+        """
+        if numpy and match:
+            raise LayoutError('--where is not supported with --numpy')
+        self.layout = layout
+        self.match = match
+        self.format_record = format_record
+        self.terminator = terminator
+        self.record_size = layout.record_length + len(terminator)
+        self.columnar = None
+        if numpy:
+            # imports NumPy, only when used
+            from columnar import ColumnarDecoder
+            self.columnar = ColumnarDecoder(layout, terminator)
+
+    def __call__(self, buf, record_num=1):
+        """returns (string) - formatted records, one per line"""
+        if self.columnar:
+            columns = self.columnar.decode_block(buf, record_num)
+            lines = map(self.format_record, self.columnar.rows(columns))
+        else:
+            lines = self.decode(buf, record_num)
+        if lines:
+            lines.append('')
+        return '\n'.join(lines)
+
+    def decode(self, buf, record_num):
+        layout, terminator = self.layout, self.terminator
+        length, size = layout.record_length, self.record_size
+        decode_from, format_record = layout.decode_from, self.format_record
+        match = self.match
+        if terminator and len(buf) % size == length:
+            # last record without a terminator
+            buf += terminator
+        if len(buf) % size:
+            raise LayoutError('Record layout vs. record size mismatch, '
+                '%d bytes is not a multiple of %d' % (len(buf), size))
+        text = layout.transcode(buf)
+        lines = []
+        for pos in xrange(0, len(buf), size):
+            if terminator and buf[pos + length:pos + size] != terminator:
+                raise LayoutError('Record #%d: record length mismatch, '
+                    'terminator not found at byte %d' % (
+                    record_num + pos // size, length))
+            if match and not match(buf, pos):
+                continue
+            try:
+                lines.append(format_record(decode_from(buf, pos, text)))
+            except DECODE_ERRORS:
+                field_num, column, data = layout.find_error(
+                    buf[pos:pos + length])
+                raise LayoutError('Record #%d: unable to convert %r to %s, '
+                    'field %s' % (record_num + pos // size, data,
+                    column.data_type, column.name))
+        return lines
+
+
+def _init_worker(fields, name, datetime_output_fmt, codepage, select, filler,
+    format_record, terminator, numpy, where):
+    global _decoder
+    layout = Layout(fields, name, datetime_output_fmt, codepage, None, select,
+        filler)
+    match = Where(where).compile(layout) if where else None
+    _decoder = ChunkDecoder(layout, format_record, terminator, numpy, match)
+
+def _decode_chunk(task):
+    file_name, offset, size = task
+    f = open(file_name, 'rb')
+    try:
+        f.seek(offset)
+        buf = f.read(size)
+    finally:
+        f.close()
+    return _decoder(buf, offset // _decoder.record_size + 1)
+
+def convert(layout, file_name, output, workers, format_record,
+    terminator='\n', numpy=False, chunk_bytes=CHUNK_BYTES, where=None):
+    """Decode file_name with a pool of worker processes
+    layout (layout.Layout) - compiled record layout
+    file_name (string) - data file, fixed-length records
+    output (file) - formatted records are written in record order
+    workers (int) - number of worker processes
+    format_record (function) - picklable, i.e. a module-level function
+        or a writers.py formatter, converts a tuple of values to a string
+    terminator (string) - characters following each record, '' for none
+    numpy (boolean) - decode column-at-a-time, see columnar.py
+    where (string) - condition records must meet, see where.py
+    """
+    if where:
+        # errors are raised here, not in the workers
+        Where(where).compile(layout)
+    record_size = layout.record_length + len(terminator)
+    file_size = os.path.getsize(file_name)
+    pool = multiprocessing.Pool(workers, _init_worker, (layout.fields,
+        layout.name, layout.datetime_output_fmt, layout.codepage,
+        layout.select, layout.filler, format_record, terminator, numpy,
+        where))
+    pending = collections.deque()
+    try:
+        for offset, size in chunks(file_size, record_size, chunk_bytes):
+            pending.append(pool.apply_async(_decode_chunk,
+                ((file_name, offset, size),)))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                output.write(pending.popleft().get())
+        while pending:
+            output.write(pending.popleft().get())
+    except:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
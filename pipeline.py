@@ -0,0 +1,104 @@
+"""PIPELINED CONVERSION
+Overlaps reading, decoding & writing of a data file.
+
+A reader thread reads large blocks of records, the calling thread decodes
+them a batch at a time & a writer thread writes each batch of formatted records
+with a single write.  Stages are connected by bounded queues, a stage that
+gets ahead of the next one blocks until there's room (backpressure), so at
+most 2 * depth batches are in memory.  File reads & writes release the GIL,
+so disk, network & pipe waits are hidden behind decoding.
+
+Errors in the reader or writer stage are raised in the calling thread.
+
+Examples:
+run(line_batches(open('data.txt')), decode_batch, sys.stdout.write)
+    decode_batch(batch, output) appends formatted records to the list output
+run(records.fixed_blocks(f, 120), decode_block, out.write, depth=4)
+"""
+
+__version__ = """pipeline ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import Queue, sys, threading
+
+__all__ = ['line_batches', 'run']
+
+# batches waiting between stages
+DEPTH = 8
+# approximate number of bytes read per batch of lines
+BATCH_BYTES = 1024 * 1024
+
+# end of the stream, put on a queue by the stage before
+_END = object()
+
+
+def line_batches(file_, batch_bytes=BATCH_BYTES):
+    """Yield lists of whole lines, with their line terminators, of about
+    batch_bytes each"""
+    return iter(lambda: file_.readlines(batch_bytes), [])
+
+
+def _thread(target, *args):
+    """Started daemon thread, never keeps the process alive"""
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def _reraise(errors):
+    if errors:
+        exc_type, exc_value, traceback = errors[0]
+        raise exc_type, exc_value, traceback
+
+def _read(batches, queue, errors):
+    try:
+        for batch in batches:
+            queue.put(batch)
+    except:
+        errors.append(sys.exc_info())
+    queue.put(_END)
+
+def _write(write, queue, errors):
+    batch = queue.get()
+    while batch is not _END:
+        if not errors:
+            try:
+                write(batch)
+            except:
+                # keep draining, so the decode stage never blocks
+                errors.append(sys.exc_info())
+        batch = queue.get()
+
+def run(batches, decode, write, depth=DEPTH):
+    """Read, decode & write in overlapping stages
+    batches (iterable) - batches of records, iterated in the reader thread
+    decode (function) - decode(batch, output) appends formatted records
+        (strings) to the list output, records appended before an error in
+        decode are still written
+    write (function) - writes formatted records, i.e. sys.stdout.write
+    depth (int) - batches queued between stages
+    """
+    decode_queue, write_queue = Queue.Queue(depth), Queue.Queue(depth)
+    read_errors, write_errors = [], []
+    _thread(_read, batches, decode_queue, read_errors)
+    writer = _thread(_write, write, write_queue, write_errors)
+    output = []
+    try:
+        batch = decode_queue.get()
+        while batch is not _END and not write_errors:
+            decode(batch, output)
+            write_queue.put(''.join(output))
+            output = []
+            batch = decode_queue.get()
+    finally:
+        # decoded records are written, even when decoding fails
+        if output:
+            write_queue.put(''.join(output))
+        write_queue.put(_END)
+        writer.join()
+    _reraise(write_errors)
+    _reraise(read_errors)
@@ -0,0 +1,275 @@
+"""READ FIXED-LENGTH & VARIABLE-LENGTH RECORDS
+Streams binary fixed-length records (RECFM=F) that have no line terminators,
+& variable-length records framed by descriptor words (RECFM=V & VB).
+
+Records are framed by the record length computed from the copybook, never by
+newlines, so data containing 0x0A bytes (i.e. packed or binary fields) is
+read correctly.  The file is read in large buffers holding whole records and
+records are unpacked in place with a precompiled struct.Struct, so files of
+any size are processed in constant memory.
+
+Data files that can be memory-mapped (not pipes) are framed without reading
+them at all: fixed_spans & line_spans yield the (start, end) byte offsets of
+each record in the map, & Layout.decode_from unpacks the fields straight out
+of it, no string is created for the raw record.  Pipes are framed the same
+way by stream_spans, in large buffers of whole records, so EBCDIC data is
+transcoded a buffer at a time rather than a record at a time.
+
+Variable-length records start with a 4 byte record descriptor word (RDW),
+the record length including the RDW as a big-endian halfword, then 2 zero
+bytes.  In RECFM=VB files records are grouped in blocks, each starting with
+a block descriptor word (BDW) of the same form, or an extended BDW: a 31 bit
+block length with the high bit set.  vb_spans reads large buffers of whole
+blocks & yields the offsets of each record in the buffer, so there's one
+read per buffer, not per record, & memory used is bounded by the buffer &
+the largest block.  Spanned records (RECFM=VBS) are not supported.
+
+Examples:
+for record in fixed_records(open('data.bin', 'rb'), 120):
+    print repr(record)
+for values in iter_unpack(layout.struct, open('data.bin', 'rb')):
+    print values
+for record_num, values in decode_fixed(layout, open('data.bin', 'rb')):
+    print values
+data = map_file(open('data.txt', 'rb'))
+for start, end in line_spans(data):
+    print layout.decode_from(data, start)
+for buf, start, end in vb_spans(open('data.vb', 'rb'), blocked=True):
+    print layout.decode(buf[start:end])
+"""
+
+__version__ = """records ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import mmap, struct
+
+from layout import DECODE_ERRORS, LayoutError
+
+__all__ = ['decode_fixed', 'fixed_blocks', 'fixed_records', 'fixed_spans',
+    'iter_unpack', 'line_spans', 'map_file', 'span_blocks', 'stream_spans',
+    'vb_records', 'vb_spans']
+
+# approximate number of bytes read per buffer
+BUFFER_SIZE = 1024 * 1024
+# record or block descriptor word, RECFM=V & VB
+DESCRIPTOR = struct.Struct('>I')
+# extended BDW, the length is the low 31 bits
+EXTENDED_BDW = 0x80000000
+
+
+def fixed_blocks(file_, record_length, buffer_size=BUFFER_SIZE):
+    """Yield buffers of whole records, only the last buffer of the file can
+    end with a partial record"""
+    block_size = max(1, buffer_size // record_length) * record_length
+    while True:
+        buf = file_.read(block_size)
+        if not buf:
+            break
+        while len(buf) % record_length:
+            # short read from a pipe, complete the last record
+            more = file_.read(record_length - len(buf) % record_length)
+            if not more:
+                break
+            buf += more
+        yield buf
+
+def fixed_records(file_, record_length, buffer_size=BUFFER_SIZE):
+    """Yield each record as a string, the last record is shorter than
+    record_length if the file size isn't a multiple of it"""
+    for buf in fixed_blocks(file_, record_length, buffer_size):
+        for pos in xrange(0, len(buf), record_length):
+            yield buf[pos:pos + record_length]
+
+def _check_trailing_bytes(buf, record_length, record_num):
+    """Raise an error for a partial record at the end of buf"""
+    if len(buf) % record_length:
+        raise LayoutError('Record #%d: %d trailing bytes, record length is '
+            '%d' % (record_num + len(buf) // record_length,
+            len(buf) % record_length, record_length))
+
+def iter_unpack(struct_, file_, buffer_size=BUFFER_SIZE, match=None):
+    """Yield a tuple of raw field strings per record
+    struct_ (struct.Struct) - precompiled record format, i.e. Layout.struct
+    match (function) - record filter, see where.py, None for all records
+    """
+    unpack_from, size = struct_.unpack_from, struct_.size
+    record_num = 1
+    for buf in fixed_blocks(file_, size, buffer_size):
+        for pos in xrange(0, len(buf) - size + 1, size):
+            if match and not match(buf, pos):
+                continue
+            yield unpack_from(buf, pos)
+        _check_trailing_bytes(buf, size, record_num)
+        record_num += len(buf) // size
+
+def decode_fixed(layout, file_, buffer_size=BUFFER_SIZE, match=None):
+    """Yield record #, tuple of converted field values per record
+    layout (layout.Layout) - compiled record layout
+    match (function) - record filter, see where.py, None for all records
+    """
+    decode_from, size = layout.decode_from, layout.record_length
+    record_num = 1
+    for buf in fixed_blocks(file_, size, buffer_size):
+        text = layout.transcode(buf)
+        for pos in xrange(0, len(buf) - size + 1, size):
+            if match and not match(buf, pos):
+                record_num += 1
+                continue
+            try:
+                values = decode_from(buf, pos, text)
+            except DECODE_ERRORS:
+                field_num, column, data = layout.find_error(buf[pos:pos + size])
+                raise LayoutError('Record #%d: unable to convert %r to %s, '
+                    'field %s' % (record_num, data, column.data_type,
+                    column.name))
+            yield record_num, values
+            record_num += 1
+        _check_trailing_bytes(buf, size, record_num - len(buf) // size)
+
+def map_file(file_):
+    """Read-only memory map of an open file, None if it can't be mapped, i.e.
+    a pipe or an empty file"""
+    try:
+        return mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError, AttributeError):
+        return
+
+def fixed_spans(data_size, record_length):
+    """Yield (start, end) offsets of each fixed-length record, the last
+    record is shorter than record_length if data_size isn't a multiple of it"""
+    for start in xrange(0, data_size, record_length):
+        yield start, min(start + record_length, data_size)
+
+def line_spans(data, size=None):
+    """Yield (start, end) offsets of each newline-framed record, end excludes
+    the line terminator
+    data (mmap or string) - the data file, see map_file
+    size (int) - offset the records end at, the length of data if None,
+        data[size - 1] is a newline if size is given
+    """
+    find = data.find
+    if size is None:
+        size = len(data)
+    start = 0
+    while start < size:
+        end = find('\n', start)
+        if end < 0:
+            # last record without a terminator
+            end = size
+        next_start = end + 1
+        if end > start and data[end - 1] == '\r':
+            end -= 1
+        yield start, end
+        start = next_start
+
+def stream_spans(file_, record_length=0, buffer_size=BUFFER_SIZE):
+    """Yield (buffer, start, end) of each record read from a file that can't
+    be memory-mapped, i.e. a pipe, the record is buffer[start:end], each
+    buffer holds whole records so it can be transcoded at once
+    record_length (int) - fixed-length records, 0 for newline-framed ones
+    """
+    buf, pos = '', 0
+    while True:
+        data = file_.read(buffer_size)
+        # the partial record left at the end of the last buffer is kept
+        buf = buf[pos:] + data
+        end = len(buf)
+        if data and record_length:
+            end -= end % record_length
+        elif data:
+            end = buf.rfind('\n') + 1
+        if record_length:
+            for start in xrange(0, end - record_length + 1, record_length):
+                yield buf, start, start + record_length
+            if end % record_length:
+                # the last record of the file is short
+                yield buf, end - end % record_length, end
+        else:
+            for start, stop in line_spans(buf, end):
+                yield buf, start, stop
+        pos = end
+        if not data:
+            break
+
+def span_blocks(spans, block_bytes=BUFFER_SIZE):
+    """Group (start, end) record spans into lists covering about block_bytes
+    each, i.e. to transcode a block of records at a time"""
+    block = []
+    for span in spans:
+        block.append(span)
+        if span[1] - block[0][0] >= block_bytes:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def _descriptor_error(record_num, mesg):
+    return LayoutError('Record #%d: %s' % (record_num, mesg))
+
+def vb_spans(file_, blocked=False, buffer_size=BUFFER_SIZE):
+    """Yield (buffer, start, end) of each variable-length record, the record
+    is buffer[start:end] without its RDW
+    blocked (boolean) - records are in blocks with BDWs, RECFM=VB
+    """
+    unpack_from, size = DESCRIPTOR.unpack_from, DESCRIPTOR.size
+    buf, pos = '', 0
+    record_num = 1
+    while True:
+        data = file_.read(buffer_size)
+        # the partial block left at the end of the last buffer is kept
+        buf = buf[pos:] + data
+        pos = 0
+        end = len(buf)
+        while pos + size <= end:
+            word = unpack_from(buf, pos)[0]
+            if blocked and word & EXTENDED_BDW:
+                length = word & 0x7FFFFFFF
+            else:
+                length = word >> 16
+                if word & 0xFFFF:
+                    raise _descriptor_error(record_num, 'invalid %s %08X%s' %
+                        ('BDW' if blocked else 'RDW', word, '' if blocked
+                        else ', spanned records (RECFM=VBS) are not supported'))
+            if length < size:
+                raise _descriptor_error(record_num, 'invalid %s length %d' %
+                    ('BDW' if blocked else 'RDW', length))
+            if pos + length > end:
+                break
+            if not blocked:
+                yield buf, pos + size, pos + length
+                record_num += 1
+                pos += length
+                continue
+            record, block_end = pos + size, pos + length
+            while record < block_end:
+                if record + size > block_end:
+                    raise _descriptor_error(record_num, 'partial RDW at the '
+                        'end of a block')
+                word = unpack_from(buf, record)[0]
+                length = word >> 16
+                if word & 0xFFFF:
+                    raise _descriptor_error(record_num, 'invalid RDW %08X, '
+                        'spanned records (RECFM=VBS) are not supported' % word)
+                if length < size or record + length > block_end:
+                    raise _descriptor_error(record_num, 'invalid RDW length '
+                        '%d' % length)
+                yield buf, record + size, record + length
+                record_num += 1
+                record += length
+            pos = block_end
+        if not data:
+            break
+    if pos < len(buf):
+        raise _descriptor_error(record_num, '%d trailing bytes, the last %s '
+            'is incomplete' % (len(buf) - pos, 'block' if blocked else
+            'record'))
+
+def vb_records(file_, blocked=False, buffer_size=BUFFER_SIZE):
+    """Yield each variable-length record as a string, without its RDW, see
+    vb_spans"""
+    for buf, start, end in vb_spans(file_, blocked, buffer_size):
+        yield buf[start:end]
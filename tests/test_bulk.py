@@ -0,0 +1,133 @@
+"""Bulk loads of Django models into an in-memory SQLite database
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+try:
+    import django
+    from django.conf import settings
+except ImportError:
+    django = None
+
+if django is not None:
+    if not settings.configured:
+        settings.configure(DATABASES={'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            INSTALLED_APPS=[])
+        django.setup()
+    from django.db import DatabaseError, connection, models
+
+    from bulk import BulkLoader
+
+    class Items(models.Model):
+        amount = models.IntegerField()
+
+        class Meta:
+            app_label = 'test_bulk'
+
+    class Record(models.Model):
+        name = models.CharField(max_length=10)
+        items = models.ManyToManyField(Items)
+
+        class Meta:
+            app_label = 'test_bulk'
+
+    MODELS = [Items, Record]
+
+
+@unittest.skipIf(django is None, 'Django is not installed')
+class BulkLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        with connection.schema_editor() as editor:
+            for model in MODELS:
+                editor.create_model(model)
+
+    def tearDown(self):
+        with connection.schema_editor() as editor:
+            for model in reversed(MODELS):
+                editor.delete_model(model)
+
+    def add_record(self, loader, name, amounts):
+        record = Record(name=name)
+        for amount in amounts:
+            loader.add(Items(amount=amount), record)
+        loader.add(record)
+        return record
+
+    def amounts(self, record):
+        ids = Record.items.through.objects.filter(record_id=record.id
+            ).values_list('items_id', flat=True)
+        return sorted(Items.objects.filter(id__in=list(ids)).values_list(
+            'amount', flat=True))
+
+    def test_batches(self):
+        loader = BulkLoader(4)
+        self.add_record(loader, 'a', [1, 2])
+        self.assertFalse(loader.full())
+        self.add_record(loader, 'b', [3])
+        self.assertTrue(loader.full())
+        # 5 models & 3 links
+        self.assertEqual(loader.flush(), 8)
+        self.assertFalse(loader.full())
+        self.assertEqual(Record.objects.count(), 2)
+        self.assertEqual(loader.flush(), 0)
+        self.add_record(loader, 'c', [])
+        self.assertEqual(loader.close(), 1)
+        self.assertEqual(sorted(Record.objects.values_list('name',
+            flat=True)), ['a', 'b', 'c'])
+
+    def test_ids_follow_max_id(self):
+        Record.objects.create(id=7, name='old')
+        Items.objects.create(id=3, amount=0)
+        loader = BulkLoader(100)
+        record = self.add_record(loader, 'new', [5, 6])
+        self.assertEqual(record.id, 8)
+        loader.close()
+        self.assertEqual(sorted(Items.objects.values_list('id', flat=True)),
+            [3, 4, 5])
+
+    def test_links(self):
+        loader = BulkLoader(100)
+        first = self.add_record(loader, 'a', [1, 2])
+        second = self.add_record(loader, 'b', [3])
+        loader.close()
+        self.assertEqual(self.amounts(first), [1, 2])
+        self.assertEqual(self.amounts(second), [3])
+        self.assertEqual(Record.items.through.objects.count(), 3)
+
+    def test_failed_batch_rolled_back(self):
+        loader = BulkLoader(100)
+        self.add_record(loader, 'a', [1])
+        loader.flush()
+        self.add_record(loader, 'b', [2])
+        # amount is NOT NULL
+        self.add_record(loader, 'c', [None])
+        self.assertRaises(DatabaseError, loader.flush)
+        self.assertEqual(list(Record.objects.values_list('name',
+            flat=True)), ['a'])
+        self.assertEqual(Items.objects.count(), 1)
+        self.assertEqual(Record.items.through.objects.count(), 1)
+
+    def test_sequences_reset(self):
+        ops = connection.ops
+        calls = []
+        def sequence_reset_sql(style, model_list):
+            calls.append(list(model_list))
+            return ['SELECT 1']
+        ops.sequence_reset_sql = sequence_reset_sql
+        try:
+            loader = BulkLoader(100)
+            self.add_record(loader, 'a', [1])
+            loader.close()
+        finally:
+            del ops.sequence_reset_sql
+        self.assertEqual(calls, [[Items, Record]])
+        # the next id is past the loaded ones
+        self.assertEqual(Record.objects.create(name='b').id, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
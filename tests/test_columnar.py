@@ -0,0 +1,52 @@
+"""Columnar decoding matches layout.Layout.decode
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+from layout import Layout, LayoutError
+
+try:
+    from columnar import ColumnarDecoder
+    import numpy
+except ImportError:
+    ColumnarDecoder = None
+
+FIELDS = [('qty', 'Integer', '5', '0'), ('amount', 'Float', '6', '2'),
+    ('name', 'Char', '4', '0')]
+
+
+@unittest.skipIf(ColumnarDecoder is None, 'NumPy is not installed')
+class ColumnarVsRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = Layout(FIELDS)
+        self.decoder = ColumnarDecoder(self.layout)
+
+    def columnar(self, records):
+        columns = self.decoder.decode_block(''.join([ i + '\n'
+            for i in records ]))
+        return self.decoder.rows(columns)
+
+    def assertSameAsRows(self, records):
+        self.assertEqual(self.columnar(records),
+            [ self.layout.decode(i) for i in records ])
+
+    def test_padded_fields(self):
+        self.assertSameAsRows(['12   15    abcd', '   12   -15ab  ',
+            '00012+00015    ', '     000001abcd', '-0001    +7abcd'])
+
+    def test_blank_fields(self):
+        self.assertSameAsRows(['           abcd', '  3      1 abcd'])
+
+    def test_malformed_fields(self):
+        for record in ['12 34000001abcd', '1-2  000001abcd', '-    000001abcd',
+            '12   1 5   abcd', '12   +-1   abcd']:
+            self.assertRaises(ValueError, self.layout.decode, record)
+            self.assertRaises(LayoutError, self.columnar, ['12   15    abcd',
+                record])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Copybooks parsed into copybook2csv.py field definitions
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+from copybook2csv import Copybook, PictureString
+
+FIXED = '''\
+000100 01  CUSTOMER.                                                    CUST0001
+000200*    ACCOUNT HOLDER
+000300     05  CUST-ID         PIC 9(5).                                CUST0002
+000400     05  NAME            PIC X(20) VALUE 'A LONG NAME THAT IS CON
+000500-    'TINUED'.
+000600     05  BALANCE         PIC S9(7)V99 COMP-3.
+'''
+# free format, indented level numbers in columns 5 & 6
+FREE = '''\
+    01 CUSTOMER.
+    05 CUST-ID PIC 9(5).
+    05 NAME PIC X(20).
+        *> full name
+    05 BALANCE PIC S9(7)V99 COMP-3.
+'''
+CSV_LINES = ['Customer', 'cust_id, Integer, 5, 0', 'name, Char, 20, 0',
+    'balance, BCD, 5, 2']
+
+
+class PictureStringTest(unittest.TestCase):
+
+    def test_binary_sign(self):
+        parse = PictureString().parse
+        self.assertEqual(parse('S9(4)', 4), ('Binary', 2, 0))
+        self.assertEqual(parse('9(4)', 4), ('UnsignedBinary', 2, 0))
+        self.assertEqual(parse('9(7)V99', 5), ('UnsignedBinary', 4, 2))
+        self.assertEqual(parse('S9(18)', 5), ('Binary', 8, 0))
+
+
+class CopybookTest(unittest.TestCase):
+
+    def csv_lines(self, text):
+        copybook = Copybook()
+        copybook.parse(text.splitlines(True))
+        return copybook.csv_lines()
+
+    def test_fixed_format(self):
+        self.assertEqual(self.csv_lines(FIXED), CSV_LINES)
+        # blank sequence numbers
+        self.assertEqual(self.csv_lines('\n'.join([ ' ' * 6 + i[6:]
+            for i in FIXED.splitlines() ])), CSV_LINES)
+
+    def test_free_format(self):
+        self.assertEqual(self.csv_lines(FREE), CSV_LINES)
+
+
+if __name__ == '__main__':
+    unittest.main()
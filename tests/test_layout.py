@@ -0,0 +1,46 @@
+"""Compiled layouts
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+from layout import VARIANT_LIMIT, LayoutError, compile_layout
+
+# OCCURS 0 TO 999 TIMES DEPENDING ON CNT
+VARIABLE_FIELDS = [('cnt', 'Integer', '3', '0'),
+    ("Items OCCURS 'cnt' TIMES:",), ('\tno', 'Integer', '1', '0'),
+    ('tail', 'Char', '2', '0')]
+
+
+class VariableLayoutTest(unittest.TestCase):
+
+    def record(self, count):
+        return '%03d' % count + ''.join([ str(i % 10)
+            for i in range(count) ]) + 'zz'
+
+    def test_variants_bounded(self):
+        layout = compile_layout(VARIABLE_FIELDS)
+        code_size = None
+        for count in range(VARIANT_LIMIT * 3) + [5, 0, 200]:
+            if count == VARIANT_LIMIT:
+                code_size = len(layout.code)
+            record = self.record(count)
+            self.assertEqual(layout.decode(record), (count,) +
+                tuple([ i % 10 for i in range(count) ]) + ('zz',))
+            self.assertTrue(len(layout.variants) <= VARIANT_LIMIT)
+        # variants past the limit don't add to the layout's code
+        self.assertEqual(len(layout.code), code_size)
+
+    def test_select(self):
+        layout = compile_layout(VARIABLE_FIELDS, select=['Items_2_no',
+            'tail'])
+        self.assertEqual(layout.decode(self.record(3)), (1, 'zz'))
+        self.assertEqual(layout.decode(self.record(1)), ('zz',))
+        for select in [['tail', 'nope'], ['items_no'], ['item_1_no']]:
+            self.assertRaises(LayoutError, compile_layout, VARIABLE_FIELDS,
+                select=select)
+
+
+if __name__ == '__main__':
+    unittest.main()
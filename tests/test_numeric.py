@@ -0,0 +1,179 @@
+"""Scalar decoders, compiled Columns & NumPy columns agree on numeric fields
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import struct, unittest
+
+from layout import DECODE_ERRORS, Column
+from numeric import OVERPUNCH, unpack_hfp, unpack_packed, unpack_zoned
+
+try:
+    import numpy
+    from vectorized import hfp_array, packed_array, zoned_array
+except ImportError:
+    numpy = None
+
+
+def rows(fields):
+    """2d uint8 array of equal length fields, one row per field"""
+    return numpy.frombuffer(''.join(fields), dtype=numpy.uint8).reshape(
+        len(fields), -1)
+
+
+class PackedTest(unittest.TestCase):
+
+    def test_sign_nibbles(self):
+        for nibble, sign in zip(range(0xA, 0x10), [1, -1, 1, -1, 1, 1]):
+            self.assertEqual(unpack_packed('\x01\x23' + chr(0x40 | nibble)),
+                sign * 1234)
+        for nibble in range(10):
+            self.assertRaises(ValueError, unpack_packed, chr(0x10 | nibble))
+        self.assertRaises(ValueError, unpack_packed, '')
+
+    def test_negative_zero(self):
+        for data in ['\x0d', '\x00\x0b', '\x00\x00\x0d']:
+            self.assertEqual(unpack_packed(data), 0)
+
+    def test_invalid_digits(self):
+        self.assertRaises(ValueError, unpack_packed, '\x1a\x2c')
+
+    def test_column(self):
+        column = Column('amount', 'BCD', 3, 2)
+        self.assertEqual(column.convert('\x01\x23\x4d'), -12.34)
+        self.assertEqual(column.convert('\x00\x00\x0d'), 0)
+        # blank & low-values fields are null
+        self.assertEqual(column.convert('   '), None)
+        self.assertEqual(column.convert('\x00\x00\x00'), None)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_vectorized(self):
+        fields = [ '\x98\x76' + chr(0x50 | i) for i in range(0xA, 0x10) ] + [
+            '\x00\x00\x0d', '\x00\x00\x0c', '\x99\x99\x9f', '\x12\x34\x51',
+            '\x1a\x00\x0c']
+        values, invalid = packed_array(rows(fields))
+        self.assertEqual(list(invalid), [9, 10])
+        column = Column('amount', 'BCD', 3)
+        for num, field in enumerate(fields):
+            if num in invalid:
+                self.assertRaises(ValueError, unpack_packed, field)
+                self.assertRaises(DECODE_ERRORS, column.convert, field)
+            else:
+                self.assertEqual(values[num], unpack_packed(field))
+                self.assertEqual(values[num], column.convert(field))
+
+
+class ZonedTest(unittest.TestCase):
+
+    def test_overpunch(self):
+        self.assertEqual(unpack_zoned('12345}'), -123450)
+        self.assertEqual(unpack_zoned('12345{'), 123450)
+        self.assertEqual(unpack_zoned('12345'), 12345)
+        for data in ['}', '0}', '000p', '{']:
+            self.assertEqual(unpack_zoned(data), 0)
+
+    def test_signs_in_digits(self):
+        column = Column('z', 'Zoned', 4)
+        for data in ['-1}', '+1{', '1-1}', '1 1}', '12 5', '123S']:
+            self.assertRaises(ValueError, unpack_zoned, data)
+            self.assertRaises(DECODE_ERRORS, column.convert, data.rjust(4))
+        self.assertRaises(ValueError, unpack_zoned, '')
+
+    def test_leading_spaces(self):
+        column = Column('z', 'Zoned', 4)
+        for data, value in [(' 12}', -120), ('   A', 1), ('   }', 0)]:
+            self.assertEqual(unpack_zoned(data), value)
+            self.assertEqual(column.convert(data), value)
+        self.assertEqual(column.convert('    '), None)
+
+    def test_every_overpunch(self):
+        column = Column('z', 'Zoned', 3, 1)
+        for sign, chars in OVERPUNCH:
+            for digit, char in enumerate(chars):
+                self.assertEqual(unpack_zoned('12' + char),
+                    sign * (120 + digit))
+                self.assertEqual(column.convert('12' + char),
+                    sign * (120 + digit) / 10.0)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_vectorized_overpunch(self):
+        fields = [ '98' + j for i, chars in OVERPUNCH for j in chars ] + [
+            '00' + j for i, chars in OVERPUNCH for j in chars ] + [
+            '%03d' % i for i in range(10) ]
+        values, invalid = zoned_array(rows(fields))
+        self.assertEqual(list(invalid), [])
+        self.assertEqual(list(values), [ unpack_zoned(i) for i in fields ])
+        self.assertEqual(list(values), [ Column('z', 'Zoned', 3).convert(i)
+            for i in fields ])
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_vectorized(self):
+        fields = ['0012}', '0012{', ' 123J', '   0}', '00123', '-001}',
+            '00+1A', '0 12}', '0012S']
+        values, invalid = zoned_array(rows(fields))
+        self.assertEqual(list(invalid), [5, 6, 7, 8])
+        column = Column('z', 'Zoned', 5)
+        for num, field in enumerate(fields):
+            if num in invalid:
+                self.assertRaises(ValueError, unpack_zoned, field)
+                self.assertRaises(DECODE_ERRORS, column.convert, field)
+            else:
+                self.assertEqual(values[num], unpack_zoned(field))
+                self.assertEqual(values[num], column.convert(field))
+
+
+class BinaryTest(unittest.TestCase):
+
+    def test_signed(self):
+        for length, code in [(2, '>h'), (4, '>i'), (8, '>q')]:
+            column = Column('n', 'Binary', length)
+            self.assertEqual(column.convert('\xff' * length), -1)
+            self.assertEqual(column.convert(struct.pack(code, -1234)), -1234)
+
+    def test_unsigned(self):
+        for length in [2, 4, 8]:
+            column = Column('n', 'UnsignedBinary', length)
+            self.assertEqual(column.convert('\xff' * length),
+                2 ** (8 * length) - 1)
+            self.assertEqual(column.convert('\x00' * (length - 1) + '\x07'),
+                7)
+        column = Column('n', 'UnsignedBinary', 2, 2)
+        self.assertEqual(column.convert('\xff\xff'), 655.35)
+
+
+class HfpTest(unittest.TestCase):
+
+    VALUES = [(0x42640000, 100.0), (0xC2640000, -100.0), (0x41100000, 1.0),
+        (0x00000000, 0.0), (0x80000000, -0.0),
+        # smallest & largest exponents
+        (0x00100000, 16.0 ** -65), (0x7FFFFFFF, (1 - 16.0 ** -6) * 16.0 ** 63),
+        (0xFFFFFFFF, -(1 - 16.0 ** -6) * 16.0 ** 63)]
+
+    def test_single(self):
+        column = Column('f', 'HexFloat', 4)
+        for value, expected in self.VALUES:
+            self.assertEqual(unpack_hfp(value, 32), expected)
+            self.assertEqual(column.convert(struct.pack('>I', value)),
+                expected)
+
+    def test_double(self):
+        column = Column('f', 'HexDouble', 8)
+        for value, expected in self.VALUES:
+            value <<= 32
+            self.assertEqual(unpack_hfp(value, 64), expected)
+            self.assertEqual(column.convert(struct.pack('>Q', value)),
+                expected)
+        self.assertEqual(unpack_hfp(0x4110000000000001, 64), 1 + 16.0 ** -13)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_vectorized(self):
+        values = [ i for i, j in self.VALUES ]
+        self.assertEqual(list(hfp_array(numpy.array(values, numpy.uint32))),
+            [ unpack_hfp(i, 32) for i in values ])
+        values = [ i << 32 | 0xFFFFFFFF for i in values ]
+        self.assertEqual(list(hfp_array(numpy.array(values, numpy.uint64),
+            64)), [ unpack_hfp(i, 64) for i in values ])
+
+
+if __name__ == '__main__':
+    unittest.main()
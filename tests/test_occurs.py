@@ -0,0 +1,185 @@
+"""cobol2dbms OCCURS programs walk records the way the copybook lays them out
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+from layout import compile_layout, copybook_rows, parse_occurs
+from occurs import Program
+
+# counted table, then an OCCURS DEPENDING ON table
+FLAT = [('id', 'Integer', '3', '0'), ('cnt', 'Integer', '1', '0'),
+    ("Items OCCURS '2' TIMES:",), ('\tamount', 'Integer', '2', '0'),
+    ('mid', 'Char', '1', '0'), ("PhoneNos OCCURS 'cnt' TIMES:",), ('\tno', 'Integer', '3', '0'),
+    ('tail', 'Char', '2', '0')]
+# an OCCURS DEPENDING ON table in a counted table, holding a counted table
+NESTED = [('id', 'Integer', '3', '0'), ('cnt', 'Integer', '1', '0'),
+    ("Items OCCURS '2' TIMES:",), ('\tamount', 'Integer', '2', '0'),
+    ("\tSub OCCURS 'cnt' TIMES:",), ('\t\tx', 'Char', '1', '0'),
+    ("\t\tMarks OCCURS '2' TIMES:",), ('\t\t\tm', 'Char', '1', '0'),
+    ('tail', 'Char', '2', '0')]
+
+
+class Field:
+    """Copybook row, as cobol2dbms.Field sees it"""
+
+    def __init__(self, indent, row):
+        self.indents = indent
+        self.name = row[0].strip()
+        if len(row) > 1:
+            self.length = int(row[2])
+
+
+class Loop:
+    """OCCURS row, counted as cobol2dbms.Loop counts it, with the old
+    interpreter's loop_start & loop_next"""
+
+    def __init__(self, field_num, field):
+        self.start_line_num = field_num
+        self.name, count = parse_occurs([field.name])
+        self.num_times, self.depends_on_field_name = 0, count
+        if count.isdigit():
+            self.num_times, self.depends_on_field_name = int(count), False
+        self.counter = 0
+
+    def count(self, depend_ons):
+        if self.depends_on_field_name:
+            return int(depend_ons[self.depends_on_field_name])
+        return self.num_times
+
+    def loop_start(self, depend_ons):
+        self.counter = self.count(depend_ons)
+
+    def loop_next(self, field_num):
+        self.counter = max(0, self.counter - 1)
+        if self.counter:
+            field_num = self.start_line_num
+        return not self.counter, field_num
+
+
+def program(fields):
+    fields = [ Field(i, j) for i, j in copybook_rows(fields) ]
+    loops = dict([ (i, Loop(i, j)) for i, j in enumerate(fields)
+        if j.name.endswith(':') ])
+    return fields, loops
+
+def close_all(steps):
+    """steps closing the models left open"""
+    opened = len([ i for i in steps if i[0] == 'new' ])
+    return steps + [('close',)] * (opened - steps.count(('close',)))
+
+def walk(fields, record, qualify=False):
+    """Models opened & closed, values set in the order of a Program walk
+    qualify (boolean) - values are named after the tables holding them,
+        the way layout.flatten names them
+    """
+    fields, loops = program(fields)
+    depend_ons = dict([ (i.depends_on_field_name, None)
+        for i in loops.values() if i.depends_on_field_name ])
+    steps, tables = [('new', 'record')], []
+    for step in Program(fields, loops).walk(depend_ons):
+        if step[0] == Program.RUN:
+            fields_, length, ch_pos = step[1:]
+            for field, start, end, depended_on in fields_:
+                value = record[ch_pos + start:ch_pos + end]
+                name = field.name
+                if qualify:
+                    name = ''.join([ '%s_%d_' % (i, j) for i, j in tables ]
+                        ) + name
+                steps.append(('set', name, value))
+                if depended_on:
+                    depend_ons[field.name] = value
+        elif step[0] == Program.LOOP:
+            if step[2] > 0:
+                steps.append(('new', step[1].name))
+                tables.append([step[1].name, 1])
+        else:
+            steps.append(('close',))
+            if step[2]:
+                steps.append(('new', step[1].name))
+                tables[-1][1] += 1
+            else:
+                tables.pop()
+    return close_all(steps)
+
+def interpret(fields, record):
+    """Models opened & closed, values set by the field at a time interpreter
+    cobol2dbms used before Program, which handles loops that are neither
+    nested nor back to back"""
+    fields, loops = program(fields)
+    depend_ons = dict([ (i.depends_on_field_name, None)
+        for i in loops.values() if i.depends_on_field_name ])
+    steps = [('new', 'record')]
+    def next_loop(field_num):
+        steps.append(('close',))
+        loop_line_num = max([ i for i in loops.keys() if i < field_num ])
+        end_of_loop, field_num = loops[loop_line_num].loop_next(field_num)
+        if not end_of_loop:
+            steps.append(('new', loops[field_num].name))
+        return end_of_loop, field_num
+    field_num, num_fields = 0, len(fields)
+    ch_pos = last_indent = 0
+    while field_num <= num_fields:
+        if field_num == num_fields:
+            if not loops:
+                break
+            end_of_loop, field_num = next_loop(field_num)
+            if end_of_loop:
+                break
+        else:
+            field = fields[field_num]
+            end_of_loop = False
+            if field_num in loops:
+                loops[field_num].loop_start(depend_ons)
+                steps.append(('new', loops[field_num].name))
+            elif field.indents < last_indent:
+                end_of_loop, field_num = next_loop(field_num)
+            else:
+                value = record[ch_pos:ch_pos + field.length]
+                ch_pos += field.length
+                steps.append(('set', field.name, value))
+                if field.name in depend_ons:
+                    depend_ons[field.name] = value
+        last_indent = field.indents
+        if not end_of_loop:
+            field_num += 1
+    return close_all(steps)
+
+
+class ProgramTest(unittest.TestCase):
+
+    def test_old_interpreter(self):
+        for record in ['0012' '1020' '-' '111222' 'zz', '0013' '1020' '-'
+            '111222333' 'zz', '0011' '1020' '-' '111' 'zz']:
+            self.assertEqual(walk(FLAT, record), interpret(FLAT, record))
+
+    def test_nested_depending_on(self):
+        layout = compile_layout(NESTED)
+        for record in ['0012' '10aABbCD' '20cEFdGH' 'zz', '0011' '10aAB'
+            '20cEF' 'zz', '0010' '10' '20' 'zz']:
+            variant = layout.variant_for(record)
+            self.assertEqual(variant.record_length, len(record))
+            values = [ (i.name, record[i.offset:i.offset + i.length])
+                for i in variant.all_columns ]
+            steps = walk(NESTED, record, True)
+            self.assertEqual([ i[1:] for i in steps if i[0] == 'set' ],
+                values)
+            self.assertEqual(len([ i for i in steps if i[0] == 'new' ]),
+                len([ i for i in steps if i[0] == 'close' ]))
+
+    def test_models(self):
+        steps = walk(NESTED, '0011' '10aAB' '20cEF' 'zz')
+        item = [('new', 'items'), ('new', 'sub'), ('new', 'marks'),
+            ('close',), ('new', 'marks'), ('close',), ('close',), ('close',)]
+        self.assertEqual([ i for i in steps if i[0] != 'set' ],
+            [('new', 'record')] + item * 2 + [('close',)])
+        # no occurrences, no models
+        steps = walk(NESTED, '0010' '10' '20' 'zz')
+        self.assertEqual([ i for i in steps if i[0] != 'set' ],
+            [('new', 'record')] + [('new', 'items'), ('close',)] * 2 +
+            [('close',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""Records framed in the buffers read from a stream
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+from StringIO import StringIO
+
+from records import line_spans, stream_spans
+
+
+class StreamSpansTest(unittest.TestCase):
+
+    def records(self, data, record_length=0, buffer_size=4):
+        return [ buf[start:end] for buf, start, end in stream_spans(
+            StringIO(data), record_length, buffer_size) ]
+
+    def test_lines(self):
+        data = 'abc\r\n\nabcdefghij\nxy\nz'
+        for buffer_size in [1, 3, 4, 100]:
+            self.assertEqual(self.records(data, 0, buffer_size),
+                [ data[i:j] for i, j in line_spans(data) ])
+        self.assertEqual(self.records('ab\n'), ['ab'])
+        self.assertEqual(self.records(''), [])
+
+    def test_fixed_length(self):
+        for buffer_size in [1, 3, 4, 100]:
+            self.assertEqual(self.records('abcdefg\nh', 3, buffer_size),
+                ['abc', 'def', 'g\nh'])
+            self.assertEqual(self.records('abcdefgh', 3, buffer_size),
+                ['abc', 'def', 'gh'])
+
+
+if __name__ == '__main__':
+    unittest.main()
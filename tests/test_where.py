@@ -0,0 +1,66 @@
+"""Record filters compare fields the way the layout decodes them
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import unittest
+
+from layout import Layout, LayoutError, compile_layout
+from where import Where
+
+FIELDS = [('qty', 'Integer', '5', '0'), ('name', 'Char', '4', '0')]
+# PHONE-NOS OCCURS DEPENDING ON CNT
+VARIABLE_FIELDS = [('id', 'Integer', '3', '0'), ('cnt', 'Integer', '1', '0'),
+    ('PhoneNos OCCURS \'cnt\' TIMES:',), ('\tno', 'Integer', '3', '0'),
+    ('tail', 'Char', '2', '0')]
+
+
+class NullTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = Layout(FIELDS)
+        self.records = ['   12abcd', '     abcd', '   -3    ']
+
+    def matches(self, text):
+        match = Where(text).compile(self.layout)
+        return [ match(i) for i in self.records ]
+
+    def test_ordered_comparisons(self):
+        self.assertEqual(self.matches('qty < 100'), [True, False, True])
+        self.assertEqual(self.matches('qty >= -100'), [True, False, True])
+        self.assertEqual(self.matches('qty > qty'), [False, False, False])
+        self.assertEqual(self.matches('qty > null'), [False, False, False])
+
+    def test_equality(self):
+        self.assertEqual(self.matches('qty = null'), [False, True, False])
+        self.assertEqual(self.matches('qty != null'), [True, False, True])
+
+
+class VariableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = compile_layout(VARIABLE_FIELDS)
+        self.records = ['0012111222zz', '00110zz', '0013111222333zz']
+
+    def test_missing_table_fields(self):
+        match = Where('phone_nos_2_no > 0').compile(self.layout)
+        self.assertEqual([ match(i) for i in self.records ],
+            [True, False, True])
+        match = Where('phone_nos_3_no = null').compile(self.layout)
+        self.assertEqual([ match(i) for i in self.records ],
+            [True, True, False])
+
+    def test_offset(self):
+        match = Where('phone_nos_3_no = 333').compile(self.layout)
+        buffer = '\n'.join(self.records)
+        offsets = [0, 13, 21]
+        self.assertEqual([ match(buffer, i) for i in offsets ],
+            [False, False, True])
+
+    def test_unknown_fields(self):
+        for text in ['phone_no_2_no > 0', 'phone_nos_2_id > 0', 'nope = 1']:
+            self.assertRaises(LayoutError, Where(text).compile, self.layout)
+
+
+if __name__ == '__main__':
+    unittest.main()
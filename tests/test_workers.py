@@ -0,0 +1,51 @@
+"""cobol2csv.py --workers with the data file named on the command line, while
+stdin isn't a terminal, i.e. cron & batch jobs
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import os, shutil, subprocess, sys, tempfile, unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'cobol2csv.py')
+COPYBOOK = """Sale
+sale_id, Integer, 6, 0
+amount, Zoned, 9, 2
+name, Char, 10, 0
+"""
+
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.copybook = os.path.join(self.directory, 'sale.csv')
+        self.datafile = os.path.join(self.directory, 'sale.txt')
+        open(self.copybook, 'w').write(COPYBOOK)
+        f = open(self.datafile, 'w')
+        for i in range(5000):
+            f.write('%06d%08d%s%-10s\n' % (i, i * 3, '}J'[i % 2], 'NAME %d' % i))
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_script(self, *args):
+        null = open(os.devnull)
+        try:
+            process = subprocess.Popen([sys.executable, SCRIPT] + list(args),
+                stdin=null, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = process.communicate()
+        finally:
+            null.close()
+        self.assertEqual((process.returncode, err), (0, ''))
+        return out
+
+    def test_datafile_argument_with_stdin_redirected(self):
+        out = self.run_script('--workers', '2', self.copybook, self.datafile)
+        self.assertEqual(out.count('\n'), 5000)
+        self.assertEqual(out, self.run_script(self.copybook, self.datafile))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Formatted records are one valid line each
+
+Run from the repository directory: python -m unittest discover tests
+"""
+
+import csv, json, pickle, unittest
+from cStringIO import StringIO
+from decimal import Decimal
+
+from writers import Writer, formatter
+
+
+class CsvTest(unittest.TestCase):
+
+    def test_line_breaks_quoted(self):
+        format_ = formatter('csv')
+        self.assertEqual(format_(['a\nb', 'c']), '"a\nb",c')
+        self.assertEqual(format_(['a\rb', None, 1]), '"a\rb",,1')
+        self.assertEqual(formatter('tsv')(['a\nb', 'c']), '"a\nb"\tc')
+
+    def test_read_back(self):
+        out = StringIO()
+        writer = Writer(out, formatter('csv'))
+        rows = [['a\nb', 'c'], ['d', 'e\r\nf']]
+        for row in rows:
+            writer.write_record(row)
+        writer.close()
+        self.assertEqual(list(csv.reader(StringIO(out.getvalue()))), rows)
+
+    def test_pickled(self):
+        format_ = pickle.loads(pickle.dumps(formatter('csv')))
+        self.assertEqual(format_(['a\nb', 'c']), '"a\nb",c')
+
+
+class JsonTest(unittest.TestCase):
+
+    def test_non_finite_null(self):
+        format_ = formatter('jsonl', ['x', 'y', 'z', 'd'])
+        line = format_([float('nan'), float('inf'), float('-inf'),
+            Decimal('NaN')])
+        self.assertEqual(line, '{"x": null, "y": null, "z": null, "d": null}')
+        self.assertEqual(json.loads(line), dict.fromkeys('xyzd'))
+
+    def test_finite(self):
+        format_ = formatter('jsonl', ['x', 'd', 's'])
+        line = format_([0.1, Decimal('-12.50'), 'a\xe9'])
+        self.assertEqual(json.loads(line), {'x': 0.1, 'd': -12.5,
+            's': u'a\xe9'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""VECTORIZED NUMERIC DECODING
+Decodes whole columns of packed, zoned & hex float fields at once with NumPy,
+see numeric.py for the encodings.
+
+Byte values are mapped through lookup arrays built from numeric.py's tables:
+    - packed_array: digit-pair, last-digit & sign tables indexed by byte
+    - zoned_array: digit, overpunched last-digit & sign tables
+    - hfp_array: signed powers of 2 indexed by the sign & exponent byte
+
+Kept apart from numeric.py, so NumPy is only imported when columns are
+decoded; importing it dominates the start-up time of a conversion.
+
+Examples:
+packed_array(field_bytes, scale=2)  # field_bytes: uint8 array, 1 row per value
+zoned_array(field_bytes, scale=2)
+hfp_array(values, 64)               # values: uint64 array
+"""
+
+__version__ = """vectorized ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+from numeric import HFP32, HFP64, HFP_FRACTION_BITS, NEGATIVE_NIBBLES, \
+    POSITIVE_NIBBLES, ZONED_DIGIT, ZONED_SIGN, packed_digits
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['hfp_array', 'packed_array', 'zoned_array']
+
+# largest number of digits that fits in an int64
+INT64_DIGITS = 18
+SPACE = ord(' ')
+
+
+def _tables():
+    """Digit-pair, last-digit & sign lookup tables indexed by byte value"""
+    byte = np.arange(256)
+    high, low = byte >> 4, byte & 0xF
+    pairs = np.where((high <= 9) & (low <= 9), high * 10 + low, -1)
+    last_digit = np.where(high <= 9, high, -1)
+    sign = np.zeros(256, dtype=np.int64)
+    sign[np.in1d(low, POSITIVE_NIBBLES)] = 1
+    sign[np.in1d(low, NEGATIVE_NIBBLES)] = -1
+    return pairs.astype(np.int64), last_digit.astype(np.int64), sign
+
+def _zoned_tables():
+    """Digit, last-digit & sign lookup tables of zoned decimal characters"""
+    chars = [ chr(i) for i in range(256) ]
+    digit = np.array([ int(i) if i.isdigit() else -1 for i in chars ])
+    last_digit = np.array([ int(ZONED_DIGIT.get(i, -1)) for i in chars ])
+    sign = np.array([ ZONED_SIGN.get(i, 0) for i in chars ])
+    return [ i.astype(np.int64) for i in [digit, last_digit, sign] ]
+
+if np is not None:
+    PAIRS, LAST_DIGIT, SIGN = _tables()
+    DIGIT, ZONED_LAST_DIGIT, ZONED_SIGN_TABLE = _zoned_tables()
+    HFP_TABLES = {32: np.array(HFP32), 64: np.array(HFP64)}
+
+def packed_array(field, scale=0):
+    """Decode a column of packed decimal fields at once (NumPy)
+    field (2d uint8 array) - one row of field bytes per value
+    scale (int) - digits right of the implied decimal point
+    returns (tuple) - int64 array or, if scaled, float64 array & an array
+        of row numbers holding invalid packed data
+    """
+    length = field.shape[1]
+    if packed_digits(length) > INT64_DIGITS:
+        raise ValueError('%d digit packed field exceeds int64' %
+            packed_digits(length))
+    pairs = PAIRS[field[:, :-1]]
+    last_digit = LAST_DIGIT[field[:, -1]]
+    sign = SIGN[field[:, -1]]
+    invalid = (pairs < 0).any(axis=1) | (last_digit < 0) | (sign == 0)
+    powers = 100 ** np.arange(length - 2, -1, -1, dtype=np.int64)
+    value = (pairs.dot(powers) * 10 + last_digit) * sign
+    if scale:
+        value = value / 10.0 ** scale
+    return value, np.flatnonzero(invalid)
+
+def zoned_array(field, scale=0):
+    """Decode a column of zoned decimal fields at once (NumPy), leading
+    spaces are read as zeros
+    field (2d uint8 array) - one row of field bytes per value
+    scale (int) - digits right of the implied decimal point
+    returns (tuple) - int64 array or, if scaled, float64 array & an array
+        of row numbers holding invalid zoned data
+    """
+    length = field.shape[1]
+    if length > INT64_DIGITS:
+        raise ValueError('%d digit zoned field exceeds int64' % length)
+    digits = DIGIT[field[:, :-1]]
+    last_digit = ZONED_LAST_DIGIT[field[:, -1]]
+    sign = ZONED_SIGN_TABLE[field[:, -1]]
+    # only leading spaces are allowed
+    space = np.cumprod(field[:, :-1] == SPACE, axis=1).astype(bool)
+    invalid = ((digits < 0) & ~space).any(axis=1) | (sign == 0)
+    digits[space] = 0
+    powers = 10 ** np.arange(length - 1, 0, -1, dtype=np.int64)
+    value = (digits.dot(powers) + last_digit) * sign
+    if scale:
+        value = value / 10.0 ** scale
+    return value, np.flatnonzero(invalid)
+
+def hfp_array(values, bits=32):
+    """Decode a column of IBM hex floats at once (NumPy)
+    values (uint32 or uint64 array) - fields read as big-endian unsigned ints
+    bits (int) - 32 for single, 64 for double precision
+    returns (float64 array)
+    """
+    values = values.astype(np.uint64)
+    fraction_mask = np.uint64((1 << HFP_FRACTION_BITS[bits]) - 1)
+    scale = HFP_TABLES[bits][values >> np.uint64(bits - 8)]
+    return scale * (values & fraction_mask)
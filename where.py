@@ -0,0 +1,250 @@
+"""RECORD FILTERS
+Compiles a --where condition into a test of raw records, run before a record
+is decoded.
+
+A condition compares fields to literals:
+    rec_type = 'D' and branch in (12, 15)
+    not (balance < 0 or opened >= '2010-06-01') and name != null
+
+Operators: = (or ==), != (or <>), <, <=, >, >=, [not] in (...), and, or, not
+& parentheses.  Literals are 'quoted strings' ('' is a quote), numbers &
+null.  Keywords & field names are case insensitive.  Values compare as the
+layout decodes them: Char fields stripped, numbers converted, date/time
+fields formatted, blank fields null.  Only = & != match null, the ordered
+comparisons are false if either side is null.
+
+The condition is compiled against a layout into a single function.  Each
+field it names is sliced out of the record at its offset & converted on its
+own, so records that fail the test are never fully decoded, and 'and' & 'or'
+stop at the first field that decides the result.  Fields left out by a
+projection (see layout.Layout select) can still be tested.
+
+Records whose tested fields can't be converted pass the filter, so the
+decoder reports the error.
+
+Examples:
+match = Where("rec_type = 'D' and branch in (12,15)").compile(layout)
+match(record)
+match(buffer, offset)
+"""
+
+__version__ = """where ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import re
+
+from layout import DECODE_ERRORS, LayoutError, VariableLayout, \
+    compile_source
+
+__all__ = ['Where']
+
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*') |
+    (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)) |
+    (?P<name>[A-Za-z_][\w-]*) |
+    (?P<op><=|>=|<>|!=|==|=|<|>|\(|\)|,)
+    )""", re.VERBOSE)
+# condition operator: Python operator
+OPERATORS = {'=': '==', '==': '==', '!=': '!=', '<>': '!=', '<': '<',
+    '<=': '<=', '>': '>', '>=': '>='}
+# operators false whenever an operand is null
+ORDERED = ['<', '<=', '>', '>=']
+KEYWORDS = ['and', 'or', 'not', 'in', 'null']
+
+
+class Where:
+    """Parsed --where condition"""
+
+    def __init__(self, text):
+        """text (string) - condition, raises LayoutError if it's invalid"""
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        # Python source, field names as ('field', name) tuples
+        self.parts = []
+        self._or()
+        if self.pos < len(self.tokens):
+            self._error('unexpected %r' % self.tokens[self.pos][1])
+        self.names = [ i[1] for i in self.parts if type(i) is tuple ]
+
+    def _tokenize(self, text):
+        tokens, pos = [], 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = TOKEN_RE.match(text, pos)
+            if not match:
+                raise LayoutError('Invalid condition %r at %r' % (text,
+                    text[pos:].strip()))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'name' and value.lower() in KEYWORDS:
+                kind, value = value.lower(), value.lower()
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def _error(self, mesg):
+        raise LayoutError('Invalid condition %r: %s' % (self.text, mesg))
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def _next(self, *kinds):
+        kind, value = self._peek()
+        if kind not in kinds and value not in kinds:
+            self._error('expected %s' % ' or '.join(kinds))
+        self.pos += 1
+        return kind, value
+
+    def _or(self):
+        self._and()
+        while self._peek()[0] == 'or':
+            self.pos += 1
+            self.parts.append(' or ')
+            self._and()
+
+    def _and(self):
+        self._not()
+        while self._peek()[0] == 'and':
+            self.pos += 1
+            self.parts.append(' and ')
+            self._not()
+
+    def _not(self):
+        if self._peek()[0] == 'not':
+            self.pos += 1
+            self.parts.append('not ')
+            self._not()
+        elif self._peek()[1] == '(':
+            self.pos += 1
+            self.parts.append('(')
+            self._or()
+            self._next(')')
+            self.parts.append(')')
+        else:
+            self._comparison()
+
+    def _comparison(self):
+        self.parts.append('(')
+        start = len(self.parts)
+        self._operand()
+        kind, value = self._peek()
+        if kind in ('in', 'not'):
+            self.pos += 1
+            if kind == 'not':
+                self._next('in')
+            self.parts.append(' not in (' if kind == 'not' else ' in (')
+            self._next('(')
+            self._literal()
+            while self._peek()[1] == ',':
+                self.pos += 1
+                self.parts.append(', ')
+                self._literal()
+            self._next(')')
+            self.parts.append(',))')
+            return
+        kind, value = self._next('op')
+        if value not in OPERATORS:
+            self._error('unexpected %r' % value)
+        self.parts.append(' %s ' % OPERATORS[value])
+        self._operand()
+        if value in ORDERED:
+            # null is neither less nor greater than anything, the chained
+            # comparison converts each operand once
+            self.parts.insert(start, 'None is not ')
+            self.parts.append(' is not None')
+        self.parts.append(')')
+
+    def _operand(self):
+        if self._peek()[0] == 'name':
+            self.parts.append(('field', self._next('name')[1]))
+        else:
+            self._literal()
+
+    def _literal(self):
+        kind, value = self._next('string', 'number', 'null')
+        if kind == 'string':
+            value = repr(value[1:-1].replace("''", "'"))
+        elif kind == 'null':
+            value = 'None'
+        elif '.' in value:
+            value = repr(float(value))
+        else:
+            value = repr(int(value))
+        self.parts.append(value)
+
+    def compile(self, layout):
+        """Filter function, match(buffer, offset=0) -> True if the record at
+        offset in buffer passes
+        layout (layout.Layout or VariableLayout) - layout of the records
+        """
+        if isinstance(layout, VariableLayout):
+            return _VariableMatch(self, layout)
+        return self._compile(layout)
+
+    def _compile(self, layout, missing=False):
+        """missing (boolean) - fields not in the layout are null, instead
+        of an error"""
+        columns = dict([ (i.name.lower(), (num, i))
+            for num, i in enumerate(layout.all_columns) ])
+        namespace = {'_table': layout.table, '_ERRORS': DECODE_ERRORS}
+        source = []
+        for part in self.parts:
+            if type(part) is not tuple:
+                source.append(part)
+                continue
+            name = part[1].lower()
+            if name not in columns:
+                if missing:
+                    source.append('None')
+                    continue
+                raise LayoutError('Invalid condition %r: unknown field %s' %
+                    (self.text, part[1]))
+            num, column = columns[name]
+            data = 'buffer[offset + %d:offset + %d]' % (column.offset,
+                column.offset + column.length)
+            if layout.is_text(column):
+                data += '.translate(_table)'
+            namespace['_c%d' % num] = column.convert
+            source.append('_c%d(%s)' % (num, data))
+        lines = ['def match(buffer, offset=0):',
+            '    try:',
+            '        return %s' % ''.join(source),
+            '    except _ERRORS:',
+            '        return True']
+        exec(compile_source('\n'.join(lines), '<where %s>' % self.text,
+            layout.code), namespace)
+        return namespace['match']
+
+
+class _VariableMatch:
+    """Filter of OCCURS DEPENDING ON records, compiled per layout variant,
+    fields of tables the record doesn't have are null"""
+
+    def __init__(self, where, layout):
+        self.where = where
+        self.layout = layout
+        # variant counts: match function
+        self.matches = {}
+        for name in where.names:
+            if not layout.is_field(name):
+                raise LayoutError('Invalid condition %r: unknown field %s' %
+                    (where.text, name))
+
+    def __call__(self, buffer, offset=0):
+        try:
+            counts = self.layout.counts(buffer, offset)
+        except LayoutError:
+            # reported by the decoder
+            return True
+        match = self.matches.get(counts)
+        if match is None:
+            match = self.where._compile(self.layout.variant(counts), True)
+            self.matches[counts] = match
+        return match(buffer, offset)
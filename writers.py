@@ -0,0 +1,176 @@
+"""OUTPUT WRITERS
+Formats decoded records & writes them in large buffered writes.
+
+Formats:
+    - repr: Python repr of each value, separated by ', ', cobol2csv's
+      original output
+    - csv: comma separated, quoted per RFC 4180 by csv.writer, None is empty
+    - tsv: tab separated, quoted the same way
+    - jsonl: JSON Lines, an object per record keyed by field name, None,
+      NaN & infinity are null
+
+Lines end with '\\n' in every format, csv & tsv fields holding a line break
+are quoted.  Floats are written with repr, so they
+read back as the same float, decimal.Decimal values as exact numbers.  JSON
+strings are read as Latin-1, so fields holding any bytes can be written.
+
+Formatters are picklable, parallel.py sends them to its worker processes.
+
+A Writer keeps formatted records in a buffer & writes the buffer with one
+write once it holds buffer_size bytes.  The buffer is also written by flush &
+close, a buffer_size of 0 writes each record as it's formatted.
+
+Examples:
+out = Writer(sys.stdout, formatter('csv'))
+out.write_record((1, 'Brian', 12.5))
+out.write('preformatted record')
+out.close()
+"""
+
+__version__ = """writers ver 0.1
+
+License: GPLv3, Copyright (C) 2010 Brian Peterson
+This is free software.  There is NO warranty;
+not even for MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+import csv, json
+from cStringIO import StringIO
+from decimal import Decimal
+from math import isinf, isnan
+
+__all__ = ['BUFFER_SIZE', 'CsvFormat', 'FORMATS', 'JsonFormat', 'Writer',
+    'format_repr', 'formatter']
+
+FORMATS = ['repr', 'csv', 'tsv', 'jsonl']
+# bytes of formatted records buffered per write
+BUFFER_SIZE = 1024 * 1024
+
+# fields holding a CR or LF are quoted, the terminator is stripped by
+# CsvFormat & Writer adds its own
+csv.register_dialect('pycobol-csv', lineterminator='\r\n')
+csv.register_dialect('pycobol-tsv', delimiter='\t', lineterminator='\r\n')
+
+_json_string = json.JSONEncoder(encoding='latin-1').encode
+
+def _json_float(value):
+    """repr of a float, null for NaN & infinity, which JSON doesn't have"""
+    if isnan(value) or isinf(value):
+        return 'null'
+    return repr(value)
+
+def _json_decimal(value):
+    """str of a Decimal, null for NaN & infinity"""
+    if not value.is_finite():
+        return 'null'
+    return str(value)
+
+# value type: JSON text of a value
+_JSON = {type(None): lambda value: 'null', bool: _json_string, int: str,
+    long: str, float: _json_float, Decimal: _json_decimal, str: _json_string,
+    unicode: _json_string}
+
+
+def format_repr(values, names=None):
+    """Python repr of each value, separated by ', '"""
+    return ', '.join([ repr(i) for i in values ])
+
+
+class CsvFormat:
+    """Delimited text formatter, quoted by csv.writer"""
+
+    def __init__(self, dialect='pycobol-csv'):
+        """dialect (string) - registered csv dialect name"""
+        self.dialect = dialect
+        self._open()
+
+    def _open(self):
+        self._buffer = StringIO()
+        self._writerow = csv.writer(self._buffer, self.dialect).writerow
+
+    def __getstate__(self):
+        return {'dialect': self.dialect}
+
+    def __setstate__(self, state):
+        self.dialect = state['dialect']
+        self._open()
+
+    def __call__(self, values, names=None):
+        buf = self._buffer
+        buf.seek(0)
+        buf.truncate()
+        self._writerow(values)
+        return buf.getvalue()[:-2]
+
+
+class JsonFormat:
+    """JSON object formatter"""
+
+    def __init__(self, names):
+        """names (list of strings) - field names, the object keys"""
+        self.names = names
+        self.keys = self._keys(names)
+
+    def _keys(self, names):
+        return [ _json_string(i) + ': ' for i in names ]
+
+    def __call__(self, values, names=None):
+        """names (list of strings) - field names of this record, when they
+        differ from record to record, i.e. OCCURS DEPENDING ON"""
+        keys = self.keys if names is None else self._keys(names)
+        return '{%s}' % ', '.join([ key + _JSON[type(value)](value)
+            for key, value in zip(keys, values) ])
+
+
+def formatter(fmt, names=None):
+    """Record formatter, format(values, names=None) -> string
+    fmt (string) - one of FORMATS
+    names (list of strings) - field names, required by jsonl
+    """
+    if fmt == 'csv':
+        return CsvFormat('pycobol-csv')
+    elif fmt == 'tsv':
+        return CsvFormat('pycobol-tsv')
+    elif fmt == 'jsonl':
+        return JsonFormat(names or [])
+    return format_repr
+
+
+class Writer:
+    """Buffered output of formatted records"""
+
+    def __init__(self, file_, format_record=format_repr,
+        buffer_size=BUFFER_SIZE):
+        """file_ (file) - output file, i.e. sys.stdout
+        format_record (function) - formatter, see formatter
+        buffer_size (int) - bytes buffered per write, 0 for none
+        """
+        self.file = file_
+        self.format_record = format_record
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.size = 0
+
+    def write(self, line):
+        """Buffer a formatted record, without its line terminator"""
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def write_record(self, values, names=None):
+        """Format & buffer a record"""
+        self.write(self.format_record(values, names))
+
+    def flush(self):
+        """Write the buffered records"""
+        if self.lines:
+            self.lines.append('')
+            self.file.write('\n'.join(self.lines))
+            self.lines = []
+            self.size = 0
+
+    def close(self):
+        """Write the buffered records & flush the file, it's left open"""
+        self.flush()
+        self.file.flush()